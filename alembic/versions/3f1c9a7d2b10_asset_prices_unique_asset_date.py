@@ -0,0 +1,31 @@
+"""asset_prices unique (asset_id, date)
+
+Revision ID: 3f1c9a7d2b10
+Revises: 85a708258716
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b10'
+down_revision: Union[str, None] = '85a708258716'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Remover duplicados do mesmo dia (fica o registo mais recente) antes de criar a restrição
+    op.execute(
+        "DELETE FROM asset_prices WHERE id NOT IN ("
+        "SELECT MAX(id) FROM asset_prices GROUP BY asset_id, date)"
+    )
+    op.create_unique_constraint("uq_asset_prices_asset_date", "asset_prices", ["asset_id", "date"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_asset_prices_asset_date", "asset_prices", type_="unique")
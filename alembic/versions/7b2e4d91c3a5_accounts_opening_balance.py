@@ -0,0 +1,39 @@
+"""accounts.opening_balance
+
+Revision ID: 7b2e4d91c3a5
+Revises: 3f1c9a7d2b10
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e4d91c3a5'
+down_revision: Union[str, None] = '3f1c9a7d2b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesmas palavras-chave de app/services/ledger.py (tipos que retiram dinheiro da conta)
+NEGATIVE_KEYWORDS = ["Despesa", "Expense", "Levantamento", "Compra", "Buy", "Saída"]
+
+
+def upgrade() -> None:
+    op.add_column("accounts", sa.Column("opening_balance", sa.Float(), nullable=False, server_default="0"))
+
+    # Contas existentes: assumimos que o saldo atual está certo e deduzimos o saldo inicial
+    negative = " OR ".join(f"tt.name LIKE '%{k}%'" for k in NEGATIVE_KEYWORDS)
+    op.execute(f"""
+        UPDATE accounts SET opening_balance = current_balance - COALESCE((
+            SELECT SUM(CASE WHEN {negative} THEN -ABS(t.amount) ELSE ABS(t.amount) END)
+            FROM transactions t JOIN transaction_types tt ON tt.id = t.transaction_type_id
+            WHERE t.account_id = accounts.id
+        ), 0)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column("accounts", "opening_balance")
@@ -0,0 +1,50 @@
+"""sinal e natureza explícitos nos tipos de transação
+
+Revision ID: a1c3e5f7b9d2
+Revises: f9b2d4e6a8c0
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f7b9d2'
+down_revision: Union[str, None] = 'f9b2d4e6a8c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Cópia congelada das palavras-chave de app/services/ledger.py à data desta migração
+NEGATIVE_KEYWORDS = ["Despesa", "Expense", "Levantamento", "Compra", "Buy", "Saída"]
+BUY_KEYWORDS = ["Compra", "Buy"]
+
+
+def _matches(keywords):
+    return sa.or_(*[sa.column("name").like(f"%{word}%") for word in keywords])
+
+
+def upgrade() -> None:
+    op.add_column("transaction_types", sa.Column("sign", sa.Integer(), nullable=True))
+    op.add_column("transaction_types", sa.Column("kind", sa.String(), nullable=True))
+
+    types = sa.table("transaction_types", sa.column("name", sa.String), sa.column("is_investment", sa.Boolean),
+                     sa.column("sign", sa.Integer), sa.column("kind", sa.String))
+    negative = _matches(NEGATIVE_KEYWORDS)
+    op.execute(types.update().values(sign=sa.case((negative, -1), else_=1)))
+    op.execute(types.update().values(kind=sa.case(
+        (_matches(BUY_KEYWORDS), "buy"),
+        (types.c.is_investment.is_(True), "sell"),
+        (negative, "expense"),
+        else_="income",
+    )))
+
+    op.alter_column("transaction_types", "sign", nullable=False)
+    op.alter_column("transaction_types", "kind", nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column("transaction_types", "kind")
+    op.drop_column("transaction_types", "sign")
@@ -0,0 +1,27 @@
+"""índices transactions(category_id) e transactions(subcategory_id) para reorganizar categorias
+
+Revision ID: b2d4f6a8c0e3
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a8c0e3'
+down_revision: Union[str, None] = 'a1c3e5f7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_transactions_category_id", "transactions", ["category_id"])
+    op.create_index("ix_transactions_subcategory_id", "transactions", ["subcategory_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_subcategory_id", table_name="transactions")
+    op.drop_index("ix_transactions_category_id", table_name="transactions")
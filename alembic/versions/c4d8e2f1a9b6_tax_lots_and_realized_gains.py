@@ -0,0 +1,61 @@
+"""tax_lots, realized_gains e user_profiles.cost_basis_method
+
+Revision ID: c4d8e2f1a9b6
+Revises: 7b2e4d91c3a5
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e2f1a9b6'
+down_revision: Union[str, None] = '7b2e4d91c3a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("user_profiles", sa.Column("cost_basis_method", sa.String(), nullable=True, server_default="fifo"))
+
+    op.create_table(
+        "tax_lots",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("account_id", sa.Integer(), sa.ForeignKey("accounts.id"), nullable=False),
+        sa.Column("asset_id", sa.Integer(), sa.ForeignKey("assets.id"), nullable=False),
+        sa.Column("transaction_id", sa.Integer(), sa.ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("acquired_date", sa.Date(), nullable=False),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.Column("remaining_quantity", sa.Float(), nullable=False),
+        sa.Column("unit_cost", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_tax_lots_id", "tax_lots", ["id"])
+    op.create_index("ix_tax_lots_transaction_id", "tax_lots", ["transaction_id"])
+    op.create_index("ix_tax_lots_account_asset_date", "tax_lots", ["account_id", "asset_id", "acquired_date"])
+
+    op.create_table(
+        "realized_gains",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("transaction_id", sa.Integer(), sa.ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("lot_id", sa.Integer(), sa.ForeignKey("tax_lots.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("account_id", sa.Integer(), sa.ForeignKey("accounts.id"), nullable=False),
+        sa.Column("asset_id", sa.Integer(), sa.ForeignKey("assets.id"), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.Column("proceeds", sa.Float(), nullable=False),
+        sa.Column("cost_basis", sa.Float(), nullable=False),
+        sa.Column("realized_pl", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_realized_gains_id", "realized_gains", ["id"])
+    op.create_index("ix_realized_gains_transaction_id", "realized_gains", ["transaction_id"])
+    op.create_index("ix_realized_gains_account_date", "realized_gains", ["account_id", "date"])
+    # Lotes/ganhos das transações já existentes: python -m app.cli rebuild-lots
+
+
+def downgrade() -> None:
+    op.drop_table("realized_gains")
+    op.drop_table("tax_lots")
+    op.drop_column("user_profiles", "cost_basis_method")
@@ -0,0 +1,39 @@
+"""category_rules (categorização automática)
+
+Revision ID: c5e7a9b1d3f4
+Revises: b3d5f7a9c1e2
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e7a9b1d3f4'
+down_revision: Union[str, None] = 'b3d5f7a9c1e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "category_rules",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categories.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("subcategory_id", sa.Integer(), sa.ForeignKey("subcategories.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("pattern", sa.String(), nullable=True),
+        sa.Column("match_type", sa.String(), nullable=False, server_default="contains"),
+        sa.Column("min_amount", sa.Float(), nullable=True),
+        sa.Column("max_amount", sa.Float(), nullable=True),
+        sa.Column("priority", sa.Integer(), nullable=False, server_default="100"),
+    )
+    op.create_index("ix_category_rules_id", "category_rules", ["id"])
+    op.create_index("ix_category_rules_user_id", "category_rules", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_table("category_rules")
@@ -0,0 +1,34 @@
+"""preço unitário das transações de investimento (transactions.price_per_unit)
+
+Revision ID: c6e8a0b2d4f5
+Revises: b2d4f6a8c0e3
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6e8a0b2d4f5'
+down_revision: Union[str, None] = 'b2d4f6a8c0e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Inteiro escalado com 8 casas, como tax_lots.unit_cost
+    op.add_column("transactions", sa.Column("price_per_unit", sa.BigInteger(), nullable=True))
+    # As compras já registaram o preço usado no lote: copiá-lo, para a próxima reconstrução dar o mesmo custo.
+    # As restantes ficam a NULL (preço = |valor| / quantidade).
+    op.execute(
+        "UPDATE transactions SET price_per_unit = ("
+        "SELECT MIN(tax_lots.unit_cost) FROM tax_lots WHERE tax_lots.transaction_id = transactions.id"
+        ") WHERE asset_id IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("transactions", "price_per_unit")
@@ -0,0 +1,28 @@
+"""import_jobs.near_duplicates / transfer_candidates (matching após importação)
+
+Revision ID: d7f9b1c3e5a6
+Revises: c5e7a9b1d3f4
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7f9b1c3e5a6'
+down_revision: Union[str, None] = 'c5e7a9b1d3f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("import_jobs", sa.Column("near_duplicates", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("import_jobs", sa.Column("transfer_candidates", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    op.drop_column("import_jobs", "transfer_candidates")
+    op.drop_column("import_jobs", "near_duplicates")
@@ -0,0 +1,42 @@
+"""fx_rates, accounts.currency e assets.currency
+
+Revision ID: e5a7b3c9d1f2
+Revises: c4d8e2f1a9b6
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7b3c9d1f2'
+down_revision: Union[str, None] = 'c4d8e2f1a9b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "fx_rates",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("base", sa.String(3), nullable=False),
+        sa.Column("quote", sa.String(3), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("rate", sa.Float(), nullable=False),
+        sa.UniqueConstraint("base", "quote", "date", name="uq_fx_rates_pair_date"),
+    )
+    op.create_index("ix_fx_rates_id", "fx_rates", ["id"])
+
+    op.add_column("accounts", sa.Column("currency", sa.String(3), nullable=False, server_default="EUR"))
+    op.add_column("assets", sa.Column("currency", sa.String(3), nullable=False, server_default="EUR"))
+    # Símbolos do tipo BTC-USD são cotados em dólares
+    op.execute("UPDATE assets SET currency = 'USD' WHERE symbol LIKE '%-USD'")
+
+
+def downgrade() -> None:
+    op.drop_column("assets", "currency")
+    op.drop_column("accounts", "currency")
+    op.drop_table("fx_rates")
@@ -0,0 +1,60 @@
+"""valores monetários, preços e quantidades como inteiros escalados (BIGINT)
+
+Revision ID: e8a1c3f5b7d9
+Revises: d7f9b1c3e5a6
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a1c3f5b7d9'
+down_revision: Union[str, None] = 'd7f9b1c3e5a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (tabela, coluna, casas decimais) — cópia congelada de app/models/types.py
+MONEY, PRICE, QUANTITY = 2, 8, 8
+COLUMNS = [
+    ("transactions", "amount", MONEY),
+    ("transactions", "quantity", QUANTITY),
+    ("accounts", "current_balance", MONEY),
+    ("accounts", "opening_balance", MONEY),
+    ("category_rules", "min_amount", MONEY),
+    ("category_rules", "max_amount", MONEY),
+    ("asset_prices", "close_price", PRICE),
+    ("holdings", "quantity", QUANTITY),
+    ("holdings", "avg_buy_price", PRICE),
+    ("tax_lots", "quantity", QUANTITY),
+    ("tax_lots", "remaining_quantity", QUANTITY),
+    ("tax_lots", "unit_cost", PRICE),
+    ("realized_gains", "quantity", QUANTITY),
+    ("realized_gains", "proceeds", MONEY),
+    ("realized_gains", "cost_basis", MONEY),
+    ("realized_gains", "realized_pl", MONEY),
+]
+
+
+def upgrade() -> None:
+    # O default (float) não é convertido com a coluna: retirar e repor
+    op.alter_column("accounts", "opening_balance", server_default=None)
+    for table, column, scale in COLUMNS:
+        op.alter_column(
+            table, column, type_=sa.BigInteger(), existing_type=sa.Float(),
+            postgresql_using=f"ROUND({column}::numeric * {10 ** scale})::bigint"
+        )
+    op.alter_column("accounts", "opening_balance", server_default="0")
+
+
+def downgrade() -> None:
+    op.alter_column("accounts", "opening_balance", server_default=None)
+    for table, column, scale in COLUMNS:
+        op.alter_column(
+            table, column, type_=sa.Float(), existing_type=sa.BigInteger(),
+            postgresql_using=f"({column}::numeric / {10 ** scale})::double precision"
+        )
+    op.alter_column("accounts", "opening_balance", server_default="0")
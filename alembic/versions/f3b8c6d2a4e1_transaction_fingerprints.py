@@ -0,0 +1,65 @@
+"""transactions.fingerprint (deduplicação de importações)
+
+Revision ID: f3b8c6d2a4e1
+Revises: e5a7b3c9d1f2
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+import hashlib
+import re
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8c6d2a4e1'
+down_revision: Union[str, None] = 'e5a7b3c9d1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Cópia congelada de app.services.ledger / import_service (a migração não deve depender do código da app)
+NEGATIVE_KEYWORDS = ["Despesa", "Expense", "Levantamento", "Compra", "Buy", "Saída"]
+
+
+def _normalize(description):
+    return re.sub(r"\s+", " ", str(description)).strip().lower()[:255]
+
+
+def _fingerprint(account_id, dt, signed_amount, description, occurrence):
+    # str(date) == date.isoformat(); também aceita datas devolvidas como texto (SQLite)
+    key = f"{account_id}|{dt}|{int(round(signed_amount * 100))}|{_normalize(description)}|{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column("transactions", sa.Column("fingerprint", sa.String(64), nullable=True))
+
+    # Backfill das transações não-investimento, para que reimportar extratos antigos não duplique
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT t.id, t.account_id, t.date, t.amount, t.description, tt.name "
+        "FROM transactions t JOIN transaction_types tt ON tt.id = t.transaction_type_id "
+        "WHERE t.asset_id IS NULL AND t.date IS NOT NULL ORDER BY t.id"
+    )).fetchall()
+
+    occurrences = defaultdict(int)
+    updates = []
+    for tx_id, account_id, dt, amount, description, type_name in rows:
+        negative = any(k in (type_name or "") for k in NEGATIVE_KEYWORDS)
+        signed = -abs(amount or 0.0) if negative else abs(amount or 0.0)
+        key = (account_id, dt, int(round(signed * 100)), _normalize(description))
+        updates.append({"id": tx_id, "fp": _fingerprint(account_id, dt, signed, description, occurrences[key])})
+        occurrences[key] += 1
+
+    if updates:
+        conn.execute(sa.text("UPDATE transactions SET fingerprint = :fp WHERE id = :id"), updates)
+
+    op.create_index("ux_transactions_fingerprint", "transactions", ["fingerprint"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ux_transactions_fingerprint", table_name="transactions")
+    op.drop_column("transactions", "fingerprint")
@@ -0,0 +1,25 @@
+"""índice transactions(account_id, date) para o ledger por conta
+
+Revision ID: f9b2d4e6a8c0
+Revises: e8a1c3f5b7d9
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f9b2d4e6a8c0'
+down_revision: Union[str, None] = 'e8a1c3f5b7d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_transactions_account_date", "transactions", ["account_id", "date"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_account_date", table_name="transactions")
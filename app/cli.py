@@ -0,0 +1,117 @@
+"""
+Comandos de manutenção (correr a partir da raiz do projeto):
+
+    python -m app.cli ingest-prices precos.csv
+    python -m app.cli rebuild-holdings --apply --balances
+    python -m app.cli rebuild-lots
+    python -m app.cli reconcile --apply
+"""
+import argparse
+import os
+import sys
+
+from app.database.database import SessionLocal
+
+
+def cmd_ingest_prices(args) -> int:
+    from app.services.price_ingest_service import PriceIngestService
+
+    fmt = args.format or PriceIngestService.detect_format(args.path)
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as f:
+            result = PriceIngestService.ingest(db, f, fmt, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+    print(f"✅ {result['upserted']} preços escritos ({result['rows_per_second']} linhas/s, "
+          f"{result['elapsed_seconds']}s), {result['assets_created']} ativos criados, {result['errors']} erros.")
+    for sample in result["error_samples"]:
+        print(f"   ⚠️ Linha {sample['line']}: {sample['error']}")
+    return 0
+
+
+def cmd_rebuild_holdings(args) -> int:
+    from app.services.holdings_service import HoldingsService
+
+    report = HoldingsService.rebuild(
+        user_ids=args.user, apply=args.apply, include_balances=args.balances, workers=args.workers
+    )
+    action = "corrigidos" if report["applied"] else "encontrados (use --apply para corrigir)"
+    print(f"✅ {report['users']} utilizadores em {report['elapsed_seconds']}s")
+    print(f"   Holdings: {report['holdings_checked']} verificadas, {report['holdings_drifted']} com drift {action}, "
+          f"{report['holdings_skipped']} ignoradas (transações sem quantidade)")
+    if args.balances:
+        print(f"   Saldos: {report['balances_checked']} verificados, {report['balances_drifted']} com drift {action}")
+    for item in report["drift"]:
+        print(f"   - {item['kind']} {item['key']}: guardado={item['stored']} esperado={item['expected']}")
+    return 0
+
+
+def cmd_rebuild_lots(args) -> int:
+    from app.services.lots_service import LotsService
+
+    db = SessionLocal()
+    try:
+        positions = LotsService.rebuild_users(db, args.user)
+    finally:
+        db.close()
+    print(f"✅ Lotes e ganhos realizados reconstruídos para {positions} posições.")
+    return 0
+
+
+def cmd_reconcile(args) -> int:
+    from app.services.reconciliation_service import ReconciliationService
+
+    db = SessionLocal()
+    try:
+        report = ReconciliationService.reconcile(db, apply=args.apply, batch_size=args.batch_size, user_id=args.user)
+    finally:
+        db.close()
+
+    action = "corrigidas" if report["applied"] else "encontradas (use --apply para corrigir)"
+    print(f"✅ {report['accounts_checked']} contas em {report['batches']} lotes, {report['elapsed_seconds']}s "
+          f"({report['accounts_per_second']} contas/s)")
+    print(f"   {report['accounts_drifted']} contas com drift {action}, diferença absoluta total {report['total_abs_drift']}")
+    for item in report["drift"]:
+        print(f"   - conta {item['account_id']} (user {item['user_id']}): guardado={item['stored']} esperado={item['expected']}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Comandos de manutenção do MoneyMap")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest-prices", help="Ingestão em massa de preços de fecho (CSV ou NDJSON)")
+    p.add_argument("path", help="Ficheiro com colunas symbol, date, close")
+    p.add_argument("--format", choices=["csv", "ndjson"], help="Por omissão, deduzido pela extensão")
+    p.add_argument("--batch-size", type=int, default=5000)
+    p.set_defaults(func=cmd_ingest_prices)
+
+    p = sub.add_parser("rebuild-holdings", help="Reconstrói holdings (e saldos) a partir das transações")
+    p.add_argument("--user", type=int, action="append", help="ID do utilizador (repetível). Por omissão, todos")
+    p.add_argument("--apply", action="store_true", help="Corrigir o drift (por omissão só reporta)")
+    p.add_argument("--balances", action="store_true", help="Incluir saldos das contas")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Nº de processos")
+    p.set_defaults(func=cmd_rebuild_holdings)
+
+    p = sub.add_parser("rebuild-lots", help="Reconstrói lotes fiscais e ganhos realizados a partir das transações")
+    p.add_argument("--user", type=int, action="append", help="ID do utilizador (repetível). Por omissão, todos")
+    p.set_defaults(func=cmd_rebuild_lots)
+
+    p = sub.add_parser("reconcile", help="Confere saldo inicial + ledger com o saldo guardado de todas as contas")
+    p.add_argument("--user", type=int, help="ID do utilizador. Por omissão, todos")
+    p.add_argument("--apply", action="store_true", help="Corrigir o drift (por omissão só reporta)")
+    p.add_argument("--batch-size", type=int, default=1000, help="Contas por lote")
+    p.set_defaults(func=cmd_reconcile)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
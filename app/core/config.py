@@ -12,7 +12,39 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "uma_chave_secreta_muito_segura_aqui"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
-    
+
+    # Cache de preços de ativos (partilhada por todos os utilizadores do processo)
+    PRICE_CACHE_TTL_SECONDS: int = 300
+    # Árvores de categorias em memória (uma por utilizador); as menos usadas saem primeiro
+    CATEGORY_CACHE_MAX_USERS: int = 10000
+
+    # Moeda por omissão de contas/ativos e pivot para conversões cruzadas
+    DEFAULT_CURRENCY: str = "EUR"
+
+    # Intervalo máximo (em dias) de /portfolio/history: a série é calculada dia a dia
+    PORTFOLIO_HISTORY_MAX_DAYS: int = 3660
+
+    # Threads dedicadas às importações de extratos (0 = correr no próprio pedido)
+    IMPORT_WORKERS: int = 2
+    # Validade de um dry-run de importação à espera de confirmação
+    IMPORT_PREVIEW_TTL_SECONDS: int = 1800
+    # Processos usados para ler os ficheiros de uma importação em lote (0 = no próprio pedido)
+    IMPORT_PARSE_PROCESSES: int = 4
+    # Tamanho máximo (descomprimido) de um lote de extratos
+    IMPORT_BATCH_MAX_BYTES: int = 200 * 1024 * 1024
+    # No arranque, marcar como falhadas as importações pendentes/em curso (a fila vive em memória e
+    # perdeu-se). Desligar se vários processos da API partilharem a BD.
+    IMPORT_RECOVER_ON_STARTUP: bool = True
+
+    # Tabelas de referência (tipos e categorias de sistema) carregadas em memória no arranque
+    LOOKUPS_PRELOAD: bool = True
+    # Cache-Control dos endpoints /lookups (os clientes revalidam com o ETag)
+    LOOKUPS_CACHE_MAX_AGE_SECONDS: int = 3600
+
+    # Relações sem loader explícito rebentam em vez de fazerem uma query escondida (N+1).
+    # Ligado nos testes; em produção fica desligado para um caminho sem teste não dar 500.
+    STRICT_RELATIONSHIP_LOADING: bool = False
+
     # Permite ler de um ficheiro .env se existirem overrides
     model_config = SettingsConfigDict(env_file="/.env")
 
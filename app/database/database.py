@@ -15,4 +15,16 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_session_factory():
+    """Fábrica de sessões para trabalho que continua depois do pedido (ex: importações em segundo plano)."""
+    return SessionLocal
+
+def dialect_insert(db, model):
+    """`INSERT` do dialeto ativo (Postgres em produção, SQLite nos testes), com suporte a ON CONFLICT."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
@@ -1,15 +1,41 @@
 import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 # Importa os teus routers
-from app.routers import users, transactions, accounts, categories, analytics, portfolio, imports, auth, setup
-from app.database.database import engine, Base
+from app.routers import users, transactions, accounts, categories, analytics, portfolio, imports, auth, setup, admin
+from app.database.database import engine, Base, SessionLocal
+from app.core.config import settings
 from app.core.logging import logger
+from app.services.lookup_registry import lookup_registry
+from app.services.import_jobs import ImportJobService
 
 # Base.metadata.create_all(bind=engine)  <--- COMENTADO: Agora usamos Alembic para gerir a BD!
 
-app = FastAPI(title="MoneyMap API")
+# --- ARRANQUE ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tipos de conta/transação e categorias de sistema em memória antes do primeiro pedido
+    if settings.LOOKUPS_PRELOAD:
+        try:
+            with SessionLocal() as db:
+                lookup_registry.load(db)
+        except Exception as e:
+            # Sem BD no arranque não é fatal: o registo carrega no primeiro acesso
+            logger.warning(f"Lookups não pré-carregados: {e}")
+    # Importações que ficaram a meio num processo anterior nunca vão terminar
+    if settings.IMPORT_RECOVER_ON_STARTUP:
+        try:
+            with SessionLocal() as db:
+                failed = ImportJobService.fail_orphaned(db)
+            if failed:
+                logger.warning(f"{failed} importações interrompidas marcadas como falhadas")
+        except Exception as e:
+            logger.warning(f"Importações interrompidas não verificadas: {e}")
+    yield
+
+app = FastAPI(title="MoneyMap API", lifespan=lifespan)
 
 # --- MIDDLEWARE DE LOGGING ---
 @app.middleware("http")
@@ -58,6 +84,7 @@ app.include_router(analytics.router)
 app.include_router(portfolio.router)
 app.include_router(imports.router)
 app.include_router(setup.router)
+app.include_router(admin.router)
 
 @app.get("/")
 def read_root():
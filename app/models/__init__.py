@@ -1,5 +1,7 @@
 from .base import Base
 from .user import User, UserProfile
 from .account import Account, AccountType
-from .transaction import Transaction, TransactionType, Category, SubCategory
-from .asset import Asset, AssetPrice, Holding
\ No newline at end of file
+from .transaction import Transaction, TransactionType, Category, SubCategory, CategoryRule
+from .asset import Asset, AssetPrice, Holding, TaxLot, RealizedGain
+from .currency import FxRate
+from .import_job import ImportJob
\ No newline at end of file
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from .base import Base
+from .base import Base, LAZY
+from .types import Money
 
 class AccountType(Base):
     __tablename__ = "account_types"
@@ -9,21 +10,24 @@ class AccountType(Base):
     name = Column(String, unique=True, index=True)
     
     # Relação inversa (opcional, mas boa prática)
-    accounts = relationship("Account", back_populates="account_type")
+    accounts = relationship("Account", back_populates="account_type", lazy=LAZY)
 
 class Account(Base):
     __tablename__ = "accounts"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    current_balance = Column(Float, default=0.0)
+    current_balance = Column(Money(), default=0.0)
+    # Saldo inicial (antes de qualquer transação): current_balance = opening_balance + soma do ledger
+    opening_balance = Column(Money(), default=0.0, nullable=False, server_default="0")
+    currency = Column(String(3), default="EUR", nullable=False, server_default="EUR")
     
     # Foreign Keys
     user_id = Column(Integer, ForeignKey("users.id"))
     account_type_id = Column(Integer, ForeignKey("account_types.id"))
 
     # Relações com STRING para evitar circular import
-    user = relationship("User", back_populates="accounts")
-    account_type = relationship("AccountType", back_populates="accounts")
-    transactions = relationship("Transaction", back_populates="account", cascade="all, delete-orphan")
-    holdings = relationship("Holding", back_populates="account", cascade="all, delete-orphan")
\ No newline at end of file
+    user = relationship("User", back_populates="accounts", lazy=LAZY)
+    account_type = relationship("AccountType", back_populates="accounts", lazy=LAZY)
+    transactions = relationship("Transaction", back_populates="account", cascade="all, delete-orphan", lazy=LAZY)
+    holdings = relationship("Holding", back_populates="account", cascade="all, delete-orphan", lazy=LAZY)
\ No newline at end of file
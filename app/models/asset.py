@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
-from .base import Base
+from .base import Base, LAZY
+from .types import Money, Price, Quantity
 
 class Asset(Base):
     __tablename__ = "assets"
@@ -8,28 +9,67 @@ class Asset(Base):
     symbol = Column(String, unique=True, index=True) # Ex: AAPL, BTC
     name = Column(String)
     asset_type = Column(String) # Stock, Crypto, ETF
+    currency = Column(String(3), default="EUR", nullable=False, server_default="EUR") # Moeda de cotação
 
-    prices = relationship("AssetPrice", back_populates="asset")
-    holdings = relationship("Holding", back_populates="asset")
-    transactions = relationship("Transaction", back_populates="asset")
+    prices = relationship("AssetPrice", back_populates="asset", lazy=LAZY)
+    holdings = relationship("Holding", back_populates="asset", lazy=LAZY)
+    transactions = relationship("Transaction", back_populates="asset", lazy=LAZY)
 
 class AssetPrice(Base):
     __tablename__ = "asset_prices"
+    # Um único preço de fecho por ativo e dia (permite upserts na ingestão em massa)
+    __table_args__ = (UniqueConstraint("asset_id", "date", name="uq_asset_prices_asset_date"),)
+
     id = Column(Integer, primary_key=True, index=True)
     asset_id = Column(Integer, ForeignKey("assets.id"))
     date = Column(Date)
-    close_price = Column(Float)
+    close_price = Column(Price())
 
-    asset = relationship("Asset", back_populates="prices")
+    asset = relationship("Asset", back_populates="prices", lazy=LAZY)
 
 class Holding(Base):
     __tablename__ = "holdings"
     id = Column(Integer, primary_key=True, index=True)
     account_id = Column(Integer, ForeignKey("accounts.id"))
     asset_id = Column(Integer, ForeignKey("assets.id"))
-    quantity = Column(Float)
-    avg_buy_price = Column(Float)
+    quantity = Column(Quantity())
+    avg_buy_price = Column(Price())
 
     # Relação com String "Account"
-    account = relationship("Account", back_populates="holdings")
-    asset = relationship("Asset", back_populates="holdings")
\ No newline at end of file
+    account = relationship("Account", back_populates="holdings", lazy=LAZY)
+    asset = relationship("Asset", back_populates="holdings", lazy=LAZY)
+
+class TaxLot(Base):
+    """Lote de compra: criado em cada compra e consumido pelas vendas (FIFO ou custo médio)."""
+    __tablename__ = "tax_lots"
+    # Lotes abertos de uma posição por ordem de aquisição (consumo FIFO)
+    __table_args__ = (Index("ix_tax_lots_account_asset_date", "account_id", "asset_id", "acquired_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False)
+    transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False, index=True)
+    acquired_date = Column(Date, nullable=False)
+    quantity = Column(Quantity(), nullable=False)
+    remaining_quantity = Column(Quantity(), nullable=False)
+    unit_cost = Column(Price(), nullable=False)
+
+    asset = relationship("Asset", lazy=LAZY)
+
+class RealizedGain(Base):
+    """Mais/menos-valia realizada por venda (e por lote consumido, no método FIFO), gravada no momento da venda."""
+    __tablename__ = "realized_gains"
+    __table_args__ = (Index("ix_realized_gains_account_date", "account_id", "date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False, index=True)
+    lot_id = Column(Integer, ForeignKey("tax_lots.id", ondelete="SET NULL"), nullable=True) # NULL no custo médio
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    quantity = Column(Quantity(), nullable=False)
+    proceeds = Column(Money(), nullable=False)
+    cost_basis = Column(Money(), nullable=False)
+    realized_pl = Column(Money(), nullable=False)
+
+    asset = relationship("Asset", lazy=LAZY)
\ No newline at end of file
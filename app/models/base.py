@@ -1,2 +1,6 @@
+from app.core.config import settings
 from app.database.database import Base
 
+# Estratégia de carregamento de todas as relações: em modo estrito, aceder a uma relação que
+# não foi carregada explicitamente (joinedload/selectinload) levanta erro em vez de emitir SQL
+LAZY = "raise_on_sql" if settings.STRICT_RELATIONSHIP_LOADING else "select"
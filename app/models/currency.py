@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Float, Date, UniqueConstraint
+from .base import Base
+
+class FxRate(Base):
+    """Taxa de câmbio diária: 1 unidade de `base` = `rate` unidades de `quote`."""
+    __tablename__ = "fx_rates"
+    __table_args__ = (UniqueConstraint("base", "quote", "date", name="uq_fx_rates_pair_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    base = Column(String(3), nullable=False)   # Ex: USD
+    quote = Column(String(3), nullable=False)  # Ex: EUR
+    date = Column(Date, nullable=False)
+    rate = Column(Float, nullable=False)
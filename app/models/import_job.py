@@ -0,0 +1,37 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, JSON
+from .base import Base
+
+class ImportJob(Base):
+    """Importação de extrato executada em segundo plano (estado e progresso consultáveis)."""
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False)
+    filename = Column(String, nullable=False)
+
+    status = Column(String, default="pending", nullable=False)  # pending, running, completed, failed, cancelled
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+    error_message = Column(String, nullable=True)
+
+    # --- PROGRESSO ---
+    rows_parsed = Column(Integer, default=0, nullable=False)
+    added = Column(Integer, default=0, nullable=False)
+    duplicates = Column(Integer, default=0, nullable=False)
+    errors = Column(Integer, default=0, nullable=False)
+    error_samples = Column(JSON, nullable=True)  # [{"row": 12, "error": "Data inválida", "value": "31-02-2024"}, ...]
+    # Pares a rever em /transactions/review que envolvem linhas desta importação
+    near_duplicates = Column(Integer, default=0, nullable=False)
+    transfer_candidates = Column(Integer, default=0, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    @property
+    def rows_per_second(self):
+        if not (self.started_at and self.finished_at):
+            return None
+        elapsed = (self.finished_at - self.started_at).total_seconds()
+        return round(self.rows_parsed / elapsed, 1) if elapsed > 0 else None
@@ -1,12 +1,27 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, Boolean, Index
 from sqlalchemy.orm import relationship
-from .base import Base
+from .base import Base, LAZY
+from .types import Money, Price, Quantity
+from app.services.ledger import type_kind, type_sign
+
+
+def _default_sign(context) -> int:
+    return type_sign(context.get_current_parameters().get("name"))
+
+
+def _default_kind(context) -> str:
+    params = context.get_current_parameters()
+    return type_kind(params.get("name"), bool(params.get("is_investment")))
+
 
 class TransactionType(Base):
     __tablename__ = "transaction_types"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True)
     is_investment = Column(Boolean, default=False)
+    # Semântica explícita (por omissão deduzida do nome): -1 sai da conta, +1 entra
+    sign = Column(Integer, nullable=False, default=_default_sign)
+    kind = Column(String, nullable=False, default=_default_kind)  # expense, income, buy, sell
 
 class Category(Base):
     __tablename__ = "categories"
@@ -14,10 +29,10 @@ class Category(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     name = Column(String)
     
-    user = relationship("User", back_populates="categories")
-    subcategories = relationship("SubCategory", back_populates="category", cascade="all, delete-orphan")
+    user = relationship("User", back_populates="categories", lazy=LAZY)
+    subcategories = relationship("SubCategory", back_populates="category", cascade="all, delete-orphan", lazy=LAZY)
     # NOVA RELAÇÃO DIRETA
-    transactions = relationship("Transaction", back_populates="category")
+    transactions = relationship("Transaction", back_populates="category", lazy=LAZY)
 
 class SubCategory(Base):
     __tablename__ = "subcategories"
@@ -25,8 +40,22 @@ class SubCategory(Base):
     category_id = Column(Integer, ForeignKey("categories.id"))
     name = Column(String)
 
-    category = relationship("Category", back_populates="subcategories")
-    transactions = relationship("Transaction", back_populates="subcategory") 
+    category = relationship("Category", back_populates="subcategories", lazy=LAZY)
+    transactions = relationship("Transaction", back_populates="subcategory", lazy=LAZY) 
+
+class CategoryRule(Base):
+    """Regra de categorização automática: texto (substring/regex) e/ou intervalo de valor -> categoria."""
+    __tablename__ = "category_rules"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False)
+    subcategory_id = Column(Integer, ForeignKey("subcategories.id", ondelete="SET NULL"), nullable=True)
+
+    pattern = Column(String, nullable=True)                      # Vazio = só o intervalo de valor conta
+    match_type = Column(String, default="contains", nullable=False)  # "contains" ou "regex"
+    min_amount = Column(Money(), nullable=True)                    # Valor absoluto
+    max_amount = Column(Money(), nullable=True)
+    priority = Column(Integer, default=100, nullable=False)      # Menor = ganha
 
 class Transaction(Base):
     __tablename__ = "transactions"
@@ -34,7 +63,7 @@ class Transaction(Base):
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date)
     description = Column(String)
-    amount = Column(Float)
+    amount = Column(Money())
     
     account_id = Column(Integer, ForeignKey("accounts.id"))
     transaction_type_id = Column(Integer, ForeignKey("transaction_types.id"))
@@ -46,12 +75,27 @@ class Transaction(Base):
     
     # --- CAMPOS DE INVESTIMENTO ---
     asset_id = Column(Integer, ForeignKey("assets.id"), nullable=True)
-    quantity = Column(Float, nullable=True) # Quantidade de ações/crypto
+    quantity = Column(Quantity(), nullable=True) # Quantidade de ações/crypto
+    # Preço unitário indicado na criação; NULL = |valor| / quantidade (ver ledger.unit_price)
+    price_per_unit = Column(Price(), nullable=True)
 
-    account = relationship("Account", back_populates="transactions")
-    transaction_type = relationship("TransactionType")
+    # --- IMPORTAÇÃO ---
+    # Hash de (conta, data, valor, descrição normalizada, ocorrência no ficheiro); NULL em transações manuais
+    fingerprint = Column(String(64), nullable=True)
+
+    account = relationship("Account", back_populates="transactions", lazy=LAZY)
+    transaction_type = relationship("TransactionType", lazy=LAZY)
     
     # Relações para as categorias e ativos
-    category = relationship("Category", back_populates="transactions")
-    subcategory = relationship("SubCategory", back_populates="transactions")
-    asset = relationship("Asset", back_populates="transactions")
\ No newline at end of file
+    category = relationship("Category", back_populates="transactions", lazy=LAZY)
+    subcategory = relationship("SubCategory", back_populates="transactions", lazy=LAZY)
+    asset = relationship("Asset", back_populates="transactions", lazy=LAZY)
+
+    __table_args__ = (
+        Index("ux_transactions_fingerprint", "fingerprint", unique=True),
+        # Ledger de uma conta por data (listagens, histórico e reconciliação por intervalos de contas)
+        Index("ix_transactions_account_date", "account_id", "date"),
+        # Fusões/reatribuições de categorias (UPDATE ... WHERE category_id/subcategory_id = ...)
+        Index("ix_transactions_category_id", "category_id"),
+        Index("ix_transactions_subcategory_id", "subcategory_id"),
+    )
\ No newline at end of file
@@ -0,0 +1,83 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from sqlalchemy import BigInteger, type_coerce
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+
+# Casas decimais guardadas: dinheiro em cêntimos, preços unitários e quantidades com 8 casas (crypto)
+MONEY_SCALE = 2
+PRICE_SCALE = 8
+QUANTITY_SCALE = 8
+
+# Operadores em que o literal está na unidade da coluna (e por isso é escalado como ela);
+# os limites de BETWEEN chegam com `and_`
+_SCALED_OPERATORS = frozenset({
+    operators.eq, operators.ne, operators.lt, operators.le, operators.gt, operators.ge, operators.and_,
+    operators.in_op, operators.not_in_op, operators.is_distinct_from, operators.is_not_distinct_from,
+    operators.add, operators.sub,
+})
+
+
+class ScaledInteger(TypeDecorator):
+    """
+    Número decimal guardado como inteiro escalado (BIGINT com `scale` casas implícitas).
+    Na BD, somas e comparações são inteiras e exatas; em Python o valor continua a ser um float
+    (já arredondado à escala), para o código existente não mudar.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def __init__(self, scale: int):
+        super().__init__()
+        self.scale = scale
+        self.factor = 10 ** scale
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return to_scaled(value, self.scale)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value / self.factor
+
+    def coerce_compared_value(self, op, value):
+        # Literais comparados/somados com a coluna são escalados da mesma forma; num produto ou
+        # divisão o literal é um fator sem unidade (col * 2 não pode virar col * 200)
+        if op in _SCALED_OPERATORS:
+            return self
+        return self.impl_instance.coerce_compared_value(op, value)
+
+
+def Money() -> ScaledInteger:
+    return ScaledInteger(MONEY_SCALE)
+
+
+def Price() -> ScaledInteger:
+    return ScaledInteger(PRICE_SCALE)
+
+
+def Quantity() -> ScaledInteger:
+    return ScaledInteger(QUANTITY_SCALE)
+
+
+def to_scaled(value: float, scale: int) -> int:
+    """Um valor tal como fica guardado numa coluna `ScaledInteger(scale)` (inteiro, mesmo arredondamento)."""
+    # Via Decimal(str(...)) para 0.1 + 0.2 dar 30 cêntimos e não 30.000000000000004
+    return int((Decimal(str(value)) * 10 ** scale).to_integral_value(ROUND_HALF_UP))
+
+
+def minor_units(column):
+    """A coluna tal como está guardada (inteiro escalado), sem conversão para float: cêntimos, no dinheiro."""
+    return type_coerce(column, BigInteger)
+
+
+def to_minor_units(values) -> np.ndarray:
+    """Valores monetários (float) -> cêntimos inteiros (int64), para reduções exatas em NumPy."""
+    return np.rint(np.asarray(values, dtype=float) * 10 ** MONEY_SCALE).astype(np.int64)
+
+
+def from_minor_units(values):
+    return values / 10 ** MONEY_SCALE
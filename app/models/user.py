@@ -1,7 +1,7 @@
 from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from .base import Base
+from .base import Base, LAZY
 
 class User(Base):
     __tablename__ = "users"
@@ -13,9 +13,9 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Strings mágicas novamente
-    accounts = relationship("Account", back_populates="user")
-    profile = relationship("UserProfile", back_populates="user", uselist=False)
-    categories = relationship("Category", back_populates="user")
+    accounts = relationship("Account", back_populates="user", lazy=LAZY)
+    profile = relationship("UserProfile", back_populates="user", uselist=False, lazy=LAZY)
+    categories = relationship("Category", back_populates="user", lazy=LAZY)
 
 class UserProfile(Base):
     __tablename__ = "user_profiles"
@@ -25,6 +25,7 @@ class UserProfile(Base):
     first_name = Column(String, nullable=True)
     last_name = Column(String, nullable=True)
     preferred_currency = Column(String, default="EUR")
+    cost_basis_method = Column(String, default="fifo", server_default="fifo") # "fifo" ou "average"
     avatar_url = Column(String, nullable=True)
 
-    user = relationship("User", back_populates="profile")
\ No newline at end of file
+    user = relationship("User", back_populates="profile", lazy=LAZY)
\ No newline at end of file
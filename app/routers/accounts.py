@@ -20,8 +20,7 @@ def create_account(account: schemas.AccountCreate, db: Session = Depends(get_db)
     if not db.query(AccountType).filter(AccountType.id == account.account_type_id).first():
          raise HTTPException(status_code=400, detail="Tipo de conta inválido")
     
-    db_account = Account(**account.model_dump(), user_id=current_user.id)
+    db_account = Account(**account.model_dump(), opening_balance=account.current_balance, user_id=current_user.id)
     db.add(db_account)
     db.commit()
-    db.refresh(db_account)
-    return db_account
\ No newline at end of file
+    return db.query(Account).options(joinedload(Account.account_type)).filter(Account.id == db_account.id).one()
\ No newline at end of file
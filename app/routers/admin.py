@@ -0,0 +1,86 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.database.database import get_db
+from app.dependencies import require_admin
+from app.schemas import schemas
+from app.services.fx_service import FxService
+from app.services.holdings_service import HoldingsService
+from app.services.lookup_registry import lookup_registry
+from app.services.price_cache import price_cache
+from app.services.reconciliation_service import ReconciliationService, RECONCILE_BATCH_SIZE
+from app.services.user_stats_service import UserStatsService
+
+# Todas as rotas deste router exigem role "admin"
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+# --- CACHE DE PREÇOS ---
+@router.get("/price-cache")
+def get_price_cache_stats():
+    """Estatísticas da cache partilhada de preços (tamanho, hits, misses, hit rate)."""
+    return price_cache.stats()
+
+@router.delete("/price-cache", status_code=204)
+def clear_price_cache():
+    price_cache.clear()
+    return None
+
+# --- UTILIZADORES ---
+@router.get("/users", response_model=schemas.AdminUserListResponse)
+def list_users(
+    sort_by: str = Query("id", pattern="^(id|created_at|email|accounts|transactions|last_activity|balance)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="`next_cursor` da página anterior"),
+    db: Session = Depends(get_db)
+):
+    """Utilizadores com nº de contas, nº de transações, última atividade e saldo total, paginados por cursor."""
+    try:
+        return UserStatsService.list_users(db, sort_by, order == "desc", limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# --- TABELAS DE REFERÊNCIA ---
+@router.delete("/lookups", status_code=204)
+def reload_lookups():
+    """Descarta os tipos/categorias de sistema em memória (ex: depois de os alterar diretamente na BD)."""
+    lookup_registry.invalidate()
+    return None
+
+# --- RECONSTRUÇÃO DE HOLDINGS ---
+@router.post("/holdings/rebuild")
+def rebuild_holdings(
+    user_id: Optional[int] = None,
+    apply: bool = False,
+    balances: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Recalcula holdings (e, com `balances=true`, saldos) a partir das transações.
+    Por omissão só reporta o drift; com `apply=true` corrige-o.
+    Para reconstruir todos os utilizadores em paralelo use `python -m app.cli rebuild-holdings`.
+    """
+    user_ids = [user_id] if user_id is not None else None
+    return HoldingsService.rebuild_users(db, user_ids, apply=apply, include_balances=balances)
+
+# --- RECONCILIAÇÃO DE SALDOS ---
+@router.post("/reconcile")
+def reconcile_balances(
+    user_id: Optional[int] = None,
+    apply: bool = False,
+    batch_size: int = Query(RECONCILE_BATCH_SIZE, ge=1, le=50000),
+    db: Session = Depends(get_db)
+):
+    """
+    Compara o saldo de cada conta com saldo inicial + soma das transações, em lotes de contas.
+    Por omissão só reporta; com `apply=true` corrige o drift. Em BDs grandes prefira `python -m app.cli reconcile`.
+    """
+    return ReconciliationService.reconcile(db, apply=apply, batch_size=batch_size, user_id=user_id)
+
+# --- TAXAS DE CÂMBIO ---
+@router.post("/fx-rates")
+def upsert_fx_rates(rates: List[schemas.FxRateCreate], db: Session = Depends(get_db)):
+    """Insere/atualiza taxas diárias (1 base = rate quote). Invalida a cache de câmbio desses pares."""
+    written = FxService.upsert_rates(db, [r.model_dump() for r in rates])
+    return {"upserted": written}
@@ -1,39 +1,91 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta, date
 from typing import List
+import numpy as np
 import pandas as pd
 from dateutil.relativedelta import relativedelta # Recomendado para cálculos de meses precisos
 
 from app.database.database import get_db
 from app.utils.auth import get_current_user
 from app.models import User, Transaction, Category, Account
+from app.models.types import from_minor_units, minor_units, to_minor_units
 from app.schemas import schemas
+from app.services.fx_service import FxService, FxRateMissing, user_currency
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+
+def _user_accounts(db: Session, user: User) -> List[Account]:
+    return db.query(Account).filter(Account.user_id == user.id).all()
+
+
+def _ledger_frame(db: Session, account_ids: List[int], start: date = None) -> pd.DataFrame:
+    """Movimentos (data, conta, valor em cêntimos tal como guardado na BD) ordenados por data."""
+    query = db.query(Transaction.date, Transaction.account_id, minor_units(Transaction.amount)).filter(
+        Transaction.account_id.in_(account_ids)
+    )
+    if start:
+        query = query.filter(Transaction.date >= start)
+    df = pd.DataFrame(query.order_by(Transaction.date.asc()).all(), columns=["date", "account_id", "amount"])
+    df["date"] = pd.to_datetime(df["date"])
+    df["amount"] = df["amount"].fillna(0).astype(np.int64)
+    return df
+
+
+def _amounts_minor(db: Session, df: pd.DataFrame, account_currency: dict, target: str) -> np.ndarray:
+    """Cêntimos na moeda `target`: só as linhas noutra moeda passam pela conversão (taxa do dia) e voltam a inteiro."""
+    cents = df["amount"].to_numpy(dtype=np.int64).copy()
+    currencies = df["account_id"].map(account_currency).to_numpy(dtype=object)
+    foreign = currencies != target
+    if foreign.any():
+        converted = FxService.convert(db, from_minor_units(cents[foreign]), currencies[foreign], df["date"].values[foreign], target)
+        cents[foreign] = to_minor_units(converted)
+    return cents
+
+
+def _balances_minor(db: Session, accounts, target: str) -> dict:
+    return {
+        acc.id: int(to_minor_units(acc.current_balance if acc.currency == target
+                                   else acc.current_balance * FxService.rate(db, acc.currency, target)))
+        for acc in accounts
+    }
+
 # --- 1. SPENDING ANALYTICS (Para o Gráfico de Despesas) ---
 @router.get("/spending", response_model=List[dict])
 def get_spending_analytics(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     # Identificar as contas do utilizador
-    user_account_ids = [acc.id for acc in current_user.accounts]
+    user_account_ids = [acc_id for (acc_id,) in db.query(Account.id).filter(Account.user_id == current_user.id)]
     
     if not user_account_ids:
         return []
 
-    # Query: Agrupar por Categoria e Somar os valores ABSOLUTOS das despesas
+    # Query: Agrupar por Categoria e Somar os valores ABSOLUTOS das despesas (em cêntimos, soma inteira exata)
     # Consideramos "Despesa" qualquer transação com valor negativo (< 0)
     results = db.query(
         Category.name, 
-        func.sum(func.abs(Transaction.amount)).label("total")
-    ).join(Transaction.category).filter(
+        Account.currency,
+        func.sum(func.abs(minor_units(Transaction.amount))).label("total")
+    ).join(Transaction.category).join(Transaction.account).filter(
         Transaction.account_id.in_(user_account_ids),
         Transaction.amount < 0 
-    ).group_by(Category.name).all()
+    ).group_by(Category.name, Account.currency).all()
+
+    # Converter cada moeda para a do utilizador (taxa de hoje) e juntar por categoria
+    target = user_currency(current_user)
+    totals = {}
+    try:
+        for cat_name, currency, total in results:
+            total = int(total)  # SUM de BIGINT vem como Decimal no Postgres
+            if currency != target:
+                total = round(total * FxService.rate(db, currency, target))
+            totals[cat_name] = totals.get(cat_name, 0) + total
+    except FxRateMissing as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Formatar para o Frontend (Recharts gosta de "name" e "value")
-    return [{"name": cat_name, "value": total} for cat_name, total in results]
+    return [{"name": cat_name, "value": from_minor_units(total)} for cat_name, total in totals.items()]
 
 # --- 2. HISTORY (Para o Gráfico de Evolução Curto Prazo) ---
 @router.get("/history") 
@@ -45,25 +97,27 @@ def get_history(db: Session = Depends(get_db), current_user: User = Depends(get_
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=30)
     
-    # 1. Calcular o Saldo Atual Total (Ponto de Partida)
-    current_total_balance = sum(acc.current_balance for acc in current_user.accounts)
-    
-    # 2. Buscar transações dos últimos 30 dias para as contas do user
-    user_account_ids = [acc.id for acc in current_user.accounts]
+    # 1. Buscar transações dos últimos 30 dias para as contas do user
+    accounts = _user_accounts(db, current_user)
+    user_account_ids = [acc.id for acc in accounts]
     
     if not user_account_ids:
         return [{"date": (end_date - timedelta(days=i)).strftime("%Y-%m-%d"), "value": 0} for i in range(31)][::-1]
 
-    transactions = db.query(Transaction).filter(
-        Transaction.account_id.in_(user_account_ids),
-        Transaction.date >= start_date
-    ).all()
+    frame = _ledger_frame(db, user_account_ids, start_date)
 
-    # 3. Agrupar transações por data
-    daily_changes = {}
-    for tx in transactions:
-        d_str = tx.date.strftime("%Y-%m-%d")
-        daily_changes[d_str] = daily_changes.get(d_str, 0) + tx.amount
+    # 2. Saldo Atual Total (Ponto de Partida) e movimentos, na moeda do utilizador (em cêntimos)
+    target = user_currency(current_user)
+    account_currency = {acc.id: acc.currency for acc in accounts}
+    try:
+        current_total_balance = sum(_balances_minor(db, accounts, target).values())
+        cents = _amounts_minor(db, frame, account_currency, target)
+    except FxRateMissing as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 3. Agrupar transações por data (soma inteira)
+    daily = pd.Series(cents, index=frame["date"].dt.strftime("%Y-%m-%d")).groupby(level=0).sum()
+    daily_changes = daily.to_dict()
 
     # 4. Reconstruir o histórico de trás para a frente
     history_data = []
@@ -75,11 +129,11 @@ def get_history(db: Session = Depends(get_db), current_user: User = Depends(get_
         
         history_data.append({
             "date": d_str,
-            "value": round(running_balance, 2)
+            "value": from_minor_units(running_balance)
         })
         
         # SaldoOntem = SaldoHoje - ChangeHoje
-        change_on_day = daily_changes.get(d_str, 0)
+        change_on_day = int(daily_changes.get(d_str, 0))
         running_balance -= change_on_day
 
     # 5. Ordenar cronologicamente
@@ -99,7 +153,7 @@ def get_evolution(
     - time_range: Janela de tempo (Último mês, 6 meses, 1 ano, Tudo)
     """
     # Identificar contas e seus tipos
-    all_accounts = current_user.accounts
+    all_accounts = _user_accounts(db, current_user)
     user_account_ids = [acc.id for acc in all_accounts]
     
     liquid_account_ids = [
@@ -111,51 +165,48 @@ def get_evolution(
         return []
 
     # 1. Buscar TODAS as transações (Necessário para calcular o Net Worth acumulado corretamente desde o início)
-    transactions = db.query(Transaction).filter(
-        Transaction.account_id.in_(user_account_ids)
-    ).order_by(Transaction.date.asc()).all()
+    df = _ledger_frame(db, user_account_ids)
+
+    # Saldos atuais na moeda do utilizador (taxa de hoje), em cêntimos
+    target = user_currency(current_user)
+    account_currency = {acc.id: acc.currency for acc in all_accounts}
+    try:
+        balances = _balances_minor(db, all_accounts, target)
+        cents = _amounts_minor(db, df, account_currency, target)
+    except FxRateMissing as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # --- LÓGICA PANDAS (HISTÓRICO) ---
+    # Tudo em cêntimos inteiros (int64): as somas e acumulados são exatos, sem arredondamentos pelo meio
     result = []
     
-    if transactions:
-        # Converter para DataFrame
-        data = [
-            {
-                "date": pd.to_datetime(tx.date), 
-                "amount": tx.amount,
-                "is_liquid": tx.account_id in liquid_account_ids
-            }
-            for tx in transactions
-        ]
-        df = pd.DataFrame(data)
-        
+    if not df.empty:
         # Definir regra de resampling
         rule = "YE" if period == "year" else "QE" if period == "quarter" else "ME"
         
-        # Calcular Receitas e Despesas
-        df['income'] = df['amount'].apply(lambda x: x if x > 0 else 0)
-        df['expense'] = df['amount'].apply(lambda x: abs(x) if x < 0 else 0)
+        # Calcular Receitas, Despesas e Liquidez (vetorizado)
+        df['amount'] = cents
+        df['income'] = np.where(cents > 0, cents, 0)
+        df['expense'] = np.where(cents < 0, -cents, 0)
+        df['liquid_amount'] = np.where(df['account_id'].isin(liquid_account_ids), cents, 0)
         
         # Agrupar
-        grouped = df.resample(rule, on='date').sum()
+        grouped = df.resample(rule, on='date')[['amount', 'income', 'expense', 'liquid_amount']].sum()
         
         # Calcular Net Worth Acumulado (Histórico)
         grouped['net_change'] = grouped['amount']
         grouped['cumulative_net_worth'] = grouped['net_change'].cumsum()
         
         # Ajuste de Offset Global
-        current_total_balance = sum(acc.current_balance for acc in all_accounts)
+        current_total_balance = sum(balances.values())
         calculated_final_total = grouped['cumulative_net_worth'].iloc[-1] if not grouped.empty else 0
         offset_total = current_total_balance - calculated_final_total
         grouped['cumulative_net_worth'] += offset_total
 
         # Calcular Liquidez Acumulada (Histórico)
-        df['liquid_amount'] = df.apply(lambda row: row['amount'] if row['is_liquid'] else 0, axis=1)
-        grouped_liquid = df.resample(rule, on='date')['liquid_amount'].sum()
-        cumulative_liquid = grouped_liquid.cumsum()
+        cumulative_liquid = grouped['liquid_amount'].cumsum()
         
-        current_liquid_balance = sum(acc.current_balance for acc in all_accounts if acc.id in liquid_account_ids)
+        current_liquid_balance = sum(balances[acc_id] for acc_id in liquid_account_ids)
         calculated_final_liquid = cumulative_liquid.iloc[-1] if not cumulative_liquid.empty else 0
         offset_liquid = current_liquid_balance - calculated_final_liquid
         cumulative_liquid += offset_liquid
@@ -189,8 +240,8 @@ def get_evolution(
             else:
                 period_label = date_idx.strftime("%b %Y")
                 
-            income = row['income']
-            expenses = row['expense']
+            income = from_minor_units(row['income'])
+            expenses = from_minor_units(row['expense'])
             
             savings_rate = 0.0
             if income > 0:
@@ -201,18 +252,18 @@ def get_evolution(
                 
             result.append({
                 "period": period_label,
-                "net_worth": round(row['cumulative_net_worth'], 2),
-                "liquid_cash": round(liquid_val, 2),
-                "expenses": round(expenses, 2),
-                "income": round(income, 2),
+                "net_worth": from_minor_units(row['cumulative_net_worth']),
+                "liquid_cash": from_minor_units(liquid_val),
+                "expenses": expenses,
+                "income": income,
                 "savings_rate": round(savings_rate, 1)
             })
 
     # --- LÓGICA LIVE SYNC (GARANTIR O PRESENTE) ---
     
     # 1. Calcular Totais Reais AGORA
-    live_net_worth = sum(acc.current_balance for acc in all_accounts)
-    live_liquid_cash = sum(acc.current_balance for acc in all_accounts if acc.id in liquid_account_ids)
+    live_net_worth = sum(balances.values())
+    live_liquid_cash = sum(balances[acc_id] for acc_id in liquid_account_ids)
     
     # 2. Determinar a Label do Período Atual
     today = date.today()
@@ -227,8 +278,8 @@ def get_evolution(
     # 3. Verificar e Atualizar/Adicionar
     if result and result[-1]["period"] == current_label:
         # Cenário A: O período atual já existe na lista
-        result[-1]["net_worth"] = round(live_net_worth, 2)
-        result[-1]["liquid_cash"] = round(live_liquid_cash, 2)
+        result[-1]["net_worth"] = from_minor_units(live_net_worth)
+        result[-1]["liquid_cash"] = from_minor_units(live_liquid_cash)
     else:
         # Cenário B: O período atual NÃO existe (ou foi filtrado, ou não há transações)
         # Se o filtro for "all" ou se a data atual estiver dentro do range, adicionamos.
@@ -237,8 +288,8 @@ def get_evolution(
         
         result.append({
             "period": current_label,
-            "net_worth": round(live_net_worth, 2),
-            "liquid_cash": round(live_liquid_cash, 2),
+            "net_worth": from_minor_units(live_net_worth),
+            "liquid_cash": from_minor_units(live_liquid_cash),
             "expenses": 0.0,
             "income": 0.0,
             "savings_rate": 0.0
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import Session
 from typing import List
 
 # Importações ajustadas aos teus modelos
-from app.models.transaction import Category, SubCategory, Transaction
+from app.models.transaction import Category, CategoryRule, SubCategory, Transaction
 from app.models.user import User
 from app.schemas import schemas
 from app.database.database import get_db
 from app.utils.auth import get_current_user
+from app.services.category_cache import category_cache
+from app.services.category_service import CategoryService
+from app.services.rules_service import RulesService
 
 # --- CORREÇÃO: Adicionado prefixo aqui ---
 router = APIRouter(prefix="/categories", tags=["categories"])
@@ -15,10 +18,8 @@ router = APIRouter(prefix="/categories", tags=["categories"])
 # Agora usamos "/" que o FastAPI resolve automaticamente para "/categories" e "/categories/"
 @router.get("/", response_model=List[schemas.CategoryResponse])
 def read_categories(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    # CORREÇÃO: Adicionado .options(joinedload(Category.subcategories))
-    return db.query(Category).options(joinedload(Category.subcategories)).filter(
-        (Category.user_id == current_user.id) | (Category.user_id == None)
-    ).all()
+    # Árvore (globais + do utilizador) já serializada em cache: sem query nem validação por pedido
+    return Response(content=category_cache.get(db, current_user.id).body, media_type="application/json")
 
 @router.post("/", response_model=schemas.CategoryResponse, status_code=status.HTTP_201_CREATED)
 def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -30,8 +31,8 @@ def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_
     db_cat = Category(**category.model_dump(), user_id=current_user.id)
     db.add(db_cat)
     db.commit()
-    db.refresh(db_cat)
-    return db_cat
+    category_cache.invalidate(current_user.id)
+    return category_cache.category(db, current_user.id, db_cat.id)
 
 # Subcategorias (prefixo manual pois é diferente)
 @router.post("/subcategories", response_model=schemas.SubCategoryResponse)
@@ -45,6 +46,8 @@ def create_subcategory(sub: schemas.SubCategoryCreate, db: Session = Depends(get
     db.add(db_sub)
     db.commit()
     db.refresh(db_sub)
+    # Subcategoria de uma categoria global muda a árvore de todos os utilizadores
+    category_cache.invalidate(parent.user_id)
     return db_sub
 
 @router.delete("/subcategories/{subcategory_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -69,10 +72,60 @@ def delete_subcategory(
     if usage_check:
         raise HTTPException(
             status_code=400, 
-            detail="Não é possível apagar: esta subcategoria tem transações associadas."
+            detail="Não é possível apagar: esta subcategoria tem transações associadas (use /reassign para as mover)."
         )
 
     # 4. Apagar
     db.delete(sub)
     db.commit()
-    return None
\ No newline at end of file
+    category_cache.invalidate(current_user.id)
+    return None
+
+# --- REORGANIZAÇÃO EM MASSA ---
+def _reorganize(operation, *args):
+    try:
+        return operation(*args)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/subcategories/{subcategory_id}/reassign")
+def reassign_subcategory(subcategory_id: int, body: schemas.SubCategoryReassign, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Move todas as transações da subcategoria para o destino e apaga-a."""
+    return _reorganize(CategoryService.reassign_subcategory, db, current_user.id, subcategory_id,
+                       body.target_category_id, body.target_subcategory_id)
+
+@router.post("/{category_id}/merge")
+def merge_category(category_id: int, body: schemas.CategoryMerge, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Junta a categoria noutra (transações, subcategorias e regras) e apaga-a."""
+    return _reorganize(CategoryService.merge, db, current_user.id, category_id, body.target_category_id)
+
+# --- REGRAS DE CATEGORIZAÇÃO AUTOMÁTICA ---
+@router.get("/rules", response_model=List[schemas.CategoryRuleResponse])
+def read_rules(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return db.query(CategoryRule).filter(CategoryRule.user_id == current_user.id).order_by(
+        CategoryRule.priority, CategoryRule.id
+    ).all()
+
+@router.post("/rules", response_model=schemas.CategoryRuleResponse, status_code=status.HTTP_201_CREATED)
+def create_rule(rule: schemas.CategoryRuleCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    try:
+        return RulesService.create(db, current_user.id, rule.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_rule(rule_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    rule = db.query(CategoryRule).filter(CategoryRule.id == rule_id, CategoryRule.user_id == current_user.id).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Regra não encontrada")
+    RulesService.delete(db, rule)
+    return None
+
+@router.post("/rules/apply")
+def apply_rules(overwrite: bool = False, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Aplica as regras às transações existentes. Sem `overwrite` só recategoriza as que estão em "Importações"."""
+    return RulesService.apply_to_existing(db, current_user.id, overwrite=overwrite)
@@ -1,26 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import json
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, Form, HTTPException, Response, UploadFile, File, status
 from sqlalchemy.orm import Session
-from app.database.database import get_db
+from app.database.database import get_db, get_session_factory
 from app.utils.auth import get_current_user
-from app.models import Account, User 
-from app.services.import_service import ImportService 
+from app.models import Account, ImportJob, User
+from app.schemas import schemas
+from app.services.import_batch import BatchImportService
+from app.services.import_jobs import ImportJobService, import_runner
 
 router = APIRouter(prefix="/imports", tags=["imports"])
 
-@router.post("/upload")
-async def upload_transactions(
+@router.post("/upload", response_model=Union[schemas.ImportJobResponse, schemas.ImportPreviewResponse],
+             status_code=status.HTTP_202_ACCEPTED)
+def upload_transactions(
     account_id: int,
+    response: Response,
+    dry_run: bool = False,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
+    session_factory = Depends(get_session_factory),
     current_user: User = Depends(get_current_user) # Pode ser require_premium se quiseres bloquear
 ):
     account = db.query(Account).filter(Account.id == account_id).first()
     if not account or account.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Conta inválida ou sem permissão.")
 
+    if dry_run:
+        # Nada é gravado: devolve contagens, amostras e um token para confirmar sem reprocessar
+        try:
+            preview = ImportJobService.preview(db, current_user.id, account_id, file.filename, file.file)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        response.status_code = status.HTTP_200_OK
+        return preview
+
+    try:
+        job, path = ImportJobService.create(db, current_user.id, account_id, file.filename, file.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # A importação corre num worker; o progresso consulta-se em GET /imports/{job_id}
+    import_runner.submit(ImportJobService.run, job.id, path, session_factory)
+    db.refresh(job)
+    return job
+
+@router.post("/batch", response_model=schemas.BatchImportResponse)
+def upload_batch(
+    account_id: int,
+    files: List[UploadFile] = File(...),
+    accounts: Optional[str] = Form(None, description='JSON {"ficheiro.csv": account_id} para ficheiros de outras contas'),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        account_map = {str(name): int(acc) for name, acc in json.loads(accounts).items()} if accounts else {}
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Mapa de contas inválido.")
+
+    # Todas as contas do lote têm de ser do utilizador
+    account_ids = {account_id, *account_map.values()}
+    owned = db.query(Account.id).filter(Account.id.in_(account_ids), Account.user_id == current_user.id).count()
+    if owned != len(account_ids):
+        raise HTTPException(status_code=403, detail="Conta inválida ou sem permissão.")
+
+    try:
+        return BatchImportService.process(
+            db, current_user.id, [(f.filename, f.file) for f in files], account_id, account_map
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/preview/{token}/confirm", response_model=schemas.ImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def confirm_preview(
+    token: str,
+    db: Session = Depends(get_db),
+    session_factory = Depends(get_session_factory),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        job, path = ImportJobService.confirm(db, current_user.id, token)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    import_runner.submit(ImportJobService.run, job.id, path, session_factory, True)
+    db.refresh(job)
+    return job
+
+def get_user_job(job_id: int, db: Session, current_user: User) -> ImportJob:
+    job = db.query(ImportJob).filter(ImportJob.id == job_id, ImportJob.user_id == current_user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Importação não encontrada")
+    return job
+
+@router.get("/{job_id}", response_model=schemas.ImportJobResponse)
+def get_import_job(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    job = get_user_job(job_id, db, current_user)
+    db.refresh(job)  # o worker atualiza o job noutra sessão
+    return job
+
+@router.post("/{job_id}/cancel", response_model=schemas.ImportJobResponse)
+def cancel_import_job(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    job = get_user_job(job_id, db, current_user)
     try:
-        # ATUALIZADO: Passamos current_user.id
-        result = await ImportService.process_file(db, account_id, file, current_user.id)
-        return {"message": "Importação concluída", **result}
+        return ImportJobService.cancel(db, job)
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
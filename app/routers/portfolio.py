@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Body, UploadFile, File, Query
+from sqlalchemy.orm import Session, joinedload
 from app.database.database import get_db
-from app.models import Asset, AssetPrice, Holding, Account, User
+from app.models import Asset, Holding, Account, User, TaxLot, RealizedGain
 from app.schemas import schemas
 from app.utils.auth import get_current_user
-from datetime import date
+from app.dependencies import require_admin
+from app.core.config import settings
+from app.services.price_cache import price_cache
+from app.services.price_ingest_service import PriceIngestService
+from app.services.valuation_service import ValuationService
+from app.services.fx_service import FxService, user_currency
+from datetime import date, timedelta
+from typing import List, Optional
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/portfolio", tags=["portfolio"])
@@ -30,63 +36,196 @@ def set_asset_price(
     if not asset:
         raise HTTPException(status_code=404, detail=f"Ativo '{update.symbol}' não encontrado.")
     
-    # 2. Registar o novo preço na tabela de histórico
-    new_price = AssetPrice(
-        asset_id=asset.id,
-        date=date.today(),
-        close_price=update.price
-    )
-    db.add(new_price)
+    # 2. Registar o preço de hoje (upsert: um único preço por ativo e dia)
+    batch = PriceIngestService.upsert_prices(db, [
+        {"asset_id": asset.id, "date": date.today(), "close_price": update.price}
+    ])
     db.commit()
+
+    # 3. Refrescar a cache partilhada de preços
+    PriceIngestService.refresh_cache(batch)
     
     return {"message": f"Preço de {asset.symbol} atualizado para {update.price}"}
 
+@router.post("/prices/bulk")
+def bulk_ingest_prices(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Ingestão em massa de preços de fecho a partir de CSV (`symbol,date,close`) ou NDJSON.
+    Faz upsert por (ativo, dia) em lotes; ativos desconhecidos são criados.
+    """
+    try:
+        fmt = PriceIngestService.detect_format(file.filename)
+        result = PriceIngestService.ingest(db, file.file, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Ingestão de preços concluída", **result}
+
 @router.get("", response_model=schemas.PortfolioResponse)
 def get_portfolio(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     accounts = db.query(Account).filter(Account.user_id == current_user.id).all()
     account_ids = [acc.id for acc in accounts]
-    
-    total_cash = sum(acc.current_balance for acc in accounts)
+    account_currency = {acc.id: acc.currency for acc in accounts}
     
     # Buscar Holdings
     if not account_ids:
         holdings = []
     else:
-        holdings = db.query(Holding).join(Asset).filter(Holding.account_id.in_(account_ids)).all()
+        holdings = db.query(Holding).join(Asset).options(joinedload(Holding.asset)).filter(Holding.account_id.in_(account_ids)).all()
     
+    # Ignorar posições minúsculas (pó)
+    holdings = [h for h in holdings if h.quantity > 0.0001]
+
+    # Taxas de câmbio de hoje para a moeda do utilizador (uma por moeda envolvida)
+    # O custo está na moeda da conta (foi pago daí); o preço de mercado na moeda do ativo.
+    # Uma moeda sem taxas não falha o pedido: só as contas/posições afetadas ficam marcadas.
+    target = user_currency(current_user)
+    currencies = set(account_currency.values()) | {h.asset.currency for h in holdings}
+    fx = {ccy: FxService.rate_or_none(db, ccy, target) for ccy in currencies}
+    unconverted = sorted(ccy for ccy, rate in fx.items() if rate is None)
+
+    total_cash = sum(acc.current_balance * fx[acc.currency] for acc in accounts if fx[acc.currency] is not None)
+
+    # Preços mais recentes (inseridos manualmente ou via transação), partilhados entre utilizadores
+    latest_prices = price_cache.get_latest_prices(db, [h.asset_id for h in holdings])
+
     positions = []
     
     for h in holdings:
-        # Ignorar posições minúsculas (pó)
-        if h.quantity <= 0.0001: continue
-        
-        # Buscar o preço mais recente registado na BD (inserido manualmente ou via transação)
-        latest_price_entry = db.query(AssetPrice).filter(
-            AssetPrice.asset_id == h.asset_id
-        ).order_by(desc(AssetPrice.date), desc(AssetPrice.id)).first()
-        
-        # Se não houver preço histórico, usar o preço médio de compra como fallback
+        cost_currency = account_currency[h.account_id]
+        cost_fx = fx[cost_currency]
+        if cost_fx is None:
+            # Sem taxa para a moeda da conta: a posição fica na moeda da conta (e fora dos totais)
+            cost_fx, price_fx, currency = 1.0, FxService.rate_or_none(db, h.asset.currency, cost_currency), cost_currency
+        else:
+            price_fx, currency = fx[h.asset.currency], target
+        avg_buy_price = h.avg_buy_price * cost_fx
+
+        # Se não houver preço histórico (ou taxa para o converter), usar o preço médio de compra como fallback
         # (Neste caso o P/L será 0)
-        current_price = latest_price_entry.close_price if latest_price_entry else h.avg_buy_price
+        if h.asset_id in latest_prices and price_fx is not None:
+            current_price = latest_prices[h.asset_id] * price_fx
+        else:
+            current_price = avg_buy_price
 
         current_val = h.quantity * current_price
-        pl = current_val - (h.quantity * h.avg_buy_price)
+        pl = current_val - (h.quantity * avg_buy_price)
         
         positions.append({
             "symbol": h.asset.symbol,
             "quantity": h.quantity,
-            "avg_buy_price": h.avg_buy_price,
+            "avg_buy_price": avg_buy_price,
             "current_price": current_price,
             "total_value": current_val,
-            "profit_loss": pl
+            "profit_loss": pl,
+            "currency": currency,
+            "fx_missing": currency != target or (h.asset_id in latest_prices and price_fx is None),
         })
         
-    total_invested = sum(p["total_value"] for p in positions)
+    total_invested = sum(p["total_value"] for p in positions if p["currency"] == target)
     
     return {
         "user_id": current_user.id,
+        "currency": target,
         "total_net_worth": total_cash + total_invested,
         "total_cash": total_cash,
         "total_invested": total_invested,
-        "positions": positions
-    }
\ No newline at end of file
+        "positions": positions,
+        "unconverted_currencies": unconverted,
+    }
+
+@router.get("/history", response_model=List[schemas.PortfolioHistoryPoint])
+def get_portfolio_history(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    freq: str = Query("D", pattern="^(D|W|M)$", description="Granularidade: D (diária), W (semanal), M (mensal)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Evolução do valor de mercado da carteira (por omissão, último ano).
+    Reconstrói as posições a partir das transações de investimento e cruza-as com o
+    histórico de preços (último preço conhecido em cada dia).
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="A data inicial tem de ser anterior à data final.")
+    if (end - start).days > settings.PORTFOLIO_HISTORY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"O intervalo não pode exceder {settings.PORTFOLIO_HISTORY_MAX_DAYS} dias.")
+
+    return ValuationService.portfolio_history(db, current_user.id, start, end, freq, currency=user_currency(current_user))
+
+
+@router.get("/lots", response_model=List[schemas.TaxLotResponse])
+def get_tax_lots(
+    open_only: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Lotes de compra (por omissão só os que ainda têm quantidade) com P/L não realizado por lote."""
+    query = db.query(TaxLot).join(Account, TaxLot.account_id == Account.id).options(joinedload(TaxLot.asset)).filter(
+        Account.user_id == current_user.id
+    )
+    if open_only:
+        query = query.filter(TaxLot.remaining_quantity > 0.0001)
+    lots = query.order_by(TaxLot.acquired_date.asc(), TaxLot.id.asc()).all()
+
+    latest_prices = price_cache.get_latest_prices(db, {lot.asset_id for lot in lots})
+    # O custo do lote está na moeda da conta: o preço de mercado é convertido para essa moeda
+    account_currency = dict(db.query(Account.id, Account.currency).filter(Account.user_id == current_user.id).all())
+    result = []
+    for lot in lots:
+        fx = None
+        if lot.asset_id in latest_prices:
+            fx = FxService.rate_or_none(db, lot.asset.currency, account_currency[lot.account_id])
+        # Sem preço (ou sem taxa para o converter) o lote fica valorizado ao custo
+        current_price = latest_prices[lot.asset_id] * fx if fx is not None else lot.unit_cost
+        result.append({
+            "id": lot.id,
+            "account_id": lot.account_id,
+            "symbol": lot.asset.symbol,
+            "acquired_date": lot.acquired_date,
+            "quantity": lot.quantity,
+            "remaining_quantity": lot.remaining_quantity,
+            "unit_cost": lot.unit_cost,
+            "current_price": current_price,
+            "unrealized_pl": lot.remaining_quantity * (current_price - lot.unit_cost),
+            "fx_missing": lot.asset_id in latest_prices and fx is None,
+        })
+    return result
+
+@router.get("/realized", response_model=schemas.RealizedGainsReport)
+def get_realized_gains(
+    year: Optional[int] = Query(None, ge=1900, le=2999, description="Por omissão, o ano corrente"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Mais/menos-valias realizadas num ano (gravadas no momento de cada venda)."""
+    year = year or date.today().year
+    gains = db.query(RealizedGain).join(Account, RealizedGain.account_id == Account.id).options(
+        joinedload(RealizedGain.asset)
+    ).filter(
+        Account.user_id == current_user.id,
+        RealizedGain.date >= date(year, 1, 1),
+        RealizedGain.date <= date(year, 12, 31)
+    ).order_by(RealizedGain.date.asc(), RealizedGain.id.asc()).all()
+
+    items = [
+        {
+            "id": g.id, "transaction_id": g.transaction_id, "lot_id": g.lot_id, "account_id": g.account_id,
+            "symbol": g.asset.symbol, "date": g.date, "quantity": g.quantity, "proceeds": g.proceeds,
+            "cost_basis": g.cost_basis, "realized_pl": g.realized_pl,
+        }
+        for g in gains
+    ]
+    return {
+        "year": year,
+        "total_proceeds": round(sum(g.proceeds for g in gains), 2),
+        "total_cost_basis": round(sum(g.cost_basis for g in gains), 2),
+        "total_realized_pl": round(sum(g.realized_pl for g in gains), 2),
+        "items": items,
+    }
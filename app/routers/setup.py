@@ -1,24 +1,64 @@
-from fastapi import APIRouter, Depends
+import math
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
-from app.models.account import AccountType
+from typing import List, Optional
+from app.core.config import settings
 from app.models.asset import Asset
-from app.models.transaction import TransactionType
 from app.schemas import schemas
 from app.database.database import get_db
+from app.services.asset_index import SEARCH_LIMIT, asset_index
+from app.services.lookup_registry import lookup_registry
 
 router = APIRouter(tags=["setup"])
 
+
+def _cached_lookup(name: str, request: Request, response: Response, db: Session):
+    """Serve uma tabela de referência da memória; com If-None-Match igual ao ETag responde 304 sem corpo."""
+    lookup = lookup_registry.lookup(db, name)
+    headers = {"ETag": lookup.etag, "Cache-Control": f"public, max-age={settings.LOOKUPS_CACHE_MAX_AGE_SECONDS}"}
+    if lookup.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return lookup.items
+
 # --- APENAS LOOKUPS (Dados Estáticos) ---
 
 @router.get("/lookups/account-types", response_model=List[schemas.AccountTypeResponse])
-def get_account_types(db: Session = Depends(get_db)):
-    return db.query(AccountType).all()
+def get_account_types(request: Request, response: Response, db: Session = Depends(get_db)):
+    return _cached_lookup("account-types", request, response, db)
 
 @router.get("/lookups/transaction-types", response_model=List[schemas.TransactionTypeResponse])
-def get_transaction_types(db: Session = Depends(get_db)):
-    return db.query(TransactionType).all()
+def get_transaction_types(request: Request, response: Response, db: Session = Depends(get_db)):
+    return _cached_lookup("transaction-types", request, response, db)
+
+@router.get("/lookups/categories", response_model=List[schemas.CategoryResponse])
+def get_system_categories(request: Request, response: Response, db: Session = Depends(get_db)):
+    """Categorias de sistema (sem dono), partilhadas por todos os utilizadores."""
+    return _cached_lookup("categories", request, response, db)
+
+# --- CATÁLOGO DE ATIVOS ---
+
+@router.get("/assets/", response_model=schemas.AssetPaginatedResponse)
+def get_all_assets(
+    page: int = Query(1, ge=1, description="Número da página"),
+    size: int = Query(50, ge=1, le=200, description="Itens por página"),
+    asset_type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    query = db.query(Asset)
+    if asset_type:
+        query = query.filter(Asset.asset_type == asset_type)
+
+    total = query.count()
+    items = query.order_by(Asset.symbol.asc()).offset((page - 1) * size).limit(size).all()
+    return {"items": items, "total": total, "page": page, "size": size, "pages": math.ceil(total / size)}
+
+@router.get("/assets/search", response_model=List[schemas.AssetResponse])
+def search_assets(
+    q: str = Query(..., min_length=1, max_length=50, description="Prefixo do símbolo ou de uma palavra do nome"),
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Autocomplete servido do índice em memória (não consulta a BD depois de carregado)."""
+    return asset_index.search(db, q, limit)
 
-@router.get("/assets/", response_model=List[schemas.AssetResponse])
-def get_all_assets(db: Session = Depends(get_db)):
-    return db.query(Asset).all()
\ No newline at end of file
@@ -1,17 +1,49 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, joinedload, noload
 from sqlalchemy import desc, asc
 from typing import List, Optional
 from datetime import date
 import math
 
 from app.database.database import get_db
-from app.models import Transaction, Account, User, TransactionType, Holding, Category, SubCategory, Asset
+from app.models import Transaction, Account, User, Holding, Category, SubCategory, Asset
 from app.schemas import schemas
 from app.utils.auth import get_current_user
+from app.services.asset_index import asset_index, asset_row
+from app.services.lookup_registry import lookup_registry
+from app.services.balance_service import BalanceService
+from app.services.category_cache import category_cache
+from app.services.holdings_service import HoldingsService
+from app.services.lots_service import LotsService
+from app.services.ledger import unit_price
+from app.services.fx_service import infer_asset_currency
+from app.services.matching_service import MatchingService, DEFAULT_WINDOW_DAYS, DEFAULT_SIMILARITY
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
+# Tudo o que o TransactionResponse serializa, carregado na mesma query (a categoria vem da cache)
+RESPONSE_OPTIONS = (
+    joinedload(Transaction.transaction_type),
+    joinedload(Transaction.subcategory),
+    joinedload(Transaction.asset),
+    joinedload(Transaction.account).joinedload(Account.account_type),
+    noload(Transaction.category),
+)
+
+
+def _serialize(db: Session, user_id: int, transactions: List[Transaction]) -> List[schemas.TransactionResponse]:
+    items = []
+    for tx in transactions:
+        item = schemas.TransactionResponse.model_validate(tx)
+        item.category = category_cache.category(db, user_id, tx.category_id)
+        items.append(item)
+    return items
+
+
+def _response(db: Session, user_id: int, transaction_id: int) -> schemas.TransactionResponse:
+    tx = db.query(Transaction).options(*RESPONSE_OPTIONS).filter(Transaction.id == transaction_id).one()
+    return _serialize(db, user_id, [tx])[0]
+
 # --- LISTAR (Paginado e Filtrado) ---
 @router.get("/", response_model=schemas.TransactionPaginatedResponse)
 def read_transactions(
@@ -30,7 +62,7 @@ def read_transactions(
     # Calcular skip baseado na página
     skip = (page - 1) * size
     
-    user_account_ids = [acc.id for acc in current_user.accounts]
+    user_account_ids = [acc_id for (acc_id,) in db.query(Account.id).filter(Account.user_id == current_user.id)]
     
     # Base Query
     query = db.query(Transaction).filter(
@@ -74,22 +106,28 @@ def read_transactions(
         query = query.order_by(Transaction.date.desc(), Transaction.id.desc())
 
     # --- PAGINAÇÃO E FETCH ---
-    transactions = query.options(
-        joinedload(Transaction.transaction_type),
-        joinedload(Transaction.subcategory), 
-        joinedload(Transaction.asset),
-        joinedload(Transaction.account),
-        joinedload(Transaction.category) # Carregar categoria também
-    ).offset(skip).limit(size).all()
+    transactions = query.options(*RESPONSE_OPTIONS).offset(skip).limit(size).all()
 
     return {
-        "items": transactions,
+        "items": _serialize(db, current_user.id, transactions),
         "total": total,
         "page": page,
         "size": size,
         "pages": pages
     }
 
+# --- REVISÃO (quase-duplicados e transferências entre contas) ---
+@router.get("/review", response_model=schemas.MatchReviewResponse)
+def review_matches(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    window_days: int = Query(DEFAULT_WINDOW_DAYS, ge=0, le=31, description="Distância máxima em dias"),
+    similarity: float = Query(DEFAULT_SIMILARITY, ge=0, le=1, description="Semelhança mínima das descrições"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return MatchingService.review(db, current_user.id, start_date, end_date, window_days, similarity)
+
 # --- CRIAR ---
 @router.post("/", response_model=schemas.TransactionResponse, status_code=status.HTTP_201_CREATED)
 def create_transaction(tx: schemas.TransactionCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -98,15 +136,11 @@ def create_transaction(tx: schemas.TransactionCreate, db: Session = Depends(get_
     if not account or account.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Não tem permissão para usar esta conta.")
 
-    tx_type = db.query(TransactionType).filter(TransactionType.id == tx.transaction_type_id).first()
+    tx_type = lookup_registry.transaction_type(db, tx.transaction_type_id)
     if not tx_type: raise HTTPException(status_code=404, detail="Tipo inválido")
 
-    # 2. DEFINIR O SINAL DO VALOR
-    negative_keywords = ["Despesa", "Expense", "Levantamento", "Compra", "Buy", "Saída"]
-    is_negative_action = any(word in tx_type.name for word in negative_keywords)
-    
-    # Normalizar o valor (Despesa/Investimento = Negativo)
-    final_amount = -abs(tx.amount) if is_negative_action else abs(tx.amount)
+    # 2. DEFINIR O SINAL DO VALOR (guardado no tipo: Despesa/Investimento = Negativo)
+    final_amount = tx_type.signed(tx.amount)
 
     asset_id_to_save = None
 
@@ -117,13 +151,17 @@ def create_transaction(tx: schemas.TransactionCreate, db: Session = Depends(get_
         # Verificar ou Criar Asset
         asset = db.query(Asset).filter(Asset.symbol == symbol_upper).first()
         if not asset:
-            asset = Asset(symbol=symbol_upper, name=symbol_upper, asset_type="Stock")
+            asset = Asset(symbol=symbol_upper, name=symbol_upper, asset_type="Stock", currency=infer_asset_currency(symbol_upper))
             db.add(asset)
             db.commit()
             db.refresh(asset)
+            asset_index.add([asset_row(asset)])
         
         asset_id_to_save = asset.id
 
+        # Bloquear a conta até ao commit: a posição e os lotes são lidos e reescritos a seguir
+        BalanceService.lock_accounts(db, [account.id])
+
         # Gerir Holding (Posição na Carteira)
         holding = db.query(Holding).filter(Holding.account_id == account.id, Holding.asset_id == asset.id).first()
         if not holding:
@@ -131,15 +169,20 @@ def create_transaction(tx: schemas.TransactionCreate, db: Session = Depends(get_
             db.add(holding)
         
         # Compra vs Venda
-        is_buy_asset = any(k in tx_type.name for k in ["Compra", "Buy"])
+        is_buy_asset = tx_type.is_buy
+
+        # Preço unitário da compra/venda (a mesma regra usada ao reconstruir a partir do ledger)
+        p_unit = unit_price(final_amount, tx.quantity, tx.price_per_unit)
+
+        # Com transações posteriores na mesma posição, os lotes têm de ser consumidos pela ordem das datas
+        backdated = db.query(Transaction.id).filter(
+            Transaction.account_id == account.id, Transaction.asset_id == asset.id, Transaction.date > tx.date
+        ).first() is not None
         
         if is_buy_asset:
             # Cálculo de Preço Médio
             current_total_val = holding.quantity * holding.avg_buy_price
             
-            # Preço da nova compra
-            p_unit = tx.price_per_unit if (tx.price_per_unit and tx.price_per_unit > 0) else (abs(final_amount) / tx.quantity if tx.quantity > 0 else 0)
-            
             cost_of_this_buy = tx.quantity * p_unit
             new_total_val = current_total_val + cost_of_this_buy
             
@@ -152,8 +195,8 @@ def create_transaction(tx: schemas.TransactionCreate, db: Session = Depends(get_
             holding.quantity -= tx.quantity
             if holding.quantity < 0: holding.quantity = 0
 
-    # 4. Atualizar Saldo da Conta
-    account.current_balance += final_amount
+    # 4. Atualizar Saldo da Conta (incremento atómico na BD)
+    BalanceService.apply_delta(db, account.id, final_amount)
     
     # 5. Criar Objeto da Transação
     tx_data = tx.model_dump() if hasattr(tx, 'model_dump') else tx.dict()
@@ -163,14 +206,16 @@ def create_transaction(tx: schemas.TransactionCreate, db: Session = Depends(get_
 
     # Limpar campos que não pertencem à tabela Transactions
     tx_data.pop('symbol', None)
-    tx_data.pop('quantity', None)
-    tx_data.pop('price_per_unit', None)
     
-    # Ligar o Asset ID se existir
+    # Ligar o Asset ID (e guardar a quantidade e o preço indicado, necessários para reconstruir posições e lotes)
     if asset_id_to_save:
         tx_data['asset_id'] = asset_id_to_save
+        if not (tx.price_per_unit and tx.price_per_unit > 0):
+            tx_data['price_per_unit'] = None
     else:
-         tx_data.pop('asset_id', None)
+        tx_data.pop('asset_id', None)
+        tx_data.pop('quantity', None)
+        tx_data.pop('price_per_unit', None)
 
     if 'sub_category_id' in tx_data:
         tx_data['subcategory_id'] = tx_data.pop('sub_category_id')
@@ -179,73 +224,86 @@ def create_transaction(tx: schemas.TransactionCreate, db: Session = Depends(get_
     db_tx = Transaction(**tx_data)
     
     db.add(db_tx)
-    db.add(account)
+
+    # 6. Lotes Fiscais (compra abre um lote, venda consome lotes e grava o ganho realizado)
+    if asset_id_to_save:
+        db.flush()
+        if backdated:
+            # Reproduzir a posição pela ordem das datas, como ao editar/apagar
+            LotsService.rebuild(db, account.id, asset_id_to_save, LotsService.user_method(db, current_user.id))
+            HoldingsService.rebuild_holding(db, account.id, asset_id_to_save)
+        elif is_buy_asset:
+            LotsService.record_buy(db, db_tx, p_unit)
+        else:
+            LotsService.record_sell(db, db_tx, p_unit, LotsService.user_method(db, current_user.id))
     
     db.commit()
-    db.refresh(db_tx)
-    return db_tx
+    return _response(db, current_user.id, db_tx.id)
 
 # --- APAGAR ---
 @router.delete("/{transaction_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_transaction(transaction_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    tx = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    # Ordem de locks: transação -> conta (ver BalanceService)
+    tx = db.query(Transaction).filter(Transaction.id == transaction_id).with_for_update().first()
     if not tx: raise HTTPException(status_code=404, detail="Não encontrado")
     
-    account = db.query(Account).filter(Account.id == tx.account_id).first()
+    account = BalanceService.lock_accounts(db, [tx.account_id]).get(tx.account_id)
     if not account or account.user_id != current_user.id: raise HTTPException(status_code=403, detail="Não permitido.")
     
-    # Reverter Saldo
-    account.current_balance -= tx.amount
+    # Reverter Saldo (as importadas guardam o valor absoluto: o sinal vem do tipo)
+    tx_type = lookup_registry.transaction_type(db, tx.transaction_type_id)
+    BalanceService.apply_delta(db, account.id, -(tx_type.signed(tx.amount) if tx_type else abs(tx.amount)))
+
+    # Apagar e reconstruir a Holding a partir do ledger (repõe também o preço médio)
+    asset_id, quantity, tx_type_id = tx.asset_id, tx.quantity, tx.transaction_type_id
+    db.delete(tx)
+    db.flush()
+
+    if asset_id:
+        LotsService.rebuild(db, account.id, asset_id, LotsService.user_method(db, current_user.id))
 
-    # Reverter Holding
-    if tx.asset_id and tx.quantity:
-        holding = db.query(Holding).filter(Holding.account_id == account.id, Holding.asset_id == tx.asset_id).first()
+    if asset_id and quantity and not HoldingsService.rebuild_holding(db, account.id, asset_id):
+        # Posição com transações antigas sem quantidade: reverter só a quantidade desta
+        holding = db.query(Holding).filter(Holding.account_id == account.id, Holding.asset_id == asset_id).first()
         if holding:
-            if not tx.transaction_type:
-                 tx.transaction_type = db.query(TransactionType).filter(TransactionType.id == tx.transaction_type_id).first()
-            
-            is_buy = any(k in tx.transaction_type.name for k in ["Compra", "Buy"])
-            
-            if is_buy:
-                holding.quantity -= tx.quantity
+            if tx_type and tx_type.is_buy:
+                holding.quantity -= quantity
             else:
-                holding.quantity += tx.quantity
+                holding.quantity += quantity
             
             if holding.quantity < 0: holding.quantity = 0
 
-    db.delete(tx)
-    db.add(account)
     db.commit()
     return None
 
 # --- EDITAR ---
 @router.put("/{transaction_id}", response_model=schemas.TransactionResponse)
 def update_transaction(transaction_id: int, updated_tx: schemas.TransactionCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    db_tx = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    # Ordem de locks: transação -> contas por id (ver BalanceService)
+    db_tx = db.query(Transaction).filter(Transaction.id == transaction_id).with_for_update().first()
     if not db_tx: raise HTTPException(status_code=404, detail="Transação não encontrada")
 
-    old_account = db.query(Account).filter(Account.id == db_tx.account_id).first()
+    locked = BalanceService.lock_accounts(db, [db_tx.account_id, updated_tx.account_id])
+    old_account = locked.get(db_tx.account_id)
     if not old_account or old_account.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Sem permissão.")
         
-    new_account = db.query(Account).filter(Account.id == updated_tx.account_id).first()
+    new_account = locked.get(updated_tx.account_id)
     if not new_account or new_account.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Sem permissão no destino.")
 
-    # 1. Reverter Saldo Antigo
-    old_account.current_balance -= db_tx.amount
+    # 1. Reverter Saldo Antigo (o sinal vem do tipo: as importadas guardam o valor absoluto)
+    old_type = lookup_registry.transaction_type(db, db_tx.transaction_type_id)
+    BalanceService.apply_delta(db, old_account.id, -(old_type.signed(db_tx.amount) if old_type else abs(db_tx.amount)))
 
     # 2. Calcular Novo Valor com Sinal
-    new_type = db.query(TransactionType).filter(TransactionType.id == updated_tx.transaction_type_id).first()
+    new_type = lookup_registry.transaction_type(db, updated_tx.transaction_type_id)
     if not new_type: raise HTTPException(status_code=404, detail="Tipo inválido")
-    
-    negative_keywords = ["Despesa", "Expense", "Levantamento", "Compra", "Buy", "Saída"]
-    is_negative_new = any(word in new_type.name for word in negative_keywords)
-    
-    final_new_amount = -abs(updated_tx.amount) if is_negative_new else abs(updated_tx.amount)
+
+    final_new_amount = new_type.signed(updated_tx.amount)
 
     # 3. Aplicar Novo Saldo
-    new_account.current_balance += final_new_amount
+    BalanceService.apply_delta(db, new_account.id, final_new_amount)
 
     # 4. Atualizar Objeto Transaction
     tx_data = updated_tx.model_dump() if hasattr(updated_tx, 'model_dump') else updated_tx.dict()
@@ -253,8 +311,10 @@ def update_transaction(transaction_id: int, updated_tx: schemas.TransactionCreat
     
     tx_data.pop('symbol', None)
     tx_data.pop('quantity', None)
-    tx_data.pop('price_per_unit', None)
     tx_data.pop('asset_id', None) 
+    # Preço unitário: só muda se vier indicado (sem ele mantém-se o guardado)
+    if not (db_tx.asset_id and updated_tx.price_per_unit and updated_tx.price_per_unit > 0):
+        tx_data.pop('price_per_unit', None)
     
     if 'sub_category_id' in tx_data:
         tx_data['subcategory_id'] = tx_data.pop('sub_category_id')
@@ -263,9 +323,15 @@ def update_transaction(transaction_id: int, updated_tx: schemas.TransactionCreat
         if hasattr(db_tx, key):
             setattr(db_tx, key, value)
     
-    db.add(old_account)
-    if new_account.id != old_account.id: db.add(new_account)
     db.add(db_tx)
+
+    # 5. Reconstruir as Holdings e Lotes afetados (o valor/conta mudou, logo o preço médio também)
+    if db_tx.asset_id:
+        db.flush()
+        method = LotsService.user_method(db, current_user.id)
+        for account_id in {new_account.id, old_account.id}:
+            HoldingsService.rebuild_holding(db, account_id, db_tx.asset_id)
+            LotsService.rebuild(db, account_id, db_tx.asset_id, method)
+
     db.commit()
-    db.refresh(db_tx)
-    return db_tx
\ No newline at end of file
+    return _response(db, current_user.id, db_tx.id)
\ No newline at end of file
@@ -1,15 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List
 
 from app.database.database import get_db
 from app.models.user import User, UserProfile
 from app.schemas import schemas
 from app.utils.auth import get_current_user, get_password_hash
+from app.services.lots_service import LotsService
 
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+
+def _with_profile(db: Session, user_id: int) -> User:
+    """Utilizador (re)carregado com o perfil, como o UserResponse o devolve."""
+    return db.query(User).options(joinedload(User.profile)).filter(User.id == user_id).one()
+
 # --- 1. CRIAR UTILIZADOR (Público) ---
 @router.post("/", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -27,8 +33,7 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     
     db.add(new_user)
     db.commit()
-    db.refresh(new_user)
-    return new_user
+    return _with_profile(db, new_user.id)
 
 # --- 2. PERFIL DO PRÓPRIO (Autenticado) ---
 @router.get("/me", response_model=schemas.UserResponse)
@@ -58,28 +63,39 @@ def update_user_me(
     if user_update.preferred_currency is not None:
         current_user.profile.preferred_currency = user_update.preferred_currency
 
+    # Mudar o método de custo recalcula os lotes e ganhos realizados de todo o histórico
+    method_changed = (
+        user_update.cost_basis_method is not None
+        and user_update.cost_basis_method != current_user.profile.cost_basis_method
+    )
+    if user_update.cost_basis_method is not None:
+        current_user.profile.cost_basis_method = user_update.cost_basis_method
+
     # (Opcional: Se quiseres permitir mudar password aqui também)
     # if user_update.password:
     #     current_user.password_hash = get_password_hash(user_update.password)
 
     db.add(current_user.profile) # Garante que o profile é marcado para update
     db.commit()
-    db.refresh(current_user)
-    
-    return current_user
+
+    if method_changed:
+        LotsService.rebuild_users(db, [current_user.id])
+
+    return _with_profile(db, current_user.id)
 
 # --- 4. LISTAR TODOS (ADMIN ONLY) - A ROTA QUE FALTAVA ---
-@router.get("/", response_model=List[schemas.UserResponse])
+@router.get("/", response_model=List[schemas.UserResponse], deprecated=True)
 def read_all_users(
     skip: int = 0, 
     limit: int = 100, 
     db: Session = Depends(get_db), 
     current_user: User = Depends(get_current_user)
 ):
+    """Substituído por GET /admin/users (paginação por cursor e estatísticas por utilizador)."""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Acesso reservado a administradores.")
     
-    users = db.query(User).offset(skip).limit(limit).all()
+    users = db.query(User).options(joinedload(User.profile)).offset(skip).limit(limit).all()
     return users
 
 # --- 5. MUDAR ROLE (ADMIN ONLY) ---
@@ -102,5 +118,4 @@ def update_user_role(
     
     user_to_edit.role = role
     db.commit()
-    db.refresh(user_to_edit)
-    return user_to_edit
\ No newline at end of file
+    return _with_profile(db, user_to_edit.id)
\ No newline at end of file
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Optional, List, Literal
 
 # --- 1. SCHEMAS AUXILIARES (Lookups) ---
 class Token(BaseModel):
@@ -21,6 +21,8 @@ class TransactionTypeBase(BaseModel):
 
 class TransactionTypeResponse(TransactionTypeBase):
     id: int
+    sign: int = 1       # -1 sai da conta, +1 entra
+    kind: str = "income"  # expense, income, buy, sell
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -30,6 +32,7 @@ class UserProfileBase(BaseModel):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     preferred_currency: str = "EUR"
+    cost_basis_method: Literal["fifo", "average"] = "fifo"
 
 class UserProfileCreate(UserProfileBase):
     pass
@@ -51,6 +54,7 @@ class UserUpdate(BaseModel):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     preferred_currency: Optional[str] = None
+    cost_basis_method: Optional[Literal["fifo", "average"]] = None
     password: Optional[str] = None
 
 class UserResponse(UserBase):
@@ -61,6 +65,20 @@ class UserResponse(UserBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class AdminUserStats(BaseModel):
+    id: int
+    email: str
+    role: str
+    created_at: datetime
+    account_count: int
+    transaction_count: int
+    last_activity: Optional[date] = None
+    total_balance: float  # Soma nominal dos saldos das contas (sem conversão cambial)
+
+class AdminUserListResponse(BaseModel):
+    items: List[AdminUserStats]
+    next_cursor: Optional[str] = None  # None = última página
+
 
 # --- 3. CATEGORIAS ---
 
@@ -88,6 +106,26 @@ class CategoryResponse(CategoryBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class CategoryMerge(BaseModel):
+    target_category_id: int
+
+class SubCategoryReassign(BaseModel):
+    target_category_id: int
+    target_subcategory_id: Optional[int] = None
+
+class CategoryRuleCreate(BaseModel):
+    category_id: int
+    subcategory_id: Optional[int] = None
+    pattern: Optional[str] = None
+    match_type: Literal["contains", "regex"] = "contains"
+    min_amount: Optional[float] = Field(None, ge=0)  # Valor absoluto
+    max_amount: Optional[float] = Field(None, ge=0)
+    priority: int = 100
+
+class CategoryRuleResponse(CategoryRuleCreate):
+    id: int
+    model_config = ConfigDict(from_attributes=True)
+
 
 # --- 4. ATIVOS (ASSETS) ---
 
@@ -95,6 +133,7 @@ class AssetBase(BaseModel):
     symbol: str
     name: str
     asset_type: str
+    currency: str = "EUR"
 
 class AssetCreate(AssetBase):
     pass
@@ -103,12 +142,20 @@ class AssetResponse(AssetBase):
     id: int
     model_config = ConfigDict(from_attributes=True)
 
+class AssetPaginatedResponse(BaseModel):
+    items: List[AssetResponse]
+    total: int
+    page: int
+    size: int
+    pages: int
+
 
 # --- 5. CONTAS ---
 
 class AccountBase(BaseModel):
     name: str
     current_balance: float = 0.0
+    currency: str = Field("EUR", pattern="^[A-Z]{3}$")
 
 class AccountCreate(AccountBase):
     account_type_id: int # O utilizador escolhe o ID (ex: 1=Banco, 2=Corretora)
@@ -191,13 +238,134 @@ class PortfolioPosition(BaseModel):
     current_price: float
     total_value: float
     profit_loss: float
+    currency: str = "EUR"       # Moeda dos valores desta posição
+    # Sem taxa de câmbio para o preço: valorizada ao custo (P/L 0); sem taxa para a moeda
+    # da conta: valores na moeda da conta e fora dos totais
+    fx_missing: bool = False
 
 class PortfolioResponse(BaseModel):
     user_id: int
+    currency: str = "EUR"       # Moeda de apresentação (preferred_currency do utilizador)
     total_net_worth: float      # O Grande Total (Bancos + Investimentos)
     total_cash: float           # Apenas contas bancárias
     total_invested: float       # Apenas ações/crypto
     positions: List[PortfolioPosition]
+    unconverted_currencies: List[str] = []  # Moedas sem taxas de câmbio (contas/posições fora dos totais)
+
+class PortfolioHistoryPoint(BaseModel):
+    date: str               # "2024-01-31"
+    market_value: float     # Valor de mercado das posições nesse dia
+    cost_basis: float       # Custo de aquisição (preço médio ponderado)
+    unrealized_pl: float    # market_value - cost_basis
+    unconverted: List[str] = []  # Símbolos sem taxa de câmbio nesse dia (fora dos totais ou ao custo)
+
+class TaxLotResponse(BaseModel):
+    id: int
+    account_id: int
+    symbol: str
+    acquired_date: date
+    quantity: float
+    remaining_quantity: float
+    unit_cost: float
+    current_price: float
+    unrealized_pl: float
+    fx_missing: bool = False    # Sem taxa de câmbio para o preço: valorizado ao custo
+
+class RealizedGainResponse(BaseModel):
+    id: int
+    transaction_id: int
+    lot_id: Optional[int] = None
+    account_id: int
+    symbol: str
+    date: date
+    quantity: float
+    proceeds: float
+    cost_basis: float
+    realized_pl: float
+
+class RealizedGainsReport(BaseModel):
+    year: int
+    total_proceeds: float
+    total_cost_basis: float
+    total_realized_pl: float
+    items: List[RealizedGainResponse]
+
+class FxRateCreate(BaseModel):
+    base: str = Field(..., pattern="^[A-Z]{3}$")
+    quote: str = Field(..., pattern="^[A-Z]{3}$")
+    date: date
+    rate: float = Field(..., gt=0)
+
+class ImportJobResponse(BaseModel):
+    id: int
+    account_id: int
+    filename: str
+    status: str
+    rows_parsed: int
+    added: int
+    duplicates: int
+    errors: int
+    error_samples: Optional[List[dict]] = None
+    near_duplicates: int = 0
+    transfer_candidates: int = 0
+    error_message: Optional[str] = None
+    rows_per_second: Optional[float] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class ImportPreviewResponse(BaseModel):
+    token: str
+    filename: str
+    expires_in_seconds: int
+    column_mapping: dict
+    rows_parsed: int
+    new: int
+    duplicates: int
+    errors: int
+    new_sample: List[dict]
+    duplicate_sample: List[dict]
+    error_samples: List[dict]
+
+class BatchFileResult(BaseModel):
+    filename: str
+    account_id: int
+    status: str
+    rows_parsed: int
+    added: int
+    duplicates: int
+    errors: int
+    error_samples: List[dict] = []
+    near_duplicates: int = 0
+    transfer_candidates: int = 0
+    error_message: Optional[str] = None
+
+class BatchImportResponse(BaseModel):
+    files: List[BatchFileResult]
+    added: int
+    duplicates: int
+    errors: int
+    failed_files: int
+    elapsed_seconds: float
+
+class NearDuplicatePair(BaseModel):
+    transaction_ids: List[int]
+    amount: float
+    days_apart: int
+    similarity: float
+
+class TransferPair(BaseModel):
+    outgoing_id: int
+    incoming_id: int
+    from_account_id: int
+    to_account_id: int
+    amount: float
+    days_apart: int
+
+class MatchReviewResponse(BaseModel):
+    near_duplicates: List[NearDuplicatePair]
+    transfers: List[TransferPair]
 
 class HistoryPoint(BaseModel):
     date: str   # "2023-11-01"
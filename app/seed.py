@@ -98,7 +98,7 @@ def run_seed():
 
             # Create Accounts
             # Saldo inicial será ajustado pelas transações, mas começamos com um valor base
-            main_account = Account(user_id=user.id, name=f"Banco Principal", account_type_id=1, current_balance=0)
+            main_account = Account(user_id=user.id, name=f"Banco Principal", account_type_id=1, current_balance=0, opening_balance=1000.0)
             db.add(main_account)
 
             investment_account = None
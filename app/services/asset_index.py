@@ -0,0 +1,113 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import Asset
+
+SEARCH_LIMIT = 10
+# Acima disto, é mais barato reordenar tudo do que inserir chave a chave
+BULK_MERGE_THRESHOLD = 1000
+
+_WORDS = re.compile(r"[^0-9A-Z]+")
+
+
+def search_key(text: Optional[str]) -> str:
+    """Maiúsculas e sem acentos: "Ação" e "acao" dão a mesma chave."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).upper().strip()
+
+
+def asset_row(asset: Asset) -> dict:
+    return {"id": asset.id, "symbol": asset.symbol, "name": asset.name, "asset_type": asset.asset_type, "currency": asset.currency}
+
+
+class AssetSearchIndex:
+    """
+    Índice em memória para o autocomplete de ativos (`/assets/search`).
+
+    Duas listas ordenadas de (chave, asset_id): os símbolos e cada palavra do nome. Um prefixo
+    é uma fatia contígua da lista, encontrada por pesquisa binária, e a leitura pára ao fim de
+    `limit` resultados, por isso o custo não depende do tamanho do catálogo.
+    Ativos novos entram por inserção ordenada (bisect), sem reconstruir o índice.
+    """
+
+    def __init__(self):
+        # (ativos por id, símbolos ordenados, palavras dos nomes ordenadas); None = ainda não carregado
+        self._state: Optional[Tuple[Dict[int, dict], List[Tuple[str, int]], List[Tuple[str, int]]]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(rows: Iterable[dict]) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+        symbols, words = [], []
+        for row in rows:
+            symbols.append((search_key(row["symbol"]), row["id"]))
+            words.extend((word, row["id"]) for word in set(_WORDS.split(search_key(row["name"]))) if word)
+        return symbols, words
+
+    @staticmethod
+    def _merge(keys: List[Tuple[str, int]], new: List[Tuple[str, int]]) -> None:
+        if len(new) > BULK_MERGE_THRESHOLD:
+            keys.extend(new)
+            keys.sort()
+        else:
+            for key in new:
+                insort(keys, key)
+
+    def load(self, db: Session) -> Tuple[Dict[int, dict], List[Tuple[str, int]], List[Tuple[str, int]]]:
+        assets = {
+            row.id: dict(row._mapping)
+            for row in db.query(Asset.id, Asset.symbol, Asset.name, Asset.asset_type, Asset.currency)
+        }
+        symbols, words = self._keys(assets.values())
+        symbols.sort()
+        words.sort()
+        state = (assets, symbols, words)
+        with self._lock:
+            self._state = state
+        return state
+
+    def add(self, rows: List[dict]) -> None:
+        """Ativos acabados de inserir (depois do commit). Se o índice ainda não foi carregado, já os vai ler da BD."""
+        with self._lock:
+            if self._state is None or not rows:
+                return
+            assets, symbols, words = self._state
+            fresh = [row for row in rows if row["id"] not in assets]
+            if not fresh:
+                return
+            new_symbols, new_words = self._keys(fresh)
+            assets.update((row["id"], row) for row in fresh)
+            self._merge(symbols, new_symbols)
+            self._merge(words, new_words)
+
+    def search(self, db: Session, query: str, limit: int = SEARCH_LIMIT) -> List[dict]:
+        """Símbolo exato primeiro, depois símbolos que começam por `query`, depois nomes com uma palavra que começa por `query`."""
+        prefix = search_key(query)
+        if not prefix:
+            return []
+        # Referência local: um `invalidate()` entre a verificação e a leitura não deixa o estado a None
+        with self._lock:
+            state = self._state
+        if state is None:
+            state = self.load(db)
+
+        found: Dict[int, None] = {}
+        with self._lock:
+            assets, symbols, words = state
+            for keys in (symbols, words):
+                i = bisect_left(keys, (prefix,))
+                while i < len(keys) and len(found) < limit and keys[i][0].startswith(prefix):
+                    found.setdefault(keys[i][1])
+                    i += 1
+            return [assets[asset_id] for asset_id in found]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._state = None
+
+
+asset_index = AssetSearchIndex()
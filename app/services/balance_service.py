@@ -0,0 +1,34 @@
+from typing import Dict, Iterable
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models import Account
+
+
+class BalanceService:
+    """
+    Mutações de saldo seguras com escritas concorrentes.
+
+    Ordem de locks (sempre a mesma, para não haver deadlocks entre pedidos):
+    transação -> contas (por id crescente) -> holdings/lotes da conta.
+    """
+
+    @staticmethod
+    def apply_delta(db: Session, account_id: int, delta: float) -> None:
+        """`SET current_balance = current_balance + :delta`: a soma é feita pela BD, nunca em Python."""
+        if delta:
+            db.execute(
+                update(Account).where(Account.id == account_id)
+                .values(current_balance=Account.current_balance + delta)
+            )
+
+    @staticmethod
+    def lock_accounts(db: Session, account_ids: Iterable[int]) -> Dict[int, Account]:
+        """
+        `SELECT ... FOR UPDATE` das contas por ordem de id. Serializa as alterações às posições
+        (holdings e lotes) de cada conta até ao commit. Em SQLite é ignorado (a BD já serializa escritas).
+        """
+        ids = sorted(set(account_ids))
+        accounts = db.query(Account).filter(Account.id.in_(ids)).order_by(Account.id.asc()).with_for_update().all()
+        return {account.id: account for account in accounts}
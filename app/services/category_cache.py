@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.config import settings
+from app.models import Category
+from app.schemas import schemas
+
+_TREE = TypeAdapter(List[schemas.CategoryResponse])
+
+
+@dataclass(frozen=True)
+class CategoryTree:
+    items: List[schemas.CategoryResponse]
+    by_id: Dict[int, schemas.CategoryResponse]
+    body: bytes  # JSON já serializado da lista, tal como o devolve GET /categories
+
+
+class CategoryTreeCache:
+    """
+    Árvore de categorias (globais + do utilizador, com subcategorias) por utilizador, já validada
+    e serializada. Serve GET /categories sem query e preenche `category` nas listagens de transações.
+    Invalidada sempre que categorias/subcategorias desse utilizador mudam; as globais invalidam todos.
+    Guarda no máximo `max_users` árvores (LRU): os utilizadores inativos saem e são reconstruídos a pedido.
+    """
+
+    def __init__(self, max_users: int = settings.CATEGORY_CACHE_MAX_USERS):
+        self._trees: "OrderedDict[int, CategoryTree]" = OrderedDict()
+        self._max_users = max_users
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> CategoryTree:
+        with self._lock:
+            tree = self._trees.get(user_id)
+            if tree is not None:
+                self._trees.move_to_end(user_id)
+        if tree is None:
+            tree = self._build(db, user_id)
+            with self._lock:
+                self._trees[user_id] = tree
+                self._trees.move_to_end(user_id)
+                while len(self._trees) > self._max_users:
+                    self._trees.popitem(last=False)
+        return tree
+
+    def category(self, db: Session, user_id: int, category_id: Optional[int]) -> Optional[schemas.CategoryResponse]:
+        if category_id is None:
+            return None
+        found = self.get(db, user_id).by_id.get(category_id)
+        if found is None:
+            # Categoria criada noutro processo depois de a árvore ser construída: reconstruir uma vez
+            self.invalidate(user_id)
+            found = self.get(db, user_id).by_id.get(category_id)
+        return found
+
+    @staticmethod
+    def _build(db: Session, user_id: int) -> CategoryTree:
+        categories = db.query(Category).options(selectinload(Category.subcategories)).filter(
+            (Category.user_id == user_id) | (Category.user_id.is_(None))
+        ).order_by(Category.id).all()
+        items = _TREE.validate_python(categories, from_attributes=True)
+        return CategoryTree(items=items, by_id={c.id: c for c in items}, body=_TREE.dump_json(items))
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._trees.clear()
+            else:
+                self._trees.pop(user_id, None)
+
+
+category_cache = CategoryTreeCache()
@@ -0,0 +1,129 @@
+from typing import Dict, Optional
+
+from sqlalchemy import case, delete, update
+from sqlalchemy.orm import Session
+
+from app.models import Category, CategoryRule, SubCategory, Transaction
+from app.services.category_cache import category_cache
+from app.services.rules_service import rule_cache
+
+
+def _owned_category(db: Session, user_id: int, category_id: int) -> Category:
+    category = db.get(Category, category_id)
+    if not category:
+        raise LookupError("Categoria não encontrada.")
+    if category.user_id != user_id:
+        raise PermissionError("Não tem permissão.")
+    return category
+
+
+def _target_category(db: Session, user_id: int, category_id: int) -> Category:
+    """Destino: categoria do utilizador ou global."""
+    category = db.get(Category, category_id)
+    if not category:
+        raise LookupError("Categoria de destino não encontrada.")
+    if category.user_id not in (None, user_id):
+        raise PermissionError("Não tem permissão na categoria de destino.")
+    return category
+
+
+def _remap(column, mapping: Dict[int, Optional[int]]):
+    """`CASE column WHEN origem THEN destino ... ELSE column END` (ou a própria coluna se não há nada a trocar)."""
+    return case(mapping, value=column, else_=column) if mapping else column
+
+
+class CategoryService:
+    """
+    Reorganização de categorias em massa: cada operação é um punhado de UPDATEs set-based
+    (independente do nº de transações) numa única transação da BD.
+    Os saldos não dependem da categoria; as caches de árvore e de regras do utilizador são invalidadas.
+    """
+
+    @staticmethod
+    def merge(db: Session, user_id: int, source_id: int, target_id: int) -> dict:
+        """
+        Junta `source` em `target` e apaga `source`. As subcategorias com o mesmo nome de uma do destino
+        fundem-se com ela; as restantes passam para o destino (numa categoria global, que é partilhada,
+        não se criam subcategorias: as transações ficam só com a categoria).
+        """
+        source = _owned_category(db, user_id, source_id)
+        target = _target_category(db, user_id, target_id)
+        if source.id == target.id:
+            raise ValueError("A categoria de origem e de destino são a mesma.")
+
+        target_subs = {(name or "").strip().lower(): sub_id for sub_id, name in
+                       db.query(SubCategory.id, SubCategory.name).filter(SubCategory.category_id == target.id)}
+        mapping: Dict[int, Optional[int]] = {}
+        moved = []
+        for sub_id, name in db.query(SubCategory.id, SubCategory.name).filter(SubCategory.category_id == source.id):
+            match = target_subs.get((name or "").strip().lower())
+            if match is None and target.user_id == user_id:
+                moved.append(sub_id)
+            else:
+                mapping[sub_id] = match
+        source_subs = moved + list(mapping)
+
+        # 1. Transações (todas as que apontam para a origem, com um único UPDATE)
+        tx_filter = Transaction.category_id == source.id
+        if source_subs:
+            tx_filter = tx_filter | Transaction.subcategory_id.in_(source_subs)
+        transactions = db.execute(
+            update(Transaction).where(tx_filter)
+            .values(category_id=target.id, subcategory_id=_remap(Transaction.subcategory_id, mapping))
+            .execution_options(synchronize_session=False)
+        ).rowcount or 0
+
+        # 2. Regras de categorização passam a apontar para o destino
+        rules = db.execute(
+            update(CategoryRule).where(CategoryRule.category_id == source.id)
+            .values(category_id=target.id, subcategory_id=_remap(CategoryRule.subcategory_id, mapping))
+            .execution_options(synchronize_session=False)
+        ).rowcount or 0
+
+        # 3. Subcategorias: mover as que não existem no destino, apagar as fundidas, e por fim a origem
+        if moved:
+            db.execute(update(SubCategory).where(SubCategory.id.in_(moved)).values(category_id=target.id)
+                       .execution_options(synchronize_session=False))
+        if mapping:
+            db.execute(delete(SubCategory).where(SubCategory.id.in_(list(mapping))).execution_options(synchronize_session=False))
+        db.execute(delete(Category).where(Category.id == source.id).execution_options(synchronize_session=False))
+        db.commit()
+        db.expunge(source)
+
+        category_cache.invalidate(user_id)
+        rule_cache.invalidate(user_id)
+        return {"transactions": transactions, "rules": rules, "subcategories_moved": len(moved), "subcategories_merged": len(mapping)}
+
+    @staticmethod
+    def reassign_subcategory(db: Session, user_id: int, subcategory_id: int, target_category_id: int,
+                             target_subcategory_id: Optional[int] = None) -> dict:
+        """Move as transações (e regras) de uma subcategoria para outra categoria/subcategoria e apaga-a."""
+        sub = db.get(SubCategory, subcategory_id)
+        if not sub:
+            raise LookupError("Subcategoria não encontrada.")
+        _owned_category(db, user_id, sub.category_id)
+        target = _target_category(db, user_id, target_category_id)
+        if target_subcategory_id is not None:
+            target_sub = db.get(SubCategory, target_subcategory_id)
+            if not target_sub or target_sub.category_id != target.id:
+                raise ValueError("A subcategoria de destino não pertence à categoria de destino.")
+            if target_sub.id == sub.id:
+                raise ValueError("A subcategoria de origem e de destino são a mesma.")
+
+        transactions = db.execute(
+            update(Transaction).where(Transaction.subcategory_id == sub.id)
+            .values(category_id=target.id, subcategory_id=target_subcategory_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount or 0
+        rules = db.execute(
+            update(CategoryRule).where(CategoryRule.subcategory_id == sub.id)
+            .values(category_id=target.id, subcategory_id=target_subcategory_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount or 0
+        db.execute(delete(SubCategory).where(SubCategory.id == sub.id).execution_options(synchronize_session=False))
+        db.commit()
+        db.expunge(sub)
+
+        category_cache.invalidate(user_id)
+        rule_cache.invalidate(user_id)
+        return {"transactions": transactions, "rules": rules}
@@ -0,0 +1,149 @@
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.database import dialect_insert
+from app.models import FxRate
+
+# Sufixos de símbolos cotados noutra moeda (ex: BTC-USD no Yahoo Finance)
+SYMBOL_CURRENCY_SUFFIXES = {"-USD": "USD", "-EUR": "EUR", "-GBP": "GBP"}
+
+
+class FxRateMissing(ValueError):
+    pass
+
+
+def infer_asset_currency(symbol: str) -> str:
+    for suffix, currency in SYMBOL_CURRENCY_SUFFIXES.items():
+        if symbol.upper().endswith(suffix):
+            return currency
+    return settings.DEFAULT_CURRENCY
+
+
+class FxRateCache:
+    """
+    Séries completas de taxas por par, em memória (arrays ordenados por data).
+    Cada par é lido da BD uma vez e invalidado quando há novas taxas para ele.
+    """
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, base: str, quote: str) -> Tuple[np.ndarray, np.ndarray]:
+        key = (base, quote)
+        with self._lock:
+            cached = self._series.get(key)
+        if cached is not None:
+            return cached
+
+        rows = db.query(FxRate.date, FxRate.rate).filter(
+            FxRate.base == base, FxRate.quote == quote
+        ).order_by(FxRate.date.asc()).all()
+        series = (
+            np.array([d for d, _ in rows], dtype="datetime64[D]"),
+            np.array([r for _, r in rows], dtype=float),
+        )
+        with self._lock:
+            self._series[key] = series
+        return series
+
+    def invalidate(self, pairs: Optional[Iterable[Tuple[str, str]]] = None) -> None:
+        with self._lock:
+            if pairs is None:
+                self._series.clear()
+            else:
+                for pair in pairs:
+                    self._series.pop(pair, None)
+
+
+fx_cache = FxRateCache()
+
+
+class FxService:
+    # --- 1. TAXAS (as-of, vetorizado) ---
+    @staticmethod
+    def _direct_asof(db: Session, base: str, quote: str, dates: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Taxa do último dia conhecido <= cada data (antes da primeira, a primeira conhecida),
+        usando o par direto ou o inverso. None se não houver nenhuma taxa do par.
+        """
+        for pair, invert in (((base, quote), False), ((quote, base), True)):
+            known_dates, rates = fx_cache.get(db, *pair)
+            if len(known_dates):
+                idx = np.searchsorted(known_dates, dates, side="right") - 1
+                result = rates[np.clip(idx, 0, None)]
+                return 1.0 / result if invert else result
+        return None
+
+    @staticmethod
+    def rates_asof(db: Session, from_ccy: str, to_ccy: str, dates) -> np.ndarray:
+        """
+        Vetor de taxas from->to para cada data (via moeda pivot se não houver par direto).
+        Só falha (FxRateMissing) se o par não tiver nenhuma taxa: dias sem taxa usam a mais próxima.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if from_ccy == to_ccy:
+            return np.ones(len(dates))
+
+        rates = FxService._direct_asof(db, from_ccy, to_ccy, dates)
+        if rates is None:
+            pivot = settings.DEFAULT_CURRENCY
+            first = FxService._direct_asof(db, from_ccy, pivot, dates) if from_ccy != pivot else np.ones(len(dates))
+            second = FxService._direct_asof(db, pivot, to_ccy, dates) if to_ccy != pivot else np.ones(len(dates))
+            rates = first * second if first is not None and second is not None else np.full(len(dates), np.nan)
+
+        if np.isnan(rates).any():
+            raise FxRateMissing(f"Sem taxas de câmbio {from_ccy}->{to_ccy}.")
+        return rates
+
+    @staticmethod
+    def convert(db: Session, amounts, currencies, dates, to_ccy: str) -> np.ndarray:
+        """Converte uma série inteira (valores com moeda e data por linha) para `to_ccy`, uma junção as-of por moeda."""
+        amounts = np.asarray(amounts, dtype=float)
+        currencies = np.asarray(currencies, dtype=object)
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        result = amounts.copy()
+        for ccy in set(currencies.tolist()):
+            if ccy == to_ccy:
+                continue
+            mask = currencies == ccy
+            result[mask] = amounts[mask] * FxService.rates_asof(db, ccy, to_ccy, dates[mask])
+        return result
+
+    @staticmethod
+    def rate(db: Session, from_ccy: str, to_ccy: str, on: Optional[date] = None) -> float:
+        return float(FxService.rates_asof(db, from_ccy, to_ccy, [on or date.today()])[0])
+
+    @staticmethod
+    def rate_or_none(db: Session, from_ccy: str, to_ccy: str, on: Optional[date] = None) -> Optional[float]:
+        """Como `rate`, mas None sem taxas do par (para marcar só a posição afetada em vez de falhar o pedido)."""
+        try:
+            return FxService.rate(db, from_ccy, to_ccy, on)
+        except FxRateMissing:
+            return None
+
+    # --- 2. ESCRITA ---
+    @staticmethod
+    def upsert_rates(db: Session, rows: List[dict]) -> int:
+        """Upsert por (base, quote, date). Faz commit e invalida os pares afetados na cache."""
+        if not rows:
+            return 0
+        deduped = list({(r["base"], r["quote"], r["date"]): r for r in rows}.values())
+        stmt = dialect_insert(db, FxRate)
+        stmt = stmt.on_conflict_do_update(index_elements=["base", "quote", "date"], set_={"rate": stmt.excluded.rate})
+        db.execute(stmt, deduped)
+        db.commit()
+        fx_cache.invalidate({(r["base"], r["quote"]) for r in deduped})
+        return len(deduped)
+
+
+def user_currency(user) -> str:
+    """Moeda de apresentação do utilizador (perfil) ou a moeda por omissão."""
+    if user.profile and user.profile.preferred_currency:
+        return user.profile.preferred_currency.upper()
+    return settings.DEFAULT_CURRENCY
@@ -0,0 +1,276 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.models import Account, Holding, Transaction, TransactionType, User
+from app.models.types import PRICE_SCALE, QUANTITY_SCALE, from_minor_units, minor_units, to_minor_units, to_scaled
+from app.services.balance_service import BalanceService
+from app.services.lookup_registry import lookup_registry
+from app.services.valuation_service import ValuationService
+
+MAX_DRIFT_SAMPLES = 50
+REBUILD_BATCH_SIZE = 1000
+
+
+class HoldingsService:
+    """
+    Reconstrói holdings (e opcionalmente saldos) a partir do ledger de transações,
+    compara com o que está guardado e reporta/corrige o drift.
+    """
+
+    # --- 1. CÁLCULO ESPERADO (a partir do ledger) ---
+    @staticmethod
+    def _ledger(db: Session, account_ids: List[int]) -> pd.DataFrame:
+        rows = db.query(
+            Transaction.account_id, Transaction.asset_id, Transaction.quantity,
+            Transaction.amount, Transaction.price_per_unit, TransactionType.id
+        ).join(TransactionType, Transaction.transaction_type_id == TransactionType.id).filter(
+            Transaction.account_id.in_(account_ids)
+        ).order_by(Transaction.date.asc(), Transaction.id.asc()).all()
+        ledger = pd.DataFrame(rows, columns=["account_id", "asset_id", "quantity", "amount", "price_per_unit", "type_id"])
+        # Sinal e compra/venda vêm do tipo (sign/kind no registo de tipos), não do nome
+        types = lookup_registry.transaction_types_by_id(db, ledger["type_id"].unique())
+        ledger["is_buy"] = ledger["type_id"].map({i: t.is_buy for i, t in types.items()}).astype(bool)
+        ledger["sign"] = ledger["type_id"].map({i: t.sign for i, t in types.items()}).astype(np.int64)
+        return ledger
+
+    @staticmethod
+    def expected_holdings(ledger: pd.DataFrame) -> pd.DataFrame:
+        """
+        Posição final por (conta, ativo). Chaves com transações sem quantidade (criadas antes
+        de a quantidade ser guardada) não são reconstruíveis e ficam marcadas em `replayable`.
+        """
+        investments = ledger[ledger["asset_id"].notna()].copy()
+        if investments.empty:
+            return pd.DataFrame(columns=["account_id", "asset_id", "quantity", "avg_buy_price", "replayable"])
+
+        investments["asset_id"] = investments["asset_id"].astype(int)
+        unreplayable = investments[investments["quantity"].isna()].groupby(["account_id", "asset_id"]).size()
+
+        replay = investments[investments["quantity"].notna()].copy()
+        replay = ValuationService.replay_positions(replay)
+        final = replay.groupby(["account_id", "asset_id"], sort=False).tail(1)
+
+        expected = pd.DataFrame({
+            "account_id": final["account_id"].to_numpy(),
+            "asset_id": final["asset_id"].to_numpy(),
+            "quantity": final["position"].to_numpy(),
+            "avg_buy_price": (final["cost"] / final["position"]).where(final["position"] > 0, 0.0).to_numpy(),
+        })
+        # Chaves só com transações sem quantidade também aparecem (para não serem apagadas)
+        replayed_keys = set(zip(expected["account_id"], expected["asset_id"]))
+        missing = [k for k in unreplayable.index if k not in replayed_keys]
+        if missing:
+            expected = pd.concat([expected, pd.DataFrame(
+                [{"account_id": a, "asset_id": s, "quantity": 0.0, "avg_buy_price": 0.0} for a, s in missing]
+            )], ignore_index=True)
+        expected["replayable"] = [k not in unreplayable.index for k in zip(expected["account_id"], expected["asset_id"])]
+        return expected
+
+    @staticmethod
+    def expected_balances(ledger: pd.DataFrame) -> pd.Series:
+        """Soma do ledger por conta (com o sinal dado pelo tipo), em cêntimos inteiros: comparação exata com o saldo."""
+        if ledger.empty:
+            return pd.Series(dtype="int64")
+        signs = np.where(ledger["sign"].to_numpy() < 0, -1, 1)
+        cents = np.abs(to_minor_units(ledger["amount"].fillna(0.0))) * signs
+        return pd.Series(cents, index=ledger.index).groupby(ledger["account_id"]).sum()
+
+    # --- 2. COMPARAÇÃO E CORREÇÃO ---
+    @staticmethod
+    def rebuild_users(db: Session, user_ids: Optional[List[int]] = None, apply: bool = False,
+                      include_balances: bool = False, batch_size: int = REBUILD_BATCH_SIZE) -> dict:
+        """
+        Reconstrói os utilizadores indicados (ou todos) na sessão dada. Só escreve se `apply`.
+        Percorre as contas por id em lotes (keyset), como a reconciliação: em memória está
+        só o ledger de um lote de cada vez, e com `apply` cada lote tem o seu commit.
+        Com `apply`, as contas do lote ficam bloqueadas desde a leitura do ledger até ao commit
+        e os saldos são corrigidos com um incremento, para não perder escritas concorrentes.
+        """
+        report = HoldingsService._empty_report()
+        users, last_id = set(), 0
+        while True:
+            account_query = db.query(Account).filter(Account.id > last_id)
+            if user_ids is not None:
+                account_query = account_query.filter(Account.user_id.in_(user_ids))
+            batch = account_query.order_by(Account.id).limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            users.update(acc.user_id for acc in batch)
+            HoldingsService._rebuild_accounts(db, {acc.id: acc for acc in batch}, report, apply, include_balances)
+
+        report["users"] = len(users)
+        report["applied"] = apply
+        return report
+
+    @staticmethod
+    def _rebuild_accounts(db: Session, accounts: Dict[int, Account], report: dict, apply: bool,
+                          include_balances: bool) -> None:
+        if apply:
+            # Mesmo lock de `create_transaction`: nenhuma transação entra nestas contas entre a leitura e a escrita
+            BalanceService.lock_accounts(db, list(accounts))
+        ledger = HoldingsService._ledger(db, list(accounts))
+        expected = HoldingsService.expected_holdings(ledger)
+        stored = {(h.account_id, h.asset_id): h for h in db.query(Holding).filter(Holding.account_id.in_(list(accounts)))}
+        loaded = list(accounts.values()) + list(stored.values())
+
+        for row in expected.itertuples(index=False):
+            key = (int(row.account_id), int(row.asset_id))
+            holding = stored.pop(key, None)
+            report["holdings_checked"] += 1
+            if not row.replayable:
+                report["holdings_skipped"] += 1
+                continue
+
+            # Comparação exata nas unidades guardadas (quantidade e preço com 8 casas), como os saldos em cêntimos
+            quantity, avg_price = to_scaled(row.quantity, QUANTITY_SCALE), to_scaled(row.avg_buy_price, PRICE_SCALE)
+            expected_quantity, expected_avg = quantity / 10 ** QUANTITY_SCALE, avg_price / 10 ** PRICE_SCALE
+            if holding is None:
+                if quantity <= 0:
+                    continue
+                HoldingsService._record(report, "holding", key, None, expected_quantity)
+                report["holdings_drifted"] += 1
+                if apply:
+                    holding = Holding(account_id=key[0], asset_id=key[1], quantity=expected_quantity, avg_buy_price=expected_avg)
+                    db.add(holding)
+                    loaded.append(holding)
+                continue
+
+            qty_drift = to_scaled(holding.quantity or 0, QUANTITY_SCALE) != quantity
+            # Com a posição a zero o preço médio não tem significado (mantém-se o último)
+            avg_drift = quantity > 0 and to_scaled(holding.avg_buy_price or 0, PRICE_SCALE) != avg_price
+            if qty_drift or avg_drift:
+                report["holdings_drifted"] += 1
+                HoldingsService._record(report, "holding", key,
+                                        {"quantity": holding.quantity, "avg_buy_price": holding.avg_buy_price},
+                                        {"quantity": expected_quantity, "avg_buy_price": expected_avg})
+                if apply:
+                    holding.quantity = expected_quantity
+                    if quantity > 0:
+                        holding.avg_buy_price = expected_avg
+
+        # Holdings guardadas sem nenhuma transação de suporte
+        for key, holding in stored.items():
+            report["holdings_checked"] += 1
+            if to_scaled(holding.quantity or 0, QUANTITY_SCALE) > 0:
+                report["holdings_drifted"] += 1
+                HoldingsService._record(report, "holding", key, {"quantity": holding.quantity}, {"quantity": 0.0})
+                if apply:
+                    holding.quantity = 0.0
+
+        if include_balances:
+            sums = HoldingsService.expected_balances(ledger)
+            # Saldos lidos agora (depois do lock), em cêntimos, e não dos objetos carregados antes
+            balances = db.query(Account.id, minor_units(Account.opening_balance), minor_units(Account.current_balance)).filter(
+                Account.id.in_(list(accounts))
+            ).all()
+            for account_id, opening_cents, stored_cents in balances:
+                expected_balance = int(opening_cents or 0) + int(sums.get(account_id, 0))
+                stored_cents = int(stored_cents or 0)
+                report["balances_checked"] += 1
+                if stored_cents != expected_balance:
+                    report["balances_drifted"] += 1
+                    HoldingsService._record(report, "balance", (account_id,), from_minor_units(stored_cents), from_minor_units(expected_balance))
+                    if apply:
+                        # Incremento (não um SET), como na reconciliação
+                        BalanceService.apply_delta(db, account_id, from_minor_units(expected_balance - stored_cents))
+
+        if apply:
+            db.commit()
+        # Largar os objetos do lote para a sessão não crescer com o nº de contas
+        for obj in loaded:
+            db.expunge(obj)
+
+    @staticmethod
+    def rebuild_holding(db: Session, account_id: int, asset_id: int) -> bool:
+        """
+        Reconstrói uma única posição a partir do ledger (usado ao editar/apagar transações).
+        Não faz commit. Devolve False se a posição não for reconstruível.
+        """
+        ledger = HoldingsService._ledger(db, [account_id])
+        ledger = ledger[ledger["asset_id"] == asset_id]
+        if ledger["quantity"].isna().any():
+            return False
+
+        holding = db.query(Holding).filter(Holding.account_id == account_id, Holding.asset_id == asset_id).first()
+        if ledger.empty:
+            if holding:
+                holding.quantity = 0.0
+            return True
+
+        expected = HoldingsService.expected_holdings(ledger).iloc[0]
+        if not holding:
+            holding = Holding(account_id=account_id, asset_id=asset_id, quantity=0, avg_buy_price=0)
+            db.add(holding)
+        quantity = to_scaled(expected["quantity"], QUANTITY_SCALE)
+        holding.quantity = quantity / 10 ** QUANTITY_SCALE
+        if quantity > 0:
+            holding.avg_buy_price = to_scaled(expected["avg_buy_price"], PRICE_SCALE) / 10 ** PRICE_SCALE
+        return True
+
+    @staticmethod
+    def _empty_report() -> dict:
+        return {
+            "users": 0, "holdings_checked": 0, "holdings_drifted": 0, "holdings_skipped": 0,
+            "balances_checked": 0, "balances_drifted": 0, "drift": [], "applied": False,
+        }
+
+    @staticmethod
+    def _record(report: dict, kind: str, key: tuple, stored, expected) -> None:
+        if len(report["drift"]) < MAX_DRIFT_SAMPLES:
+            report["drift"].append({"kind": kind, "key": list(key), "stored": stored, "expected": expected})
+
+    # --- 3. EXECUÇÃO EM PARALELO (CLI) ---
+    @staticmethod
+    def rebuild(user_ids: Optional[Iterable[int]] = None, apply: bool = False, include_balances: bool = False,
+                workers: int = 1, chunk_size: int = 200) -> dict:
+        """Reconstrói todos os utilizadores (ou os indicados) repartidos por um pool de processos."""
+        from app.database.database import SessionLocal
+
+        start = time.perf_counter()
+        if user_ids is None:
+            db = SessionLocal()
+            try:
+                user_ids = [uid for (uid,) in db.query(User.id).order_by(User.id)]
+            finally:
+                db.close()
+        user_ids = list(user_ids)
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+        jobs = [(chunk, apply, include_balances) for chunk in chunks]
+
+        if workers <= 1 or len(chunks) <= 1:
+            partials = [_rebuild_chunk(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                partials = list(pool.map(_rebuild_chunk, jobs))
+
+        report = HoldingsService._empty_report()
+        for partial in partials:
+            for k in ("users", "holdings_checked", "holdings_drifted", "holdings_skipped", "balances_checked", "balances_drifted"):
+                report[k] += partial[k]
+            report["drift"].extend(partial["drift"][:MAX_DRIFT_SAMPLES - len(report["drift"])])
+        report["applied"] = apply
+        report["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        return report
+
+
+def _init_worker():
+    # Cada processo filho abre as suas próprias ligações (não reutilizar as herdadas do pai)
+    from app.database.database import engine
+    engine.dispose(close=False)
+
+
+def _rebuild_chunk(job) -> dict:
+    from app.database.database import SessionLocal
+
+    user_ids, apply, include_balances = job
+    db = SessionLocal()
+    try:
+        return HoldingsService.rebuild_users(db, user_ids, apply=apply, include_balances=include_balances)
+    finally:
+        db.close()
@@ -0,0 +1,164 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.import_service import CHUNK_SIZE, ImportService
+from app.services.rules_service import rule_cache
+from app.services.statement_parsers import supported_extensions
+
+
+def parse_statement(path: str, filename: str, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Trabalho de cada processo do pool: lê e normaliza um ficheiro inteiro, sem tocar na BD.
+    Os blocos normalizados ficam todos em memória (e são copiados para o processo principal), porque a
+    escrita só começa quando o lote inteiro foi lido, para ordenar os ficheiros por conta e data. O pico
+    de memória da escrita cresce com o tamanho do lote: `IMPORT_BATCH_MAX_BYTES` em CSV ocupa várias
+    vezes isso em DataFrames, por isso esse limite é também o teto de memória de uma importação em lote.
+    """
+    try:
+        with open(path, "rb") as stream:
+            _, normalized = ImportService.normalize_stream(stream, filename, chunk_size)
+            chunks = list(normalized)
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"error": f"Erro ao ler ficheiro: {str(e)}"}
+    dates = [clean["date"].min() for clean, _, _ in chunks if len(clean)]
+    return {"chunks": chunks, "first_date": min(dates) if dates else None}
+
+
+class BatchImportService:
+    """
+    Importação de vários extratos (ficheiros soltos ou ZIP) de uma só vez: leitura em paralelo num
+    pool de processos e escrita sequencial, ordenada por conta e data, numa única transação
+    (cada ficheiro num savepoint: um erro na escrita só falha esse ficheiro).
+    """
+
+    # --- 1. RECEÇÃO ---
+    @staticmethod
+    def stage(uploads: List[Tuple[str, BinaryIO]], workdir: str, max_bytes: int = settings.IMPORT_BATCH_MAX_BYTES) -> List[dict]:
+        """Grava os ficheiros (e o conteúdo dos ZIP) em `workdir`. Devolve um dict (filename, path) por extrato."""
+        staged, total = [], 0
+
+        def save(name: str, source: BinaryIO) -> None:
+            nonlocal total
+            fd, path = tempfile.mkstemp(dir=workdir, suffix=os.path.splitext(name)[1])
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(source, out)
+                total += out.tell()
+            if total > max_bytes:
+                raise ValueError("Lote demasiado grande.")
+            staged.append({"filename": name, "path": path})
+
+        for filename, stream in uploads:
+            if not (filename or "").lower().endswith(".zip"):
+                save(filename or "", stream)
+                continue
+            try:
+                archive = zipfile.ZipFile(stream)
+            except zipfile.BadZipFile:
+                raise ValueError(f"ZIP inválido: {filename}")
+            with archive:
+                for info in archive.infolist():
+                    basename = info.filename.rsplit("/", 1)[-1]
+                    # Pastas, ficheiros ocultos e metadados do macOS não são extratos
+                    if info.is_dir() or not basename or basename.startswith(".") or info.filename.startswith("__MACOSX/"):
+                        continue
+                    # Verificação prévia pelo tamanho declarado (a cópia volta a contar os bytes reais)
+                    if total + info.file_size > max_bytes:
+                        raise ValueError("Lote demasiado grande.")
+                    with archive.open(info) as member:
+                        save(info.filename, member)
+        return staged
+
+    # --- 2. LEITURA EM PARALELO ---
+    @staticmethod
+    def parse_all(files: List[dict], processes: int) -> List[dict]:
+        """Lê e normaliza os ficheiros (trabalho de CPU em pandas), um por processo."""
+        if processes <= 0 or len(files) < 2:
+            return [parse_statement(f["path"], f["filename"]) for f in files]
+        # spawn: o processo da API tem threads (pool de importações), onde fork não é seguro
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(processes, len(files)), mp_context=context) as pool:
+            return list(pool.map(parse_statement, [f["path"] for f in files], [f["filename"] for f in files]))
+
+    # --- 3. IMPORTAÇÃO ---
+    @staticmethod
+    def process(db: Session, user_id: int, uploads: List[Tuple[str, BinaryIO]], default_account_id: int,
+                account_map: Optional[Dict[str, int]] = None, processes: int = settings.IMPORT_PARSE_PROCESSES) -> dict:
+        """
+        `account_map` associa ficheiros (nome no ZIP ou nome base) a contas; os restantes vão para
+        `default_account_id`. Ficheiros ilegíveis ficam como `failed` sem travar os outros; os duplicados
+        entre ficheiros (extratos sobrepostos) são apanhados pelo fingerprint na fase de escrita.
+        """
+        start = time.perf_counter()
+        account_map = account_map or {}
+        workdir = tempfile.mkdtemp(prefix="moneymap-batch-")
+        try:
+            files = BatchImportService.stage(uploads, workdir)
+            if not files:
+                raise ValueError("O lote não tem extratos.")
+
+            allowed = supported_extensions()
+            results = []
+            for f in files:
+                basename = f["filename"].rsplit("/", 1)[-1]
+                f["account_id"] = account_map.get(f["filename"], account_map.get(basename, default_account_id))
+                results.append({
+                    "filename": f["filename"], "account_id": f["account_id"], "status": "pending",
+                    "rows_parsed": 0, "added": 0, "duplicates": 0, "errors": 0, "error_samples": [],
+                    "near_duplicates": 0, "transfer_candidates": 0, "error_message": None,
+                })
+                if not basename.lower().endswith(allowed):
+                    results[-1].update(status="failed", error_message="Formato não suportado.")
+
+            readable = [i for i, r in enumerate(results) if r["status"] == "pending"]
+            parsed = dict(zip(readable, BatchImportService.parse_all([files[i] for i in readable], processes)))
+            for i, outcome in parsed.items():
+                if "error" in outcome:
+                    results[i].update(status="failed", error_message=outcome["error"])
+
+            # Escrita numa ordem estável (conta, primeira data) para os extratos mais antigos entrarem primeiro
+            matcher = rule_cache.get(db, user_id)
+            ordered = sorted(
+                (i for i, outcome in parsed.items() if "error" not in outcome),
+                key=lambda i: (files[i]["account_id"], parsed[i]["first_date"] or date.max, files[i]["filename"])
+            )
+            for i in ordered:
+                account_id, occurrences = files[i]["account_id"], defaultdict(int)
+                chunks = (
+                    ImportService.prepare_chunk(clean, errors, rows_parsed, matcher, account_id, occurrences)
+                    for clean, errors, rows_parsed in parsed[i]["chunks"]
+                )
+                try:
+                    with db.begin_nested():
+                        stats = ImportService.write_chunks(db, account_id, user_id, chunks, commit=False)
+                except Exception as e:
+                    message = str(e) if isinstance(e, ValueError) else f"Erro ao gravar ficheiro: {str(e)}"
+                    results[i].update(status="failed", error_message=message)
+                    continue
+                results[i].update(status="completed", **{k: stats[k] for k in (
+                    "rows_parsed", "added", "duplicates", "errors", "error_samples", "near_duplicates", "transfer_candidates"
+                )})
+            db.commit()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        return {
+            "files": results,
+            "added": sum(r["added"] for r in results),
+            "duplicates": sum(r["duplicates"] for r in results),
+            "errors": sum(r["errors"] for r in results),
+            "failed_files": sum(r["status"] == "failed" for r in results),
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+        }
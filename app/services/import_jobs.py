@@ -0,0 +1,231 @@
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.models import ImportJob
+from app.services.import_service import ImportCancelled, ImportService
+from app.services.statement_parsers import supported_extensions
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+ORPHANED_MESSAGE = "Importação interrompida por um reinício do servidor."
+
+
+class ImportJobRunner:
+    """Pool de threads das importações, criado à primeira utilização. Com `workers=0` corre no próprio pedido."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> None:
+        if self.workers <= 0:
+            fn(*args)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="import")
+        self._executor.submit(fn, *args)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+import_runner = ImportJobRunner(settings.IMPORT_WORKERS)
+
+
+class ImportPreviewCache:
+    """
+    Resultados de dry-run guardados em disco (blocos já processados) e indexados por token.
+    Cada token serve uma única confirmação e expira ao fim de `ttl` segundos.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def put(self, path: str, user_id: int, account_id: int, filename: str) -> str:
+        self.purge_expired()
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._entries[token] = {
+                "path": path, "user_id": user_id, "account_id": account_id, "filename": filename,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+        return token
+
+    def pop(self, token: str, user_id: int) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if not entry or entry["user_id"] != user_id:
+                return None
+            del self._entries[token]
+        if entry["expires_at"] < time.monotonic():
+            _remove(entry["path"])
+            return None
+        return entry
+
+    def purge_expired(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [token for token, entry in self._entries.items() if entry["expires_at"] < now]
+            paths = [self._entries.pop(token)["path"] for token in expired]
+        for path in paths:
+            _remove(path)
+
+    def clear(self) -> None:
+        with self._lock:
+            paths = [entry["path"] for entry in self._entries.values()]
+            self._entries.clear()
+        for path in paths:
+            _remove(path)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+preview_cache = ImportPreviewCache(settings.IMPORT_PREVIEW_TTL_SECONDS)
+
+
+class ImportJobService:
+    # --- 1. CRIAÇÃO (no pedido) ---
+    @staticmethod
+    def create(db: Session, user_id: int, account_id: int, filename: str, stream) -> Tuple[ImportJob, str]:
+        """Copia o upload para um ficheiro temporário (sobrevive ao pedido) e regista o job como pendente."""
+        if not (filename or '').lower().endswith(supported_extensions()):
+            raise ValueError("Formato não suportado. Use CSV, Excel, OFX, QIF ou CAMT.053.")
+
+        with tempfile.NamedTemporaryFile(delete=False, prefix="moneymap-import-", suffix=os.path.splitext(filename)[1]) as tmp:
+            shutil.copyfileobj(stream, tmp)
+
+        job = ImportJob(user_id=user_id, account_id=account_id, filename=filename)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job, tmp.name
+
+    @staticmethod
+    def preview(db: Session, user_id: int, account_id: int, filename: str, stream) -> dict:
+        """Dry-run no próprio pedido; o resultado fica em cache sob um token para `confirm`."""
+        fd, path = tempfile.mkstemp(prefix="moneymap-preview-", suffix=".pkl")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                summary = ImportService.preview(db, account_id, user_id, stream, filename, out)
+        except Exception:
+            _remove(path)
+            raise
+        token = preview_cache.put(path, user_id, account_id, filename)
+        return {"token": token, "filename": filename, "expires_in_seconds": preview_cache.ttl, **summary}
+
+    @staticmethod
+    def confirm(db: Session, user_id: int, token: str) -> Tuple[ImportJob, str]:
+        entry = preview_cache.pop(token, user_id)
+        if not entry:
+            raise LookupError("Pré-visualização inexistente ou expirada.")
+        job = ImportJob(user_id=user_id, account_id=entry["account_id"], filename=entry["filename"])
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job, entry["path"]
+
+    @staticmethod
+    def fail_orphaned(db: Session) -> int:
+        """
+        Marca como falhadas as importações pendentes ou em curso (chamado no arranque: a fila e os
+        workers do processo anterior já não existem e os dados dessas importações nunca foram confirmados).
+        """
+        failed = db.query(ImportJob).filter(ImportJob.status.in_(("pending", "running"))).update(
+            {ImportJob.status: "failed", ImportJob.error_message: ORPHANED_MESSAGE, ImportJob.finished_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.commit()
+        return failed
+
+    @staticmethod
+    def cancel(db: Session, job: ImportJob) -> ImportJob:
+        if job.status in FINISHED_STATUSES:
+            raise ValueError("A importação já terminou.")
+        job.cancel_requested = True
+        db.commit()
+        db.refresh(job)
+        return job
+
+    # --- 2. EXECUÇÃO (no worker) ---
+    @staticmethod
+    def run(job_id: int, path: str, session_factory, prepared: bool = False) -> None:
+        """
+        Corre a importação com duas sessões: uma para os dados (commit só no fim)
+        e outra para o estado do job, que é gravado a cada bloco para ser visível durante a importação.
+        Com `prepared`, `path` é o resultado de um dry-run e o ficheiro original não volta a ser lido.
+        """
+        db = session_factory()
+        status_db = session_factory()
+        job = status_db.get(ImportJob, job_id)
+        try:
+            if job.cancel_requested:
+                raise ImportCancelled()
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            status_db.commit()
+
+            def progress(stats: dict) -> None:
+                status_db.refresh(job)  # para ver pedidos de cancelamento feitos entretanto
+                if job.cancel_requested:
+                    raise ImportCancelled()
+                ImportJobService._apply_stats(job, stats)
+                try:
+                    status_db.commit()
+                except OperationalError:
+                    # O progresso é informativo: com a BD bloqueada pela escrita dos dados (SQLite
+                    # só tem um escritor) salta-se esta atualização e a importação continua
+                    status_db.rollback()
+
+            with open(path, "rb") as stream:
+                if prepared:
+                    stats = ImportService.process_prepared(db, job.account_id, job.user_id, stream, progress=progress)
+                else:
+                    stats = ImportService.process_file(db, job.account_id, stream, job.filename, job.user_id, progress=progress)
+            ImportJobService._apply_stats(job, stats)
+            job.status = "completed"
+        except ImportCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Importação {job_id} falhou: {e}")
+            job.status = "failed"
+            job.error_message = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            status_db.commit()
+            db.close()
+            status_db.close()
+            _remove(path)
+
+    @staticmethod
+    def _apply_stats(job: ImportJob, stats: dict) -> None:
+        job.rows_parsed = stats["rows_parsed"]
+        job.added = stats["added"]
+        job.duplicates = stats["duplicates"]
+        job.errors = stats["errors"]
+        job.error_samples = list(stats["error_samples"])
+        job.near_duplicates = stats.get("near_duplicates", 0)
+        job.transfer_candidates = stats.get("transfer_candidates", 0)
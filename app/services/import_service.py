@@ -1,152 +1,410 @@
+import hashlib
+import math
+import pickle
+import re
+import time
+import numpy as np
 import pandas as pd
-from io import BytesIO
+from collections import defaultdict
+from itertools import chain
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
 from sqlalchemy.orm import Session
-from fastapi import UploadFile
 from datetime import datetime
 
 # Importar os Modelos Corretos
-from app.models import Transaction, Account, TransactionType, Category
+from app.database.database import dialect_insert
+from app.models import Transaction, Account, Category
+from app.services.balance_service import BalanceService
+from app.services.category_cache import category_cache
+from app.services.lookup_registry import lookup_registry
+from app.services.matching_service import MatchingService
+from app.services.rules_service import IMPORT_CATEGORY_NAME, rule_cache
+from app.services.statement_parsers import detect_parser
+
+# Linhas lidas, verificadas e inseridas de cada vez (um único SELECT ... IN por lote)
+CHUNK_SIZE = 1000
+# Formatos de data testados (uma vez por ficheiro) antes do parse genérico
+DATE_FORMATS = ['%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y', '%Y-%m-%d', '%Y/%m/%d', '%d-%m-%y', '%d/%m/%y', '%Y-%m-%d %H:%M:%S',
+                '%m/%d/%Y', '%m/%d/%y']
+DEFAULT_DESCRIPTION = 'Transação Importada'
+MAX_ERROR_SAMPLES = 50
+# Linhas novas/duplicadas mostradas na pré-visualização
+PREVIEW_SAMPLE_SIZE = 20
+
+
+class ImportCancelled(Exception):
+    """Lançada pelo callback de progresso quando foi pedido o cancelamento da importação."""
+
+
+def normalize_description(description: str) -> str:
+    return re.sub(r"\s+", " ", str(description)).strip().lower()[:255]
+
+
+def transaction_fingerprint(account_id: int, dt, signed_amount: float, description: str, occurrence: int = 0) -> str:
+    """
+    Identidade de uma linha importada. `occurrence` distingue linhas iguais dentro do mesmo
+    ficheiro (ex: dois cafés no mesmo dia), para que reimportar o ficheiro continue idempotente.
+    """
+    cents = int(round(signed_amount * 100))
+    key = f"{account_id}|{dt.isoformat()}|{cents}|{normalize_description(description)}|{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
 
 class ImportService:
+    # --- 1. LEITURA EM STREAMING ---
     @staticmethod
-    async def process_file(db: Session, account_id: int, file: UploadFile, user_id: int) -> dict:
-        # 1. Ler Ficheiro para memória
-        contents = await file.read()
-        filename = file.filename.lower()
-        
-        try:
-            if filename.endswith('.csv'):
-                try:
-                    # Tenta vírgula primeiro
-                    df = pd.read_csv(BytesIO(contents), sep=',')
-                    if len(df.columns) < 2: 
-                        # Se falhar, tenta ponto e vírgula
-                        df = pd.read_csv(BytesIO(contents), sep=';')
-                except:
-                    df = pd.read_csv(BytesIO(contents), sep=';')
-            elif filename.endswith(('.xls', '.xlsx')):
-                df = pd.read_excel(BytesIO(contents))
-            else:
-                raise ValueError("Formato não suportado. Use CSV ou Excel.")
-        except Exception as e:
-            raise ValueError(f"Erro ao ler ficheiro: {str(e)}")
+    def iter_chunks(stream: BinaryIO, filename: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """Lê o ficheiro (em disco) em blocos de `chunk_size` linhas, com o leitor do formato detetado."""
+        yield from detect_parser(stream, filename).iter_chunks(stream, chunk_size)
 
-        # 2. Normalizar Colunas (Remove espaços e mete minúsculas)
-        df.columns = df.columns.str.lower().str.strip()
-        col_map = {}
-        
+    @staticmethod
+    def map_columns(columns) -> dict:
         # Mapa inteligente de colunas
-        for col in df.columns:
+        col_map = {}
+        for col in columns:
             if 'data' in col or 'date' in col: col_map['date'] = col
             elif 'desc' in col or 'movimento' in col or 'narração' in col: col_map['description'] = col
             elif 'valor' in col or 'montante' in col or 'amount' in col: 
                  if 'saldo' not in col: col_map['amount'] = col
+        return col_map
+
+    # --- 2. IMPORTAÇÃO ---
+    @staticmethod
+    def process_file(db: Session, account_id: int, stream: BinaryIO, filename: str, user_id: int,
+                     chunk_size: int = CHUNK_SIZE, progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Importa o extrato numa única transação (commit no fim). `progress` é chamado depois de cada
+        bloco com os contadores acumulados e pode interromper a importação lançando uma exceção.
+        """
+        ImportService._check_account(db, account_id)
+        _, parsed = ImportService.parse_file(db, account_id, user_id, stream, filename, chunk_size)
+        return ImportService.write_chunks(db, account_id, user_id, parsed, progress)
+
+    @staticmethod
+    def process_prepared(db: Session, account_id: int, user_id: int, stream: BinaryIO,
+                         progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """Importa os blocos já processados por um dry-run (ver `preview`), sem voltar a ler o ficheiro."""
+        ImportService._check_account(db, account_id)
+        return ImportService.write_chunks(db, account_id, user_id, ImportService._load_prepared(stream), progress)
+
+    @staticmethod
+    def parse_file(db: Session, account_id: int, user_id: int, stream: BinaryIO, filename: str,
+                   chunk_size: int = CHUNK_SIZE) -> Tuple[dict, Iterator[dict]]:
+        """
+        Abre o ficheiro em streaming (só o primeiro bloco é lido agora) e devolve o mapa de colunas
+        e um gerador de blocos já normalizados, categorizados e com fingerprint. Não escreve nada.
+        """
+        col_map, normalized = ImportService.normalize_stream(stream, filename, chunk_size)
+        # Regras de categorização do utilizador (compiladas e em cache); sem regra -> None ("Importações")
+        matcher = rule_cache.get(db, user_id)
+
+        def parsed() -> Iterator[dict]:
+            occurrences = defaultdict(int)
+            try:
+                for clean, errors, rows_parsed in normalized:
+                    yield ImportService.prepare_chunk(clean, errors, rows_parsed, matcher, account_id, occurrences)
+            finally:
+                normalized.close()
+
+        return col_map, parsed()
+
+    @staticmethod
+    def normalize_stream(stream: BinaryIO, filename: str, chunk_size: int = CHUNK_SIZE) -> Tuple[dict, Iterator[tuple]]:
+        """
+        Leitura e normalização sem acesso à BD (pode correr noutro processo). Devolve o mapa de colunas
+        e um gerador de (linhas válidas, amostras de erro, nº de linhas lidas) por bloco.
+        """
+        try:
+            chunks = ImportService.iter_chunks(stream, filename, chunk_size)
+            first = next(chunks, None)
+        except Exception as e:
+            raise ValueError(f"Erro ao ler ficheiro: {str(e)}")
+
+        # Normalizar Colunas (Remove espaços e mete minúsculas)
+        columns = [str(c).lower().strip() for c in first.columns] if first is not None else []
+        col_map = ImportService.map_columns(columns)
         
         # --- CORREÇÃO AQUI ---
         # Verificamos se as chaves ('date', 'amount') existem no dicionário mapeado
         if not all(k in col_map for k in ['date', 'amount']):
-            raise ValueError(f"Colunas obrigatórias não encontradas. Detetadas: {list(df.columns)}")
+            chunks.close()
+            raise ValueError(f"Colunas obrigatórias não encontradas. Detetadas: {columns}")
 
-        # 3. Preparar Dados Auxiliares
-        
-        # Buscar ou Criar Categoria "Importações"
+        def normalized() -> Iterator[tuple]:
+            formats = {}  # formato de data e separador decimal, detetados no primeiro bloco
+            rows_parsed = 0
+            try:
+                for df in chain([first], chunks):
+                    df.columns = columns
+                    clean, errors = ImportService.normalize_chunk(df, col_map, formats, first_row=rows_parsed + 2)
+                    rows_parsed += len(df)
+                    yield clean, errors, len(df)
+            finally:
+                chunks.close()
+
+        return col_map, normalized()
+
+    @staticmethod
+    def prepare_chunk(clean: pd.DataFrame, errors: list, rows_parsed: int, matcher, account_id: int, occurrences: dict) -> dict:
+        """Categoriza e calcula os fingerprints de um bloco normalizado. `occurrences` é partilhado pelos blocos do ficheiro."""
+        categories, subcategories = matcher.categorize(clean["description"], clean["amount"].to_numpy(), None)
+        clean = clean.assign(category_id=categories, subcategory_id=subcategories)
+        return {
+            "rows_parsed": rows_parsed,
+            "errors": rows_parsed - len(clean),
+            "error_samples": errors,
+            "rows": ImportService._fingerprint_rows(clean, account_id, occurrences),
+        }
+
+    @staticmethod
+    def write_chunks(db: Session, account_id: int, user_id: int, parsed: Iterator[dict],
+                     progress: Optional[Callable[[dict], None]] = None, commit: bool = True) -> dict:
+        """
+        Deduplicação e escrita bloco a bloco; um único UPDATE de saldo e um único commit no fim
+        (sem `commit`, fica a cargo de quem chama, ex: importação em lote de vários ficheiros).
+        Antes do commit, as linhas novas passam pelo matcher de quase-duplicados e transferências
+        (só contadas nas estatísticas; a revisão é feita em /transactions/review).
+        """
+        # Buscar ou Criar Categoria "Importações" (para as linhas que nenhuma regra apanhou)
         default_cat = db.query(Category).filter(
             Category.user_id == user_id, 
-            Category.name == "Importações"
+            Category.name == IMPORT_CATEGORY_NAME
         ).first()
         
         if not default_cat:
-            default_cat = Category(user_id=user_id, name="Importações")
+            default_cat = Category(user_id=user_id, name=IMPORT_CATEGORY_NAME)
             db.add(default_cat)
-            db.commit()
-            db.refresh(default_cat)
+            db.flush()
+            category_cache.invalidate(user_id)
 
-        # Tipos de Transação
-        type_expense = db.query(TransactionType).filter(TransactionType.name.ilike("%Despesa%")).first()
-        type_income = db.query(TransactionType).filter(TransactionType.name.ilike("%Receita%")).first()
+        # Tipos de Transação (pela natureza guardada no tipo, não pelo nome)
+        type_expense = lookup_registry.type_for_kind(db, "expense")
+        type_income = lookup_registry.type_for_kind(db, "income")
         
         expense_id = type_expense.id if type_expense else 1
         income_id = type_income.id if type_income else 2
 
-        added_count = 0
-        errors_count = 0
-        
-        account = db.query(Account).filter(Account.id == account_id).first()
-        if not account:
-             raise ValueError("Conta não encontrada.")
+        start = time.perf_counter()
+        stats = {"rows_parsed": 0, "added": 0, "duplicates": 0, "errors": 0, "error_samples": []}
+        balance_delta = 0.0
+        new_fingerprints, first_date, last_date = set(), None, None
+
+        try:
+            for chunk in parsed:
+                rows = chunk["rows"]
+                new, delta = ImportService._insert_new(db, rows, account_id, default_cat.id, expense_id, income_id)
+                balance_delta += delta
+                if new:
+                    new_fingerprints.update(row["fingerprint"] for row in new)
+                    dates = [row["date"] for row in new]
+                    first_date = min(first_date or min(dates), min(dates))
+                    last_date = max(last_date or max(dates), max(dates))
+
+                stats["rows_parsed"] += chunk["rows_parsed"]
+                stats["errors"] += chunk["errors"]
+                stats["added"] += len(new)
+                stats["duplicates"] += len(rows) - len(new)
+                stats["error_samples"] = (stats["error_samples"] + chunk["error_samples"])[:MAX_ERROR_SAMPLES]
+                if progress:
+                    progress(dict(stats))
+        except ImportCancelled:
+            parsed.close()
+            if commit:
+                db.rollback()
+            raise
+        except Exception as e:
+            parsed.close()
+            # Sem `commit` a transação é de quem chama (que desfaz só o seu savepoint)
+            if commit:
+                db.rollback()
+            raise ValueError(f"Erro ao ler ficheiro: {str(e)}")
+
+        # Saldo: um único UPDATE com o delta agregado, na mesma transação dos inserts
+        BalanceService.apply_delta(db, account_id, round(balance_delta, 2))
+        matches = MatchingService.review_import(db, user_id, new_fingerprints, first_date, last_date)
+        stats["near_duplicates"] = len(matches["near_duplicates"])
+        stats["transfer_candidates"] = len(matches["transfers"])
+        if commit:
+            db.commit()
+
+        elapsed = time.perf_counter() - start
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["rows_per_second"] = round(stats["rows_parsed"] / elapsed, 1) if elapsed > 0 else None
+        return stats
+
+    @staticmethod
+    def _check_account(db: Session, account_id: int) -> None:
+        if not db.query(Account.id).filter(Account.id == account_id).first():
+            raise ValueError("Conta não encontrada.")
+
+    # --- 3. PRÉ-VISUALIZAÇÃO (dry run) ---
+    @staticmethod
+    def preview(db: Session, account_id: int, user_id: int, stream: BinaryIO, filename: str, out: BinaryIO,
+                chunk_size: int = CHUNK_SIZE, sample_size: int = PREVIEW_SAMPLE_SIZE) -> dict:
+        """
+        Corre leitura, normalização e deduplicação sem escrever na BD. Cada bloco processado é
+        gravado em `out` (um pickle por bloco) para a confirmação não voltar a ler o ficheiro.
+        """
+        ImportService._check_account(db, account_id)
+        col_map, parsed = ImportService.parse_file(db, account_id, user_id, stream, filename, chunk_size)
+        summary = {
+            "column_mapping": col_map, "rows_parsed": 0, "new": 0, "duplicates": 0, "errors": 0,
+            "new_sample": [], "duplicate_sample": [], "error_samples": [],
+        }
+        try:
+            for chunk in parsed:
+                existing = ImportService._existing_fingerprints(db, chunk["rows"])
+                for fp, dt, desc, amount, category_id, _ in chunk["rows"]:
+                    kind = "duplicate" if fp in existing else "new"
+                    summary["duplicates" if fp in existing else "new"] += 1
+                    if len(summary[f"{kind}_sample"]) < sample_size:
+                        summary[f"{kind}_sample"].append(
+                            {"date": dt.isoformat(), "description": desc, "amount": amount, "category_id": category_id}
+                        )
+                summary["rows_parsed"] += chunk["rows_parsed"]
+                summary["errors"] += chunk["errors"]
+                summary["error_samples"] = (summary["error_samples"] + chunk["error_samples"])[:MAX_ERROR_SAMPLES]
+                pickle.dump(chunk, out, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            parsed.close()
+            raise ValueError(f"Erro ao ler ficheiro: {str(e)}")
+        return summary
 
-        # 4. Processar Linhas
-        for _, row in df.iterrows():
+    @staticmethod
+    def _load_prepared(stream: BinaryIO) -> Iterator[dict]:
+        while True:
             try:
-                raw_date = row[col_map['date']]
-                # Se não houver coluna de descrição mapeada, usa texto genérico
-                desc_col = col_map.get('description')
-                raw_desc = row[desc_col] if desc_col else 'Transação Importada'
-                
-                raw_amount = row[col_map['amount']]
-
-                # Parse Data
-                dt = None
-                if isinstance(raw_date, str):
-                    try:
-                        dt = pd.to_datetime(raw_date, dayfirst=True).date()
-                    except:
-                        pass
-                else:
-                    dt = raw_date.date() if hasattr(raw_date, 'date') else raw_date
-                
-                if not dt:
-                    errors_count += 1
-                    continue
-
-                # Parse Valor
-                if isinstance(raw_amount, str):
-                    clean = raw_amount.lower().replace('eur','').replace('€','').strip()
-                    if ',' in clean and '.' in clean: 
-                        clean = clean.replace('.','').replace(',','.')
-                    elif ',' in clean: 
-                        clean = clean.replace(',','.')
-                    amount = float(clean)
-                else:
-                    amount = float(raw_amount)
-
-                # Lógica de Sinal vs Tipo
-                if amount < 0:
-                    tx_type = expense_id
-                    final_amount = abs(amount)
-                    is_neg = True
-                else:
-                    tx_type = income_id
-                    final_amount = amount
-                    is_neg = False
-
-                # Verificação de Duplicados
-                exists = db.query(Transaction).filter(
-                    Transaction.account_id == account_id,
-                    Transaction.date == dt,
-                    Transaction.amount == final_amount,
-                    Transaction.description == str(raw_desc)[:255]
-                ).first()
-
-                if not exists:
-                    new_tx = Transaction(
-                        date=dt, 
-                        description=str(raw_desc)[:255], 
-                        amount=final_amount,
-                        account_id=account_id, 
-                        transaction_type_id=tx_type,
-                        category_id=default_cat.id
-                    )
-                    db.add(new_tx)
-                    
-                    if is_neg: account.current_balance -= final_amount
-                    else: account.current_balance += final_amount
-                    
-                    added_count += 1
-
-            except Exception:
-                errors_count += 1
-                continue
-        
-        db.commit()
-        return {"added": added_count, "errors": errors_count}
\ No newline at end of file
+                yield pickle.load(stream)
+            except EOFError:
+                return
+
+    # --- 4. NORMALIZAÇÃO VETORIZADA ---
+    @staticmethod
+    def normalize_chunk(df: pd.DataFrame, col_map: dict, formats: dict, first_row: int = 2) -> Tuple[pd.DataFrame, list]:
+        """
+        Converte as colunas do bloco de uma só vez. Devolve as linhas válidas (date, description, amount)
+        e as amostras de erro por linha (`first_row` = nº da linha do ficheiro da primeira linha do bloco).
+        """
+        raw_dates = df[col_map['date']]
+        raw_amounts = df[col_map['amount']]
+        dates = ImportService.parse_dates(raw_dates, formats)
+        amounts = ImportService.parse_amounts(raw_amounts, formats)
+
+        # Se não houver coluna de descrição mapeada, usa texto genérico
+        desc_col = col_map.get('description')
+        if desc_col:
+            descriptions = df[desc_col].fillna(DEFAULT_DESCRIPTION).astype(str).str.slice(0, 255)
+        else:
+            descriptions = pd.Series(DEFAULT_DESCRIPTION, index=df.index)
+
+        bad_date = dates.isna().to_numpy()
+        bad_amount = amounts.isna().to_numpy() & ~bad_date
+        errors = []
+        for mask, message, raw in ((bad_date, "Data inválida", raw_dates), (bad_amount, "Valor inválido", raw_amounts)):
+            for pos in np.flatnonzero(mask)[:MAX_ERROR_SAMPLES]:
+                errors.append({"row": first_row + int(pos), "error": message, "value": str(raw.iloc[pos])})
+        errors.sort(key=lambda e: e["row"])
+
+        valid = ~(bad_date | bad_amount)
+        clean = pd.DataFrame({
+            "date": dates[valid].dt.date,
+            "description": descriptions[valid],
+            "amount": amounts[valid].astype(float),
+        })
+        return clean, errors
+
+    @staticmethod
+    def parse_dates(raw: pd.Series, formats: dict) -> pd.Series:
+        """Um `to_datetime` por coluna com o formato detetado no ficheiro; só as falhas passam pelo parse genérico."""
+        if pd.api.types.is_datetime64_any_dtype(raw):
+            return raw
+        text = raw.astype('string').str.strip()
+
+        if 'date' not in formats:
+            sample = text.dropna().head(200)
+            hits = {fmt: pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum() for fmt in DATE_FORMATS}
+            best = max(hits, key=hits.get) if hits else None
+            formats['date'] = best if best and hits[best] > 0 else None
+
+        parsed = pd.to_datetime(text, format=formats['date'], errors='coerce') if formats['date'] else pd.Series(pd.NaT, index=raw.index)
+        retry = parsed.isna() & text.notna() & (text != '')
+        if retry.any():
+            parsed[retry] = pd.to_datetime(text[retry], dayfirst=True, format='mixed', errors='coerce')
+        return parsed
+
+    @staticmethod
+    def parse_amounts(raw: pd.Series, formats: dict) -> pd.Series:
+        """Remove símbolos de moeda e aplica o separador decimal detetado no ficheiro."""
+        if pd.api.types.is_numeric_dtype(raw):
+            return raw.astype(float)
+
+        # Colunas mistas (ex: Excel): valores já numéricos passam diretamente
+        is_text = raw.map(type).eq(str).to_numpy()
+        amounts = pd.to_numeric(raw.where(~is_text), errors='coerce').astype(float)
+        if not is_text.any():
+            return amounts
+
+        text = raw[is_text].str.lower().str.replace(r'eur|€|\s', '', regex=True)
+        if 'decimal' not in formats:
+            # O último separador de cada valor é o decimal ("1.234,56", "-2,50", "1,234.56")
+            last = text.str.extract(r'([.,])\d*$', expand=False)
+            formats['decimal'] = ',' if (last == ',').sum() > (last == '.').sum() else '.'
+
+        if formats['decimal'] == ',':
+            text = text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        else:
+            text = text.str.replace(',', '', regex=False)
+        amounts[is_text] = pd.to_numeric(text, errors='coerce')
+        return amounts
+
+    @staticmethod
+    def _fingerprint_rows(clean: pd.DataFrame, account_id: int, occurrences: dict) -> list:
+        """(fingerprint, data, descrição, valor, categoria, subcategoria) por linha. `occurrences` é partilhado entre blocos."""
+        rows = []
+        cents = np.round(clean["amount"].to_numpy() * 100).astype(np.int64)
+        for dt, desc, amount, c, category_id, subcategory_id in zip(
+            clean["date"], clean["description"], clean["amount"], cents, clean["category_id"], clean["subcategory_id"]
+        ):
+            # Fingerprint (com o nº de ocorrência da mesma linha no ficheiro)
+            key = (dt, int(c), normalize_description(desc))
+            fp = transaction_fingerprint(account_id, dt, amount, desc, occurrences[key])
+            rows.append((fp, dt, desc, float(amount), category_id, subcategory_id))
+            occurrences[key] += 1
+        return rows
+
+    # --- 5. ESCRITA ---
+    @staticmethod
+    def _existing_fingerprints(db: Session, rows: list) -> set:
+        """Verificação de Duplicados com um único SELECT ... IN por bloco."""
+        if not rows:
+            return set()
+        return {fp for (fp,) in db.query(Transaction.fingerprint).filter(
+            Transaction.fingerprint.in_([r[0] for r in rows])
+        )}
+
+    @staticmethod
+    def _insert_new(db: Session, rows: list, account_id: int, default_category_id: int, expense_id: int, income_id: int) -> Tuple[list, float]:
+        """
+        INSERT em lote (Core, executemany) das linhas que ainda não existem.
+        Devolve (linhas inseridas, efeito no saldo). Não faz commit.
+        O SELECT prévio afasta os duplicados conhecidos; o ON CONFLICT DO NOTHING no índice do fingerprint
+        cobre uma importação concorrente do mesmo ficheiro (essas linhas contam como duplicadas).
+        """
+        existing = ImportService._existing_fingerprints(db, rows)
+
+        # Lógica de Sinal vs Tipo: guarda-se o valor absoluto, o tipo dá o sinal
+        new = [
+            {
+                "date": dt, "description": desc, "amount": abs(amount), "account_id": account_id,
+                "transaction_type_id": expense_id if amount < 0 else income_id,
+                "category_id": category_id if category_id is not None else default_category_id,
+                "subcategory_id": subcategory_id, "fingerprint": fp,
+            }
+            for fp, dt, desc, amount, category_id, subcategory_id in rows if fp not in existing
+        ]
+        if not new:
+            return [], 0.0
+        stmt = dialect_insert(db, Transaction).on_conflict_do_nothing(index_elements=["fingerprint"])
+        inserted = set(db.execute(stmt.returning(Transaction.fingerprint), new).scalars())
+        new = [row for row in new if row["fingerprint"] in inserted]
+        return new, math.fsum(row[3] for row in rows if row[0] in inserted)
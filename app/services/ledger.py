@@ -0,0 +1,51 @@
+# Semântica dos tipos de transação (sinal e compra/venda), partilhada por routers e serviços.
+
+# Tipos cujo valor sai da conta (valor guardado/aplicado como negativo)
+NEGATIVE_KEYWORDS = ["Despesa", "Expense", "Levantamento", "Compra", "Buy", "Saída"]
+# Tipos de investimento que aumentam a posição no ativo
+BUY_KEYWORDS = ["Compra", "Buy"]
+
+
+# Natureza de cada tipo de transação (coluna `transaction_types.kind`)
+TYPE_KINDS = ("expense", "income", "buy", "sell")
+
+
+def is_negative_type(type_name: str) -> bool:
+    return any(word in (type_name or "") for word in NEGATIVE_KEYWORDS)
+
+
+def is_buy_type(type_name: str) -> bool:
+    return any(word in (type_name or "") for word in BUY_KEYWORDS)
+
+
+def ledger_amount(amount: float, type_name: str) -> float:
+    """
+    Efeito da transação no saldo da conta.
+    As transações manuais já guardam o sinal, mas as importadas guardam o valor absoluto,
+    por isso o sinal vem sempre do tipo.
+    """
+    return -abs(amount) if is_negative_type(type_name) else abs(amount)
+
+
+def unit_price(amount: float, quantity: float, price_per_unit=None) -> float:
+    """
+    Preço unitário de uma compra/venda: o indicado na transação ou, sem ele, |valor| / quantidade.
+    Única fonte para holdings, lotes e reconstruções (na criação e ao reproduzir o ledger).
+    """
+    if price_per_unit and price_per_unit > 0:
+        return price_per_unit
+    return abs(amount) / quantity if quantity and quantity > 0 else 0.0
+
+
+def type_sign(type_name: str) -> int:
+    """Sinal por omissão de um tipo novo (guardado em `transaction_types.sign`)."""
+    return -1 if is_negative_type(type_name) else 1
+
+
+def type_kind(type_name: str, is_investment: bool = False) -> str:
+    """Natureza por omissão de um tipo novo (guardada em `transaction_types.kind`)."""
+    if is_buy_type(type_name):
+        return "buy"
+    if is_investment:
+        return "sell"
+    return "expense" if is_negative_type(type_name) else "income"
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.models import AccountType, Category, TransactionType
+
+
+@dataclass(frozen=True)
+class TransactionTypeInfo:
+    id: int
+    name: str
+    is_investment: bool
+    sign: int
+    kind: str
+
+    @property
+    def is_buy(self) -> bool:
+        return self.kind == "buy"
+
+    def signed(self, amount: float) -> float:
+        """Valor com o sinal do tipo (as importadas guardam o valor absoluto)."""
+        return -abs(amount) if self.sign < 0 else abs(amount)
+
+
+@dataclass(frozen=True)
+class Lookup:
+    items: list
+    etag: str
+
+
+def _lookup(items: list) -> Lookup:
+    digest = hashlib.sha1(json.dumps(items, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return Lookup(items=items, etag=f'"{digest}"')
+
+
+class LookupRegistry:
+    """
+    Tabelas de referência (tipos de conta, tipos de transação e categorias de sistema) em memória.
+    Carregadas no arranque (ou no primeiro acesso) e recarregadas em `invalidate`; cada lista tem
+    um ETag para os endpoints /lookups responderem 304 sem tocar na BD.
+    """
+
+    def __init__(self):
+        self._transaction_types: Optional[Dict[int, TransactionTypeInfo]] = None
+        self._lookups: Dict[str, Lookup] = {}
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        types = {
+            t.id: TransactionTypeInfo(t.id, t.name, bool(t.is_investment), t.sign, t.kind)
+            for t in db.query(TransactionType).order_by(TransactionType.id)
+        }
+        account_types = [{"id": a.id, "name": a.name} for a in db.query(AccountType).order_by(AccountType.id)]
+        categories = [
+            {
+                "id": c.id, "name": c.name, "user_id": None,
+                "subcategories": [{"id": s.id, "name": s.name, "category_id": c.id} for s in sorted(c.subcategories, key=lambda s: s.id)],
+            }
+            for c in db.query(Category).options(selectinload(Category.subcategories))
+            .filter(Category.user_id.is_(None)).order_by(Category.id)
+        ]
+        lookups = {
+            "account-types": _lookup(account_types),
+            "transaction-types": _lookup([asdict(t) for t in types.values()]),
+            "categories": _lookup(categories),
+        }
+        with self._lock:
+            self._transaction_types = types
+            self._lookups = lookups
+
+    def _ensure(self, db: Session) -> None:
+        if self._transaction_types is None:
+            self.load(db)
+
+    def lookup(self, db: Session, name: str) -> Lookup:
+        self._ensure(db)
+        return self._lookups[name]
+
+    def transaction_types(self, db: Session) -> List[TransactionTypeInfo]:
+        self._ensure(db)
+        return list(self._transaction_types.values())
+
+    def transaction_type(self, db: Session, type_id: int) -> Optional[TransactionTypeInfo]:
+        self._ensure(db)
+        info = self._transaction_types.get(type_id)
+        if info is None and type_id is not None:
+            # Tipo criado depois do carregamento (ex: inserido diretamente na BD): recarregar uma vez
+            self.load(db)
+            info = self._transaction_types.get(type_id)
+        return info
+
+    def transaction_types_by_id(self, db: Session, type_ids: Iterable[int]) -> Dict[int, TransactionTypeInfo]:
+        """Tipos de um conjunto de ids (ex: os ids distintos de um DataFrame do ledger), para mapear colunas."""
+        return {int(type_id): self.transaction_type(db, int(type_id)) for type_id in type_ids}
+
+    def type_for_kind(self, db: Session, kind: str) -> Optional[TransactionTypeInfo]:
+        """Primeiro tipo (menor id) com esta natureza, ex: o tipo usado para despesas importadas."""
+        return next((t for t in self.transaction_types(db) if t.kind == kind), None)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._transaction_types = None
+            self._lookups = {}
+
+
+lookup_registry = LookupRegistry()
@@ -0,0 +1,138 @@
+from itertools import groupby
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models import Account, RealizedGain, TaxLot, Transaction, TransactionType, UserProfile
+from app.services.balance_service import BalanceService
+from app.services.ledger import unit_price
+from app.services.lookup_registry import lookup_registry
+
+COST_BASIS_METHODS = ("fifo", "average")
+DEFAULT_METHOD = "fifo"
+# Restos de lote abaixo disto consideram-se esgotados
+DUST = 1e-9
+# Contas reconstruídas por transação (cada lote de contas tem o seu commit)
+REBUILD_BATCH_SIZE = 200
+
+
+class LotsService:
+    """
+    Lotes fiscais por (conta, ativo): cada compra abre um lote, cada venda consome lotes
+    e grava logo a mais/menos-valia realizada, para os relatórios serem leituras indexadas.
+    """
+
+    @staticmethod
+    def user_method(db: Session, user_id: int) -> str:
+        method = db.query(UserProfile.cost_basis_method).filter(UserProfile.user_id == user_id).scalar()
+        return method if method in COST_BASIS_METHODS else DEFAULT_METHOD
+
+    # --- 1. ESCRITA (no momento da transação) ---
+    @staticmethod
+    def record_buy(db: Session, tx: Transaction, unit_cost: float) -> TaxLot:
+        lot = TaxLot(
+            account_id=tx.account_id, asset_id=tx.asset_id, transaction_id=tx.id,
+            acquired_date=tx.date, quantity=tx.quantity, remaining_quantity=tx.quantity, unit_cost=unit_cost
+        )
+        db.add(lot)
+        return lot
+
+    @staticmethod
+    def record_sell(db: Session, tx: Transaction, unit_price: float, method: str) -> List[RealizedGain]:
+        open_lots = db.query(TaxLot).filter(
+            TaxLot.account_id == tx.account_id,
+            TaxLot.asset_id == tx.asset_id,
+            TaxLot.remaining_quantity > DUST
+        ).order_by(TaxLot.acquired_date.asc(), TaxLot.id.asc()).with_for_update().all()
+
+        gains = LotsService.consume(open_lots, tx, unit_price, method)
+        db.add_all(gains)
+        return gains
+
+    @staticmethod
+    def consume(open_lots: List[TaxLot], tx: Transaction, unit_price: float, method: str) -> List[RealizedGain]:
+        """Consome `tx.quantity` dos lotes abertos (já ordenados) e devolve os ganhos realizados."""
+        available = sum(lot.remaining_quantity for lot in open_lots)
+        # Vender mais do que se tem: só se realiza o que existe (como nas holdings)
+        to_sell = min(tx.quantity, available)
+        if to_sell <= DUST:
+            return []
+
+        def gain(quantity: float, cost_basis: float, lot: Optional[TaxLot]) -> RealizedGain:
+            proceeds = quantity * unit_price
+            return RealizedGain(
+                transaction_id=tx.id, lot_id=lot.id if lot else None, account_id=tx.account_id,
+                asset_id=tx.asset_id, date=tx.date, quantity=quantity, proceeds=proceeds,
+                cost_basis=cost_basis, realized_pl=proceeds - cost_basis
+            )
+
+        if method == "average":
+            # Custo médio: um único registo; todos os lotes abertos diminuem na mesma proporção
+            total_cost = sum(lot.remaining_quantity * lot.unit_cost for lot in open_lots)
+            ratio = to_sell / available
+            for lot in open_lots:
+                lot.remaining_quantity -= lot.remaining_quantity * ratio
+            return [gain(to_sell, total_cost * ratio, None)]
+
+        gains = []
+        for lot in open_lots:
+            if to_sell <= DUST:
+                break
+            used = min(lot.remaining_quantity, to_sell)
+            lot.remaining_quantity -= used
+            to_sell -= used
+            gains.append(gain(used, used * lot.unit_cost, lot))
+        return gains
+
+    # --- 2. RECONSTRUÇÃO (ao editar/apagar transações ou mudar de método) ---
+    @staticmethod
+    def rebuild(db: Session, account_id: int, asset_id: int, method: str) -> None:
+        """Apaga e volta a gerar lotes e ganhos de uma posição a partir do ledger. Não faz commit."""
+        db.query(RealizedGain).filter(RealizedGain.account_id == account_id, RealizedGain.asset_id == asset_id).delete(synchronize_session=False)
+        db.query(TaxLot).filter(TaxLot.account_id == account_id, TaxLot.asset_id == asset_id).delete(synchronize_session=False)
+
+        rows = db.query(Transaction).join(
+            TransactionType, Transaction.transaction_type_id == TransactionType.id
+        ).filter(
+            Transaction.account_id == account_id,
+            Transaction.asset_id == asset_id,
+            Transaction.quantity > 0
+        ).order_by(Transaction.date.asc(), Transaction.id.asc()).all()
+
+        open_lots: List[TaxLot] = []
+        for tx in rows:
+            unit = unit_price(tx.amount, tx.quantity, tx.price_per_unit)
+            if lookup_registry.transaction_type(db, tx.transaction_type_id).is_buy:
+                lot = LotsService.record_buy(db, tx, unit)
+                db.flush()  # precisamos do ID do lote para os ganhos FIFO
+                open_lots.append(lot)
+            else:
+                db.add_all(LotsService.consume(open_lots, tx, unit, method))
+                open_lots = [lot for lot in open_lots if lot.remaining_quantity > DUST]
+
+    @staticmethod
+    def rebuild_users(db: Session, user_ids: Optional[List[int]] = None, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+        """
+        Reconstrói os lotes de todas as posições dos utilizadores indicados (ou de todos).
+        As contas são tratadas em lotes por id crescente: cada lote bloqueia as suas contas (o mesmo lock
+        de `create_transaction`, para uma compra a meio não ficar com dois lotes) e faz commit.
+        """
+        query = db.query(Account.user_id, Transaction.account_id, Transaction.asset_id).join(
+            Account, Transaction.account_id == Account.id
+        ).filter(Transaction.asset_id.isnot(None)).distinct()
+        if user_ids is not None:
+            query = query.filter(Account.user_id.in_(user_ids))
+
+        keys = sorted(query.all(), key=lambda k: (k[1], k[2]))
+        accounts = [(account_id, list(group)) for account_id, group in groupby(keys, key=lambda k: k[1])]
+        methods = {}
+        for start in range(0, len(accounts), batch_size):
+            batch = accounts[start:start + batch_size]
+            BalanceService.lock_accounts(db, [account_id for account_id, _ in batch])
+            for _, positions in batch:
+                for user_id, account_id, asset_id in positions:
+                    if user_id not in methods:
+                        methods[user_id] = LotsService.user_method(db, user_id)
+                    LotsService.rebuild(db, account_id, asset_id, methods[user_id])
+            db.commit()
+        return len(keys)
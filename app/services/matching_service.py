@@ -0,0 +1,166 @@
+import re
+from datetime import date, timedelta
+from difflib import SequenceMatcher
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.models import Account, Transaction, TransactionType
+from app.services.lookup_registry import lookup_registry
+
+# Distância máxima (dias) entre os dois lados de um par
+DEFAULT_WINDOW_DAYS = 3
+# Semelhança mínima das descrições (0-1) para um quase-duplicado
+DEFAULT_SIMILARITY = 0.8
+
+
+def _comparable(description: str) -> str:
+    # Referências e números de operação mudam entre exportações do mesmo movimento
+    text = re.sub(r"\d+", " ", str(description or "").lower())
+    return re.sub(r"[^\w]+", " ", text).strip()
+
+
+def description_similarity(a: str, b: str) -> float:
+    a, b = _comparable(a), _comparable(b)
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def sweep_pairs(keys: np.ndarray, days: np.ndarray, window: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Sort-and-sweep: com as linhas ordenadas por (chave, dia), os candidatos de cada linha são as
+    linhas seguintes com a mesma chave e a menos de `window` dias. Em vez de comparar todos os pares,
+    compara-se o array consigo próprio deslocado 1, 2, ... posições, até nenhum par caber na janela.
+    Devolve, por deslocamento, os índices (na ordem original) dos pares candidatos.
+    """
+    order = np.lexsort((days, keys))
+    keys, days = keys[order], days[order]
+    for offset in range(1, len(order)):
+        within = (keys[offset:] == keys[:-offset]) & (days[offset:] - days[:-offset] <= window)
+        if not within.any():
+            return
+        left = np.flatnonzero(within)
+        yield order[left], order[left + offset]
+
+
+class MatchingService:
+    # --- 1. LEITURA ---
+    @staticmethod
+    def load_frame(db: Session, user_id: int, start: Optional[date] = None, end: Optional[date] = None) -> pd.DataFrame:
+        """Transações não-investimento do utilizador (id, conta, data, valor com sinal, descrição, fingerprint)."""
+        query = db.query(
+            Transaction.id, Transaction.account_id, Transaction.date, Transaction.amount,
+            Transaction.description, Transaction.fingerprint, TransactionType.id
+        ).join(Account, Transaction.account_id == Account.id).join(
+            TransactionType, Transaction.transaction_type_id == TransactionType.id
+        ).filter(
+            Account.user_id == user_id,
+            Transaction.asset_id.is_(None),
+            Transaction.date.isnot(None),
+            Transaction.amount.isnot(None)
+        )
+        if start:
+            query = query.filter(Transaction.date >= start)
+        if end:
+            query = query.filter(Transaction.date <= end)
+
+        frame = pd.DataFrame(query.all(), columns=["id", "account_id", "date", "amount", "description", "fingerprint", "type_id"])
+        # O sinal vem do tipo (as importadas guardam o valor absoluto)
+        types = lookup_registry.transaction_types_by_id(db, frame["type_id"].unique())
+        negative = frame["type_id"].map({i: t.sign < 0 for i, t in types.items()}).astype(bool)
+        frame["amount"] = np.where(negative, -frame["amount"].abs(), frame["amount"].abs())
+        frame["cents"] = np.round(frame["amount"].to_numpy(dtype=float) * 100).astype(np.int64)
+        frame["day"] = pd.to_datetime(frame["date"]).to_numpy().astype("datetime64[D]").astype(np.int64)
+        return frame.drop(columns="type_id")
+
+    # --- 2. QUASE-DUPLICADOS (mesma conta, mesmo valor, datas próximas, descrição parecida) ---
+    @staticmethod
+    def near_duplicates(frame: pd.DataFrame, window_days: int = DEFAULT_WINDOW_DAYS,
+                        similarity: float = DEFAULT_SIMILARITY) -> List[dict]:
+        if frame.empty:
+            return []
+        # Chave = (conta, valor em cêntimos com sinal), combinada num único inteiro para o lexsort
+        keys = pd.MultiIndex.from_arrays([frame["account_id"], frame["cents"]]).factorize()[0]
+        days = frame["day"].to_numpy()
+        ids = frame["id"].to_numpy()
+        descriptions = frame["description"].to_numpy(dtype=object)
+        amounts = frame["amount"].to_numpy(dtype=float)
+
+        pairs = []
+        for left, right in sweep_pairs(keys, days, window_days):
+            for i, j in zip(left.tolist(), right.tolist()):
+                score = description_similarity(descriptions[i], descriptions[j])
+                if score >= similarity:
+                    first, second = sorted((i, j), key=lambda k: (days[k], ids[k]))
+                    pairs.append({
+                        "transaction_ids": [int(ids[first]), int(ids[second])],
+                        "amount": round(float(amounts[i]), 2),
+                        "days_apart": int(abs(days[i] - days[j])),
+                        "similarity": round(score, 3),
+                    })
+        pairs.sort(key=lambda p: p["transaction_ids"])
+        return pairs
+
+    # --- 3. TRANSFERÊNCIAS (contas diferentes, valor simétrico, datas próximas) ---
+    @staticmethod
+    def transfers(frame: pd.DataFrame, window_days: int = DEFAULT_WINDOW_DAYS) -> List[dict]:
+        """
+        Pares saída/entrada entre contas do utilizador. Cada transação entra no máximo num par:
+        os candidatos são atribuídos do mais próximo (em dias) para o mais afastado.
+        """
+        if frame.empty:
+            return []
+        cents = frame["cents"].to_numpy()
+        days = frame["day"].to_numpy()
+        accounts = frame["account_id"].to_numpy()
+        ids = frame["id"].to_numpy()
+
+        candidates = []
+        for left, right in sweep_pairs(np.abs(cents), days, window_days):
+            valid = (np.sign(cents[left]) == -np.sign(cents[right])) & (cents[left] != 0) & (accounts[left] != accounts[right])
+            for i, j in zip(left[valid].tolist(), right[valid].tolist()):
+                candidates.append((abs(int(days[i] - days[j])), i, j))
+
+        used, pairs = set(), []
+        for gap, i, j in sorted(candidates):
+            if i in used or j in used:
+                continue
+            used.update((i, j))
+            out, inc = (i, j) if cents[i] < 0 else (j, i)
+            pairs.append({
+                "outgoing_id": int(ids[out]), "incoming_id": int(ids[inc]),
+                "from_account_id": int(accounts[out]), "to_account_id": int(accounts[inc]),
+                "amount": abs(int(cents[i])) / 100, "days_apart": gap,
+            })
+        pairs.sort(key=lambda p: (p["outgoing_id"], p["incoming_id"]))
+        return pairs
+
+    # --- 4. REVISÃO ---
+    @staticmethod
+    def review(db: Session, user_id: int, start: Optional[date] = None, end: Optional[date] = None,
+               window_days: int = DEFAULT_WINDOW_DAYS, similarity: float = DEFAULT_SIMILARITY) -> dict:
+        frame = MatchingService.load_frame(db, user_id, start, end)
+        return {
+            "near_duplicates": MatchingService.near_duplicates(frame, window_days, similarity),
+            "transfers": MatchingService.transfers(frame, window_days),
+        }
+
+    @staticmethod
+    def review_import(db: Session, user_id: int, fingerprints: set, start: date, end: date,
+                      window_days: int = DEFAULT_WINDOW_DAYS, similarity: float = DEFAULT_SIMILARITY) -> dict:
+        """Pares em que pelo menos um lado acabou de ser importado (identificado pelo fingerprint)."""
+        if not fingerprints:
+            return {"near_duplicates": [], "transfers": []}
+        frame = MatchingService.load_frame(
+            db, user_id, start - timedelta(days=window_days), end + timedelta(days=window_days)
+        )
+        new_ids = set(frame.loc[frame["fingerprint"].isin(fingerprints), "id"].tolist())
+        return {
+            "near_duplicates": [p for p in MatchingService.near_duplicates(frame, window_days, similarity)
+                                if new_ids.intersection(p["transaction_ids"])],
+            "transfers": [p for p in MatchingService.transfers(frame, window_days)
+                          if p["outgoing_id"] in new_ids or p["incoming_id"] in new_ids],
+        }
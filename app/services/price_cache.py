@@ -0,0 +1,113 @@
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import AssetPrice
+
+
+class PriceCache:
+    """
+    Cache partilhada (por processo) do último preço conhecido de cada ativo.
+
+    Os preços são globais (não pertencem a nenhum utilizador), por isso milhares de
+    carteiras com AAPL ou BTC-USD reutilizam a mesma entrada em vez de irem todas à
+    tabela `asset_prices`. Só guardamos preços encontrados: a ausência de preço não é
+    cacheada, para que um preço inserido depois apareça logo no pedido seguinte.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        # asset_id -> (data do preço, preço de fecho, instante de expiração)
+        self._entries: Dict[int, Tuple[date, float, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # --- LEITURA ---
+    def get_latest_prices(self, db: Session, asset_ids: Iterable[int]) -> Dict[int, float]:
+        """Devolve {asset_id: preço} para os ativos com preço conhecido (cache + 1 query para os restantes)."""
+        now = time.monotonic()
+        result: Dict[int, float] = {}
+        missing = []
+
+        with self._lock:
+            for asset_id in set(asset_ids):
+                entry = self._entries.get(asset_id)
+                if entry and entry[2] > now:
+                    result[asset_id] = entry[1]
+                    self.hits += 1
+                else:
+                    missing.append(asset_id)
+                    self.misses += 1
+
+        if missing:
+            fetched = self._fetch_latest(db, missing)
+            expires_at = time.monotonic() + self.ttl_seconds
+            with self._lock:
+                for asset_id, (price_date, close_price) in fetched.items():
+                    self._entries[asset_id] = (price_date, close_price, expires_at)
+            result.update({asset_id: close_price for asset_id, (_, close_price) in fetched.items()})
+
+        return result
+
+    @staticmethod
+    def _fetch_latest(db: Session, asset_ids) -> Dict[int, Tuple[date, float]]:
+        # Uma única query para todos os ativos em falta: último preço por ativo (data desc, id desc)
+        ranked = db.query(
+            AssetPrice.asset_id.label("asset_id"),
+            AssetPrice.date.label("date"),
+            AssetPrice.close_price.label("close_price"),
+            func.row_number().over(
+                partition_by=AssetPrice.asset_id,
+                order_by=(AssetPrice.date.desc(), AssetPrice.id.desc())
+            ).label("rn")
+        ).filter(AssetPrice.asset_id.in_(asset_ids)).subquery()
+
+        rows = db.query(ranked.c.asset_id, ranked.c.date, ranked.c.close_price).filter(ranked.c.rn == 1).all()
+        return {asset_id: (price_date, close_price) for asset_id, price_date, close_price in rows}
+
+    # --- ESCRITA / INVALIDAÇÃO ---
+    def update(self, asset_id: int, price_date: date, close_price: float) -> None:
+        """
+        Atualiza a entrada após uma escrita de preço.
+        Se o ativo não estiver em cache não fazemos nada: a próxima leitura vai à BD
+        (pode existir lá um preço mais recente do que este).
+        """
+        with self._lock:
+            entry = self._entries.get(asset_id)
+            if entry and entry[0] <= price_date:
+                self._entries[asset_id] = (price_date, close_price, time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, asset_id: Optional[int] = None) -> None:
+        with self._lock:
+            if asset_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(asset_id, None)
+
+    def clear(self) -> None:
+        """Limpa entradas e estatísticas."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Instância global (uma por processo/worker)
+price_cache = PriceCache(ttl_seconds=settings.PRICE_CACHE_TTL_SECONDS)
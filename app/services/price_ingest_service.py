@@ -0,0 +1,165 @@
+import csv
+import io
+import json
+import math
+import time
+from datetime import date
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.database.database import dialect_insert
+from app.models import Asset, AssetPrice
+from app.services.asset_index import asset_index, asset_row
+from app.services.price_cache import price_cache
+from app.services.fx_service import infer_asset_currency
+
+
+class PriceIngestService:
+    BATCH_SIZE = 5000
+    MAX_ERROR_SAMPLES = 20
+
+    # --- 1. PARSING (Streaming, linha a linha) ---
+    @staticmethod
+    def detect_format(filename: str) -> str:
+        name = (filename or "").lower()
+        if name.endswith(".csv"):
+            return "csv"
+        if name.endswith((".ndjson", ".jsonl")):
+            return "ndjson"
+        raise ValueError("Formato não suportado. Use CSV ou NDJSON.")
+
+    @staticmethod
+    def iter_records(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, dict]]:
+        """Devolve (nº da linha, registo cru) sem carregar o ficheiro todo para memória."""
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        try:
+            if fmt == "csv":
+                reader = csv.DictReader(text)
+                if reader.fieldnames:
+                    reader.fieldnames = [f.strip().lower() for f in reader.fieldnames]
+                for line_no, row in enumerate(reader, start=2):
+                    yield line_no, row
+            else:
+                for line_no, line in enumerate(text, start=1):
+                    if line.strip():
+                        yield line_no, line
+        finally:
+            # Não fechar o stream original (pertence a quem chamou)
+            text.detach()
+
+    @staticmethod
+    def parse_record(record) -> Tuple[str, date, float]:
+        if isinstance(record, str):
+            record = json.loads(record)
+        symbol = str(record.get("symbol") or "").strip().upper()
+        if not symbol:
+            raise ValueError("símbolo em falta")
+        raw_date = record.get("date")
+        price_date = raw_date if isinstance(raw_date, date) else date.fromisoformat(str(raw_date).strip())
+        raw_close = record.get("close", record.get("close_price"))
+        close = float(raw_close)
+        if not math.isfinite(close):
+            raise ValueError("preço inválido")
+        if close < 0:
+            raise ValueError("preço negativo")
+        return symbol, price_date, close
+
+    # --- 2. ESCRITA (Upsert em lote) ---
+    @staticmethod
+    def resolve_assets(db: Session, symbols: Iterable[str], symbol_ids: Dict[str, int]) -> List[dict]:
+        """Preenche `symbol_ids` com os IDs dos símbolos; cria os ativos que não existem. Devolve os criados."""
+        unknown = {s for s in symbols if s not in symbol_ids}
+        if not unknown:
+            return []
+
+        for asset_id, symbol in db.query(Asset.id, Asset.symbol).filter(Asset.symbol.in_(unknown)):
+            symbol_ids[symbol] = asset_id
+
+        to_create = [s for s in unknown if s not in symbol_ids]
+        if not to_create:
+            return []
+        new_assets = [Asset(symbol=s, name=s, asset_type="Stock", currency=infer_asset_currency(s)) for s in to_create]
+        db.add_all(new_assets)
+        db.flush()
+        for asset in new_assets:
+            symbol_ids[asset.symbol] = asset.id
+        return [asset_row(asset) for asset in new_assets]
+
+    @staticmethod
+    def upsert_prices(db: Session, rows: List[dict]) -> List[dict]:
+        """
+        INSERT ... ON CONFLICT (asset_id, date) DO UPDATE em executemany.
+        Não faz commit. Devolve as linhas efetivamente escritas (sem repetidos).
+        """
+        if not rows:
+            return []
+
+        # O mesmo (ativo, dia) não pode aparecer duas vezes no mesmo statement: fica o último
+        deduped = {(r["asset_id"], r["date"]): r for r in rows}
+        batch = list(deduped.values())
+
+        stmt = dialect_insert(db, AssetPrice)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["asset_id", "date"],
+            set_={"close_price": stmt.excluded.close_price}
+        )
+        db.execute(stmt, batch)
+        return batch
+
+    @staticmethod
+    def refresh_cache(batch: List[dict]) -> None:
+        """Depois do commit: passa à cache o preço mais recente de cada ativo do lote."""
+        latest: Dict[int, dict] = {}
+        for r in batch:
+            current = latest.get(r["asset_id"])
+            if current is None or r["date"] >= current["date"]:
+                latest[r["asset_id"]] = r
+        for asset_id, r in latest.items():
+            price_cache.update(asset_id, r["date"], r["close_price"])
+
+    # --- 3. PIPELINE COMPLETO ---
+    @staticmethod
+    def ingest(db: Session, stream: BinaryIO, fmt: str, batch_size: int = BATCH_SIZE) -> dict:
+        start = time.perf_counter()
+        symbol_ids: Dict[str, int] = {}
+        pending: List[Tuple[str, date, float]] = []
+        upserted = 0
+        created = 0
+        errors = 0
+        error_samples = []
+
+        def flush():
+            nonlocal upserted, created
+            new_assets = PriceIngestService.resolve_assets(db, {s for s, _, _ in pending}, symbol_ids)
+            batch = PriceIngestService.upsert_prices(db, [
+                {"asset_id": symbol_ids[s], "date": d, "close_price": c} for s, d, c in pending
+            ])
+            db.commit()
+            PriceIngestService.refresh_cache(batch)
+            asset_index.add(new_assets)
+            created += len(new_assets)
+            upserted += len(batch)
+            pending.clear()
+
+        for line_no, record in PriceIngestService.iter_records(stream, fmt):
+            try:
+                pending.append(PriceIngestService.parse_record(record))
+            except Exception as e:
+                errors += 1
+                if len(error_samples) < PriceIngestService.MAX_ERROR_SAMPLES:
+                    error_samples.append({"line": line_no, "error": str(e)})
+                continue
+            if len(pending) >= batch_size:
+                flush()
+        flush()
+
+        elapsed = time.perf_counter() - start
+        return {
+            "upserted": upserted,
+            "errors": errors,
+            "error_samples": error_samples,
+            "assets_created": created,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(upserted / elapsed, 1) if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,82 @@
+import time
+from typing import Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.models import Account, Transaction
+from app.models.types import from_minor_units, minor_units
+from app.services.balance_service import BalanceService
+from app.services.lookup_registry import lookup_registry
+
+RECONCILE_BATCH_SIZE = 1000
+MAX_DRIFT_SAMPLES = 50
+
+
+class ReconciliationService:
+    """
+    Confirma que `current_balance = opening_balance + soma do ledger` em todas as contas.
+    Percorre as contas por id em lotes (keyset), com uma única query agrupada por lote,
+    e compara em cêntimos inteiros: qualquer diferença é drift, sem tolerâncias.
+    """
+
+    @staticmethod
+    def reconcile(db: Session, apply: bool = False, batch_size: int = RECONCILE_BATCH_SIZE,
+                  user_id: Optional[int] = None) -> dict:
+        start = time.perf_counter()
+        report = {
+            "accounts_checked": 0, "accounts_drifted": 0, "total_abs_drift": 0.0,
+            "batches": 0, "drift": [], "applied": apply,
+        }
+
+        # O sinal vem do tipo: resolvido uma vez em Python e aplicado na BD com um CASE
+        negative_ids = [t.id for t in lookup_registry.transaction_types(db) if t.sign < 0]
+        cents = func.abs(minor_units(Transaction.amount))
+        signed = case((Transaction.transaction_type_id.in_(negative_ids), -cents), else_=cents)
+
+        total_abs_drift, last_id = 0, 0
+        while True:
+            ids_query = select(Account.id).where(Account.id > last_id).order_by(Account.id).limit(batch_size)
+            if user_id is not None:
+                ids_query = ids_query.where(Account.user_id == user_id)
+            ids = db.execute(ids_query).scalars().all()
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            ledger = select(
+                Transaction.account_id, func.sum(signed).label("total")
+            ).where(Transaction.account_id.between(ids[0], last_id)).group_by(Transaction.account_id).subquery()
+            rows = db.execute(
+                select(
+                    Account.id, Account.user_id, minor_units(Account.opening_balance),
+                    minor_units(Account.current_balance), func.coalesce(ledger.c.total, 0)
+                ).outerjoin(ledger, ledger.c.account_id == Account.id).where(Account.id.in_(ids))
+            ).all()
+
+            for account_id, owner_id, opening, current, total in rows:
+                expected = (opening or 0) + int(total)
+                difference = expected - (current or 0)
+                report["accounts_checked"] += 1
+                if not difference:
+                    continue
+                report["accounts_drifted"] += 1
+                total_abs_drift += abs(difference)
+                if len(report["drift"]) < MAX_DRIFT_SAMPLES:
+                    report["drift"].append({
+                        "account_id": account_id, "user_id": owner_id, "stored": from_minor_units(current or 0),
+                        "expected": from_minor_units(expected), "difference": from_minor_units(difference),
+                    })
+                if apply:
+                    # Corrige com um incremento (não um SET): escritas concorrentes feitas depois da leitura mantêm-se
+                    BalanceService.apply_delta(db, account_id, from_minor_units(difference))
+
+            if apply:
+                db.commit()
+            report["batches"] += 1
+
+        elapsed = time.perf_counter() - start
+        report["total_abs_drift"] = from_minor_units(total_abs_drift)
+        report["elapsed_seconds"] = round(elapsed, 3)
+        report["accounts_per_second"] = round(report["accounts_checked"] / elapsed, 1) if elapsed > 0 else None
+        return report
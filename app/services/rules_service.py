@@ -0,0 +1,228 @@
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Account, Category, CategoryRule, SubCategory, Transaction
+
+# Categoria onde caem as transações importadas que nenhuma regra apanhou
+IMPORT_CATEGORY_NAME = "Importações"
+# Transações lidas de cada vez ao aplicar as regras às existentes
+APPLY_BATCH_SIZE = 5000
+# Limites às expressões regulares das regras: correm em Python sobre cada descrição importada
+RULE_PATTERN_MAX_LENGTH = 200
+# Quantificador aplicado a um grupo que já tem um quantificador, ex: (a+)+ ou (\w*)*: backtracking exponencial
+_NESTED_QUANTIFIER = re.compile(r"\((?:[^()\\]|\\.)*[*+}](?:[^()\\]|\\.)*\)[*+{]")
+
+
+def _normalize(text: pd.Series) -> pd.Series:
+    return text.fillna('').astype(str).str.lower().str.replace(r'\s+', ' ', regex=True)
+
+
+class AhoCorasick:
+    """Autómato Aho-Corasick: encontra todas as palavras-chave de um texto numa única passagem."""
+
+    def __init__(self, keywords: Dict[str, List[int]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for keyword, ids in keywords.items():
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].extend(ids)
+
+        # Ligações de falha em largura (BFS); cada estado herda as saídas do seu estado de falha
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                if state:
+                    fail = self._fail[state]
+                    while fail and char not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> set:
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._out[state]:
+                found.update(self._out[state])
+        return found
+
+
+class RuleMatcher:
+    """Regras de um utilizador compiladas: palavras-chave num autómato, regex compiladas, limites em arrays."""
+
+    def __init__(self, rules: List[CategoryRule]):
+        rules = sorted(rules, key=lambda r: (r.priority, r.id))
+        self.category_ids = np.array([r.category_id for r in rules], dtype=object)
+        self.subcategory_ids = np.array([r.subcategory_id for r in rules], dtype=object)
+        self.min_amounts = np.array([r.min_amount if r.min_amount is not None else -np.inf for r in rules], dtype=float)
+        self.max_amounts = np.array([r.max_amount if r.max_amount is not None else np.inf for r in rules], dtype=float)
+
+        keywords: Dict[str, List[int]] = {}
+        self.regexes: List[Tuple[int, re.Pattern]] = []
+        self.unconditional: List[int] = []
+        for idx, rule in enumerate(rules):
+            if not rule.pattern:
+                self.unconditional.append(idx)
+            elif rule.match_type == "regex":
+                self.regexes.append((idx, re.compile(rule.pattern, re.IGNORECASE)))
+            else:
+                keyword = _normalize(pd.Series([rule.pattern])).iloc[0].strip()
+                keywords.setdefault(keyword, []).append(idx)
+        self.automaton = AhoCorasick(keywords) if keywords else None
+
+    def __len__(self) -> int:
+        return len(self.category_ids)
+
+    def match(self, descriptions: pd.Series, amounts: np.ndarray) -> np.ndarray:
+        """Índice (por prioridade) da regra vencedora para cada linha, ou -1."""
+        n, r = len(descriptions), len(self)
+        if not n or not r:
+            return np.full(n, -1)
+
+        hits = np.zeros((n, r), dtype=bool)
+        hits[:, self.unconditional] = True
+        if self.automaton:
+            for i, text in enumerate(_normalize(descriptions)):
+                for idx in self.automaton.search(text):
+                    hits[i, idx] = True
+        for idx, regex in self.regexes:
+            hits[:, idx] = descriptions.fillna('').astype(str).str.contains(regex, na=False).to_numpy()
+
+        absolute = np.abs(np.asarray(amounts, dtype=float))[:, None]
+        hits &= (absolute >= self.min_amounts) & (absolute <= self.max_amounts)
+        # As regras estão ordenadas por prioridade: a primeira coluna verdadeira ganha
+        return np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+
+    def categorize(self, descriptions: pd.Series, amounts: np.ndarray, default_category_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        winner = self.match(descriptions, amounts)
+        matched = winner >= 0
+        categories = np.full(len(winner), default_category_id, dtype=object)
+        subcategories = np.full(len(winner), None, dtype=object)
+        categories[matched] = self.category_ids[winner[matched]]
+        subcategories[matched] = self.subcategory_ids[winner[matched]]
+        return categories, subcategories
+
+
+class RuleMatcherCache:
+    """Matcher compilado por utilizador; invalidado sempre que as regras desse utilizador mudam."""
+
+    def __init__(self):
+        self._matchers: Dict[int, RuleMatcher] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> RuleMatcher:
+        with self._lock:
+            matcher = self._matchers.get(user_id)
+        if matcher is None:
+            matcher = RuleMatcher(db.query(CategoryRule).filter(CategoryRule.user_id == user_id).all())
+            with self._lock:
+                self._matchers[user_id] = matcher
+        return matcher
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._matchers.clear()
+            else:
+                self._matchers.pop(user_id, None)
+
+
+rule_cache = RuleMatcherCache()
+
+
+class RulesService:
+    # --- 1. GESTÃO DE REGRAS ---
+    @staticmethod
+    def create(db: Session, user_id: int, data: dict) -> CategoryRule:
+        category = db.query(Category).filter(Category.id == data["category_id"]).first()
+        if not category or category.user_id not in (None, user_id):
+            raise ValueError("Categoria inválida.")
+        if data.get("subcategory_id"):
+            sub = db.query(SubCategory).filter(SubCategory.id == data["subcategory_id"]).first()
+            if not sub or sub.category_id != category.id:
+                raise ValueError("A subcategoria não pertence à categoria.")
+        if not data.get("pattern") and data.get("min_amount") is None and data.get("max_amount") is None:
+            raise ValueError("A regra precisa de um padrão ou de um intervalo de valor.")
+        if data.get("min_amount") is not None and data.get("max_amount") is not None and data["min_amount"] > data["max_amount"]:
+            raise ValueError("Intervalo de valor inválido.")
+        if data.get("pattern") and len(data["pattern"]) > RULE_PATTERN_MAX_LENGTH:
+            raise ValueError(f"O padrão não pode ter mais de {RULE_PATTERN_MAX_LENGTH} caracteres.")
+        if data.get("pattern") and data.get("match_type") == "regex":
+            try:
+                re.compile(data["pattern"])
+            except re.error as e:
+                raise ValueError(f"Expressão regular inválida: {e}")
+            if _NESTED_QUANTIFIER.search(data["pattern"]):
+                raise ValueError("Expressão regular demasiado complexa (quantificadores encaixados).")
+
+        rule = CategoryRule(**data, user_id=user_id)
+        db.add(rule)
+        db.commit()
+        db.refresh(rule)
+        rule_cache.invalidate(user_id)
+        return rule
+
+    @staticmethod
+    def delete(db: Session, rule: CategoryRule) -> None:
+        db.delete(rule)
+        db.commit()
+        rule_cache.invalidate(rule.user_id)
+
+    # --- 2. APLICAR A TRANSAÇÕES EXISTENTES ---
+    @staticmethod
+    def apply_to_existing(db: Session, user_id: int, overwrite: bool = False, batch_size: int = APPLY_BATCH_SIZE) -> dict:
+        """
+        Aplica as regras com o mesmo `RuleMatcher` da importação (regex Python, palavras-chave normalizadas),
+        lendo as transações em lotes por id e escrevendo um UPDATE por regra vencedora em cada lote.
+        Sem `overwrite` só mexe em transações sem categoria ou na categoria de importações; em ambos os
+        casos a regra mais prioritária que apanha a linha fica com ela.
+        """
+        rules = db.query(CategoryRule).filter(CategoryRule.user_id == user_id).all()
+        matcher = RuleMatcher(rules)
+        user_accounts = select(Account.id).where(Account.user_id == user_id)
+        scope = [Transaction.account_id.in_(user_accounts), Transaction.asset_id.is_(None)]
+        if not overwrite:
+            import_categories = select(Category.id).where(Category.user_id == user_id, Category.name == IMPORT_CATEGORY_NAME)
+            scope.append(or_(Transaction.category_id.is_(None), Transaction.category_id.in_(import_categories)))
+
+        updated, last_id = 0, 0
+        while len(matcher):
+            batch = db.execute(
+                select(Transaction.id, Transaction.description, Transaction.amount)
+                .where(*scope, Transaction.id > last_id).order_by(Transaction.id).limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            ids = np.array([row[0] for row in batch])
+            winner = matcher.match(pd.Series([row[1] for row in batch], dtype=object), np.array([row[2] for row in batch], dtype=float))
+            for idx in np.unique(winner[winner >= 0]):
+                db.execute(
+                    update(Transaction).where(Transaction.id.in_(ids[winner == idx].tolist()))
+                    .values(category_id=matcher.category_ids[idx], subcategory_id=matcher.subcategory_ids[idx])
+                    .execution_options(synchronize_session=False)
+                )
+            updated += int((winner >= 0).sum())
+        db.commit()
+        return {"rules": len(rules), "updated": updated}
@@ -0,0 +1,308 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator, List, Tuple, Type
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# Amostra inicial usada para detetar formato, encoding e separador
+SNIFF_BYTES = 64 * 1024
+CSV_DELIMITERS = [',', ';', '\t', '|']
+CSV_ENCODINGS = ['utf-8-sig', 'cp1252', 'latin-1']
+# Colunas canónicas dos formatos estruturados (reconhecidas por ImportService.map_columns)
+CANONICAL_COLUMNS = ['date', 'description', 'amount']
+
+
+def detect_encoding(head: bytes) -> str:
+    for candidate in CSV_ENCODINGS:
+        try:
+            head.decode(candidate)
+        except UnicodeDecodeError as e:
+            # Um caráter multibyte cortado no fim da amostra não conta como erro
+            if not (candidate.startswith('utf-8') and e.start >= len(head) - 3):
+                continue
+        return candidate
+    return CSV_ENCODINGS[-1]
+
+
+def _batches(records: Iterator[tuple], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Agrupa registos (date, description, amount) em DataFrames de `chunk_size` linhas."""
+    buffer, yielded = [], False
+    for record in records:
+        buffer.append(record)
+        if len(buffer) >= chunk_size:
+            yield pd.DataFrame(buffer, columns=CANONICAL_COLUMNS)
+            buffer, yielded = [], True
+    if buffer or not yielded:
+        yield pd.DataFrame(buffer, columns=CANONICAL_COLUMNS)
+
+
+class StatementParser(ABC):
+    """
+    Leitor de um formato de extrato. `sniff` reconhece o formato pela assinatura do início do
+    ficheiro (por omissão, nenhuma); `iter_chunks` lê-o em blocos (DataFrames) sem carregar o ficheiro todo.
+    """
+    name: str = ""
+    extensions: Tuple[str, ...] = ()
+
+    @staticmethod
+    def sniff(head: bytes) -> bool:
+        return False
+
+    @staticmethod
+    @abstractmethod
+    def iter_chunks(stream: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+        ...
+
+
+# Ordem importa: formatos com assinatura forte primeiro, CSV (sem assinatura) no fim
+PARSERS: List[Type[StatementParser]] = []
+
+
+def register_parser(parser: Type[StatementParser]) -> Type[StatementParser]:
+    PARSERS.append(parser)
+    return parser
+
+
+def supported_extensions() -> Tuple[str, ...]:
+    return tuple(ext for parser in PARSERS for ext in parser.extensions)
+
+
+def detect_parser(stream: BinaryIO, filename: str) -> Type[StatementParser]:
+    """Escolhe o leitor pela assinatura do ficheiro e, na falta dela, pela extensão."""
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    for parser in PARSERS:
+        if parser.sniff(head):
+            return parser
+    filename = (filename or '').lower()
+    for parser in PARSERS:
+        if filename.endswith(parser.extensions):
+            return parser
+    raise ValueError("Formato não suportado. Use CSV, Excel, OFX, QIF ou CAMT.053.")
+
+
+# --- 1. FORMATOS BINÁRIOS (Excel) ---
+@register_parser
+class XlsxParser(StatementParser):
+    name = "xlsx"
+    extensions = ('.xlsx',)
+
+    @staticmethod
+    def sniff(head: bytes) -> bool:
+        return head.startswith(b'PK\x03\x04')
+
+    @staticmethod
+    def iter_chunks(stream: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None) or ()
+            columns = [str(c) if c is not None else '' for c in header]
+            buffer, yielded = [], False
+            for row in rows:
+                if all(v is None for v in row):
+                    continue
+                buffer.append((tuple(row) + (None,) * len(columns))[:len(columns)])
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame(buffer, columns=columns)
+                    buffer, yielded = [], True
+            if buffer or not yielded:
+                yield pd.DataFrame(buffer, columns=columns)
+        finally:
+            workbook.close()
+
+
+@register_parser
+class XlsParser(StatementParser):
+    name = "xls"
+    extensions = ('.xls',)
+
+    @staticmethod
+    def sniff(head: bytes) -> bool:
+        return head.startswith(b'\xd0\xcf\x11\xe0')
+
+    @staticmethod
+    def iter_chunks(stream: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+        # Formato binário antigo: não há leitura linha a linha
+        yield pd.read_excel(stream)
+
+
+# --- 2. FORMATOS DE TEXTO ESTRUTURADOS ---
+@register_parser
+class OfxParser(StatementParser):
+    """OFX 1.x (SGML, sem tags de fecho nos campos) e OFX 2.x (XML). Lê bloco a bloco até cada </STMTTRN>."""
+    name = "ofx"
+    extensions = ('.ofx', '.qfx')
+    READ_SIZE = 64 * 1024
+    TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.I | re.S)
+    OPEN_TAG = re.compile(r'<STMTTRN>', re.I)
+    FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+    @staticmethod
+    def sniff(head: bytes) -> bool:
+        upper = head[:4096].upper()
+        return b'OFXHEADER' in upper or b'<OFX>' in upper
+
+    @staticmethod
+    def iter_chunks(stream: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+        encoding = detect_encoding(stream.read(SNIFF_BYTES))
+        stream.seek(0)
+        yield from _batches(OfxParser._records(io.TextIOWrapper(stream, encoding=encoding, errors='replace')), chunk_size)
+
+    @staticmethod
+    def _records(text: io.TextIOWrapper) -> Iterator[tuple]:
+        try:
+            buffer = ''
+            while True:
+                block = text.read(OfxParser.READ_SIZE)
+                buffer += block
+                pos = 0
+                for match in OfxParser.TRANSACTION.finditer(buffer):
+                    yield OfxParser._parse_transaction(match.group(1))
+                    pos = match.end()
+                # Só fica em memória a transação ainda incompleta (ou o fim do bloco, se a tag vier cortada)
+                pending = OfxParser.OPEN_TAG.search(buffer, pos)
+                buffer = buffer[pending.start():] if pending else buffer[-len('<STMTTRN>'):]
+                if not block:
+                    break
+        finally:
+            text.detach()
+
+    @staticmethod
+    def _parse_transaction(block: str) -> tuple:
+        fields = {tag.upper(): value.strip() for tag, value in OfxParser.FIELD.findall(block)}
+        posted = fields.get('DTPOSTED', '')
+        date = f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}" if len(posted) >= 8 else None
+        description = fields.get('NAME') or fields.get('MEMO') or None
+        if fields.get('NAME') and fields.get('MEMO') and fields['MEMO'] != fields['NAME']:
+            description = f"{fields['NAME']} {fields['MEMO']}"
+        return date, description, fields.get('TRNAMT')
+
+
+@register_parser
+class QifParser(StatementParser):
+    """QIF: um campo por linha (D data, T/U valor, P beneficiário, M memo), registos terminados por '^'."""
+    name = "qif"
+    extensions = ('.qif',)
+
+    @staticmethod
+    def sniff(head: bytes) -> bool:
+        return head.lstrip(b'\xef\xbb\xbf \r\n\t').upper().startswith(b'!TYPE:')
+
+    @staticmethod
+    def iter_chunks(stream: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+        encoding = detect_encoding(stream.read(SNIFF_BYTES))
+        stream.seek(0)
+        yield from _batches(QifParser._records(io.TextIOWrapper(stream, encoding=encoding, errors='replace')), chunk_size)
+
+    @staticmethod
+    def _records(text: io.TextIOWrapper) -> Iterator[tuple]:
+        try:
+            record = {}
+            for line in text:
+                line = line.strip()
+                if not line or line.startswith('!'):
+                    continue
+                code, value = line[0], line[1:].strip()
+                if code == '^':
+                    if record:
+                        yield QifParser._to_row(record)
+                    record = {}
+                elif code in 'DTUPM' and code not in record:
+                    record[code] = value
+            if record:
+                yield QifParser._to_row(record)
+        finally:
+            text.detach()
+
+    @staticmethod
+    def _to_row(record: dict) -> tuple:
+        # Datas do Quicken: 1/ 5'24 -> 1/5/24
+        date = record.get('D', '').replace("'", '/').replace(' ', '') or None
+        description = ' '.join(v for v in (record.get('P'), record.get('M')) if v) or None
+        return date, description, record.get('T') or record.get('U')
+
+
+@register_parser
+class Camt053Parser(StatementParser):
+    """ISO 20022 CAMT.053: `iterparse` entrada a entrada (Ntry), removendo cada uma depois de lida."""
+    name = "camt053"
+    extensions = ('.xml',)
+
+    @staticmethod
+    def sniff(head: bytes) -> bool:
+        return b'camt.053' in head[:4096]
+
+    @staticmethod
+    def iter_chunks(stream: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+        yield from _batches(Camt053Parser._records(stream), chunk_size)
+
+    @staticmethod
+    def _records(stream: BinaryIO) -> Iterator[tuple]:
+        stack = []
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                stack.append(elem)
+                continue
+            stack.pop()
+            if elem.tag.rsplit('}', 1)[-1] == 'Ntry':
+                yield Camt053Parser._parse_entry(elem)
+                # Libertar a entrada já processada: a memória fica limitada a uma entrada
+                if stack:
+                    stack[-1].remove(elem)
+
+    @staticmethod
+    def _parse_entry(entry: ET.Element) -> tuple:
+        ns = entry.tag[:entry.tag.index('}') + 1] if entry.tag.startswith('{') else ''
+
+        def text(*paths: str):
+            for path in paths:
+                found = entry.find('/'.join(ns + part for part in path.split('/')))
+                if found is not None and found.text and found.text.strip():
+                    return found.text.strip()
+            return None
+
+        booked = text('BookgDt/Dt', 'BookgDt/DtTm', 'ValDt/Dt', 'ValDt/DtTm')
+        amount = text('Amt')
+        if amount is not None:
+            try:
+                amount = float(amount)
+            except ValueError:
+                # Fica o texto original: a normalização reporta a linha como "Valor inválido"
+                pass
+            else:
+                if text('CdtDbtInd') == 'DBIT':
+                    amount = -amount
+
+        remittance = [e.text.strip() for e in entry.iter(f'{ns}Ustrd') if e.text and e.text.strip()]
+        counterparty = next((e.text.strip() for e in entry.iter(f'{ns}Nm') if e.text and e.text.strip()), None)
+        description = ' '.join(remittance) or text('AddtlNtryInf') or counterparty
+        return booked[:10] if booked else None, description, amount
+
+
+@register_parser
+class CsvParser(StatementParser):
+    """Sem assinatura: apanha os ficheiros .csv que nenhum outro leitor reconheceu."""
+    name = "csv"
+    extensions = ('.csv', '.txt')
+
+    @staticmethod
+    def sniff_dialect(stream: BinaryIO) -> Tuple[str, str]:
+        """Deteta (encoding, separador) a partir do início do ficheiro, sem o ler todo."""
+        head = stream.read(SNIFF_BYTES)
+        stream.seek(0)
+        encoding = detect_encoding(head)
+
+        lines = [line for line in head.decode(encoding, errors='ignore').splitlines() if line.strip()]
+        header_line = lines[0] if lines else ''
+        # O cabeçalho não tem vírgulas decimais, por isso o separador é o caráter mais frequente nele
+        sep = max(CSV_DELIMITERS, key=header_line.count)
+        return encoding, sep if header_line.count(sep) else ','
+
+    @staticmethod
+    def iter_chunks(stream: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+        encoding, sep = CsvParser.sniff_dialect(stream)
+        yield from pd.read_csv(stream, sep=sep, encoding=encoding, chunksize=chunk_size)
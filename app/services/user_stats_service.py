@@ -0,0 +1,112 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.models import Account, Transaction, User
+from app.models.types import from_minor_units, minor_units
+
+# Ordenações possíveis: colunas do utilizador e agregados
+USER_SORTS = ("id", "created_at", "email")
+STAT_SORTS = ("accounts", "transactions", "last_activity", "balance")
+# Agregados inteiros (o saldo em cêntimos): SUM de BIGINT chega como Decimal no Postgres
+INTEGER_SORTS = ("accounts", "transactions", "balance")
+# Utilizadores sem transações ordenam como tendo a atividade mais antiga possível
+NO_ACTIVITY = date(1, 1, 1)
+
+
+def encode_cursor(value, user_id: int) -> str:
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = int(value)
+    return base64.urlsafe_b64encode(json.dumps([value, user_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort_by: str):
+    try:
+        value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort_by == "created_at":
+            value = datetime.fromisoformat(value)
+        elif sort_by == "last_activity":
+            value = date.fromisoformat(value)
+        elif sort_by in INTEGER_SORTS:
+            value = int(value)
+        return value, int(user_id)
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido.")
+
+
+class UserStatsService:
+    """
+    Listagem de utilizadores para administração, com nº de contas, nº de transações, última
+    atividade e saldo total calculados numa única query agrupada (sem N+1).
+    Paginação por keyset: o cursor guarda (valor da ordenação, id) da última linha devolvida,
+    e a página seguinte começa em `(valor, id) > cursor`, estável mesmo com inserções entretanto.
+    """
+
+    @staticmethod
+    def list_users(db: Session, sort_by: str = "id", descending: bool = False, limit: int = 50,
+                   cursor: Optional[str] = None) -> dict:
+        if sort_by not in USER_SORTS + STAT_SORTS:
+            raise ValueError("Ordenação inválida.")
+
+        user_filter, page_ids = [], None
+        if sort_by in USER_SORTS:
+            # Ordenação por coluna do utilizador: a página sai do índice e só os seus utilizadores são agregados
+            key = getattr(User, sort_by)
+            page = select(User.id).order_by(*UserStatsService._order(key, descending)).limit(limit)
+            if cursor:
+                page = page.where(UserStatsService._after(key, decode_cursor(cursor, sort_by), descending))
+            page_ids = page.scalar_subquery()
+            user_filter = [Account.user_id.in_(page_ids)]
+
+        accounts = select(
+            Account.user_id, func.count(Account.id).label("accounts"),
+            func.sum(minor_units(Account.current_balance)).label("balance"),
+        ).where(*user_filter).group_by(Account.user_id).subquery()
+        transactions = select(
+            Account.user_id, func.count(Transaction.id).label("transactions"), func.max(Transaction.date).label("last_activity"),
+        ).join(Transaction, Transaction.account_id == Account.id).where(*user_filter).group_by(Account.user_id).subquery()
+
+        stats = {
+            "accounts": func.coalesce(accounts.c.accounts, 0),
+            "transactions": func.coalesce(transactions.c.transactions, 0),
+            "last_activity": func.coalesce(transactions.c.last_activity, NO_ACTIVITY),
+            "balance": func.coalesce(accounts.c.balance, 0),
+        }
+        key = stats[sort_by] if sort_by in STAT_SORTS else getattr(User, sort_by)
+
+        query = select(
+            User.id, User.email, User.role, User.created_at, stats["accounts"], stats["transactions"],
+            transactions.c.last_activity, stats["balance"], key,
+        ).outerjoin(accounts, accounts.c.user_id == User.id).outerjoin(transactions, transactions.c.user_id == User.id)
+        if page_ids is not None:
+            query = query.where(User.id.in_(page_ids))
+        elif cursor:
+            query = query.where(UserStatsService._after(key, decode_cursor(cursor, sort_by), descending))
+        rows = db.execute(query.order_by(*UserStatsService._order(key, descending)).limit(limit)).all()
+
+        items = [
+            {
+                "id": user_id, "email": email, "role": role, "created_at": created_at,
+                "account_count": account_count, "transaction_count": transaction_count,
+                "last_activity": last_activity, "total_balance": from_minor_units(int(balance)),
+            }
+            for user_id, email, role, created_at, account_count, transaction_count, last_activity, balance, _ in rows
+        ]
+        next_cursor = encode_cursor(rows[-1][-1], rows[-1][0]) if len(rows) == limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _order(key, descending: bool) -> list:
+        return [key.desc(), User.id.desc()] if descending else [key.asc(), User.id.asc()]
+
+    @staticmethod
+    def _after(key, position, descending: bool):
+        value, user_id = position
+        return tuple_(key, User.id) < tuple_(value, user_id) if descending else tuple_(key, User.id) > tuple_(value, user_id)
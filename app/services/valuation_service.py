@@ -0,0 +1,178 @@
+from datetime import date
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import Account, Asset, AssetPrice, Transaction, TransactionType
+from app.services.fx_service import FxRateMissing, FxService
+from app.services.lookup_registry import lookup_registry
+
+# Granularidades suportadas -> período pandas usado para escolher o último dia de cada período
+FREQ_PERIODS = {"D": "D", "W": "W", "M": "M"}
+# Posições abaixo disto são resíduo de vírgula flutuante de vendas totais: contam como fechadas
+POSITION_EPSILON = 1e-9
+
+
+class ValuationService:
+    @staticmethod
+    def replay_positions(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Reproduz o ledger de investimentos por (conta, ativo) com custo médio ponderado.
+        Recebe colunas account_id, asset_id, quantity, amount, is_buy e, opcionalmente, price_per_unit
+        (ordenadas por data) e acrescenta `position` e `cost` (estado da posição depois de cada transação).
+        Vetorizado por grupo (cumsum/cummin/cumprod), sem ciclo por transação.
+        """
+        if df.empty:
+            return df.assign(position=pd.Series(dtype=float), cost=pd.Series(dtype=float))
+
+        keys = [df["account_id"], df["asset_id"]]
+        qty = df["quantity"].astype(float)
+        is_buy = df["is_buy"].astype(bool)
+        # Preço unitário como em ledger.unit_price: o indicado na transação ou |valor| / quantidade
+        unit_cost = (df["amount"].astype(float).abs() / qty).where(qty > 0, 0.0)
+        if "price_per_unit" in df:
+            given = df["price_per_unit"].astype(float)
+            unit_cost = given.where(given > 0, unit_cost)
+
+        # 1. Quantidade: soma acumulada refletida em zero (vender mais do que se tem deixa a posição a 0),
+        #    q_i = S_i - min(0, min S_k até i)
+        running = qty.where(is_buy, -qty).groupby(keys, sort=False).cumsum()
+        position = running - running.groupby(keys, sort=False).cummin().clip(upper=0.0)
+        position = position.mask(position <= POSITION_EPSILON, 0.0)
+
+        # 2. Custo: c_i = c_(i-1) * f_i + compra_i, com f_i = q_i / q_(i-1) nas vendas (o preço médio mantém-se).
+        #    Entre fechos de posição, c_i = P_i * soma(compra_k / P_k), com P o produto acumulado de f.
+        previous = position.groupby(keys, sort=False).shift(fill_value=0.0)
+        closed = position == 0.0
+        ratio = (position / previous).where(~is_buy & ~closed & (previous > 0), 1.0)
+        segment = closed.groupby(keys, sort=False).shift(fill_value=False).astype(int).groupby(keys, sort=False).cumsum()
+        segment_keys = keys + [segment]
+        growth = ratio.groupby(segment_keys, sort=False).cumprod()
+        bought = (qty * unit_cost).where(is_buy, 0.0)
+        cost = (growth * (bought / growth).groupby(segment_keys, sort=False).cumsum()).mask(closed, 0.0)
+
+        return df.assign(position=position.to_numpy(), cost=cost.to_numpy())
+
+    @staticmethod
+    def portfolio_history(db: Session, user_id: int, start: date, end: date, freq: str = "D",
+                          currency: str = settings.DEFAULT_CURRENCY) -> List[dict]:
+        """
+        Série de valor de mercado, custo e P/L não realizado da carteira entre `start` e `end`,
+        convertida para `currency` à taxa de cada dia. Posições numa moeda sem taxas não falham
+        o pedido: ficam fora dos totais (ou ao custo, se só o preço não converte) e vêm em `unconverted`.
+        """
+        rows = db.query(
+            Transaction.date, Transaction.account_id, Transaction.asset_id,
+            Transaction.quantity, Transaction.amount, Transaction.price_per_unit, TransactionType.id,
+            Account.currency, Asset.currency, Asset.symbol
+        ).join(Account, Transaction.account_id == Account.id).join(
+            TransactionType, Transaction.transaction_type_id == TransactionType.id
+        ).join(Asset, Transaction.asset_id == Asset.id).filter(
+            Account.user_id == user_id,
+            Transaction.asset_id.isnot(None),
+            Transaction.quantity.isnot(None),
+            Transaction.quantity > 0,
+            Transaction.date <= end
+        ).order_by(Transaction.date.asc(), Transaction.id.asc()).all()
+
+        days = pd.date_range(start, end, freq="D")
+        if not rows:
+            frame = pd.DataFrame({"market_value": 0.0, "cost_basis": 0.0, "unconverted": [[] for _ in days]}, index=days)
+            return ValuationService._format(frame, freq)
+
+        ledger = pd.DataFrame(rows, columns=[
+            "date", "account_id", "asset_id", "quantity", "amount", "price_per_unit", "type_id", "account_currency", "asset_currency", "symbol"
+        ])
+        ledger["date"] = pd.to_datetime(ledger["date"])
+        types = lookup_registry.transaction_types_by_id(db, ledger["type_id"].unique())
+        ledger["is_buy"] = ledger["type_id"].map({i: t.is_buy for i, t in types.items()}).astype(bool)
+        ledger = ValuationService.replay_positions(ledger)
+
+        # 1. Estado diário das posições: último estado do dia por (conta, ativo), forward-fill até ao fim
+        ledger["key"] = list(zip(ledger["account_id"], ledger["asset_id"]))
+        last_of_day = ledger.groupby(["date", "key"], sort=False).tail(1)
+        full_index = days.union(pd.DatetimeIndex(last_of_day["date"].unique()))
+        quantities = last_of_day.pivot(index="date", columns="key", values="position").reindex(full_index).ffill().fillna(0.0)
+        costs = last_of_day.pivot(index="date", columns="key", values="cost").reindex(full_index).ffill().fillna(0.0)
+        quantities, costs = quantities.loc[days], costs.loc[days]
+
+        # 2. Preços: as-of join (último preço conhecido em cada dia) numa única query
+        asset_ids = ledger["asset_id"].unique().tolist()
+        price_rows = db.query(AssetPrice.date, AssetPrice.asset_id, AssetPrice.close_price).filter(
+            AssetPrice.asset_id.in_(asset_ids),
+            AssetPrice.date <= end
+        ).all()
+        key_assets = [asset_id for _, asset_id in quantities.columns]
+        if price_rows:
+            prices = pd.DataFrame(price_rows, columns=["date", "asset_id", "close_price"])
+            prices["date"] = pd.to_datetime(prices["date"])
+            wide = prices.pivot_table(index="date", columns="asset_id", values="close_price", aggfunc="last")
+            wide = wide.reindex(wide.index.union(days)).ffill().loc[days]
+            price_matrix = wide.reindex(columns=key_assets).to_numpy(dtype=float)
+        else:
+            price_matrix = np.full(quantities.shape, np.nan)
+
+        # 3. Câmbio: o custo está na moeda da conta, o preço na moeda do ativo (taxa de cada dia,
+        #    pedida só nos dias com posição; NaN onde a moeda não tem taxas)
+        qty_matrix = quantities.to_numpy(dtype=float)
+        held = qty_matrix > 0
+        columns = ledger.drop_duplicates("key").set_index("key").loc[list(quantities.columns)]
+        price_fx = ValuationService._fx_matrix(db, columns["asset_currency"].to_numpy(), held, days, currency)
+        cost_fx = ValuationService._fx_matrix(db, columns["account_currency"].to_numpy(), held, days, currency)
+        price_matrix = price_matrix * price_fx
+        cost_matrix = costs.to_numpy(dtype=float) * cost_fx
+
+        # 4. Valorização vetorizada: sem preço conhecido (ou sem taxa para ele) usa-se o custo (P/L = 0),
+        #    como em /portfolio; sem taxa para o custo, a posição fica fora dos totais
+        excluded = np.isnan(cost_matrix)
+        cost_matrix = np.where(excluded, 0.0, cost_matrix)
+        value_matrix = np.where(np.isnan(price_matrix), cost_matrix, qty_matrix * price_matrix)
+        flagged = held & (np.isnan(price_fx) | np.isnan(cost_fx))
+        symbols = columns["symbol"].to_numpy(dtype=object)
+
+        frame = pd.DataFrame({
+            "market_value": value_matrix.sum(axis=1),
+            "cost_basis": cost_matrix.sum(axis=1),
+            "unconverted": [sorted(set(symbols[row])) for row in flagged],
+        }, index=days)
+        return ValuationService._format(frame, freq)
+
+    @staticmethod
+    def _fx_matrix(db: Session, col_ccy: np.ndarray, held: np.ndarray, days: pd.DatetimeIndex, target: str) -> np.ndarray:
+        """
+        Matriz (dias x colunas) de taxas para `target`; uma junção as-of por moeda, só nos dias em que
+        alguma coluna dessa moeda tem posição (nos outros a taxa é irrelevante e fica 1). NaN se a moeda não tem taxas.
+        """
+        matrix = np.ones(held.shape)
+        for ccy in set(col_ccy.tolist()):
+            if ccy == target:
+                continue
+            cols = col_ccy == ccy
+            needed = held[:, cols].any(axis=1)
+            if not needed.any():
+                continue
+            try:
+                rates = FxService.rates_asof(db, ccy, target, days.values[needed])
+            except FxRateMissing:
+                rates = np.nan
+            matrix[np.ix_(needed, cols)] = np.broadcast_to(np.reshape(rates, (-1, 1)), (int(needed.sum()), int(cols.sum())))
+        return matrix
+
+    @staticmethod
+    def _format(frame: pd.DataFrame, freq: str) -> List[dict]:
+        # Último dia disponível de cada período (o fim do intervalo não é ultrapassado)
+        frame = frame.groupby(frame.index.to_period(FREQ_PERIODS[freq])).tail(1)
+        frame = frame.assign(unrealized_pl=frame["market_value"] - frame["cost_basis"]).round(2)
+        return [
+            {
+                "date": idx.strftime("%Y-%m-%d"),
+                "market_value": row.market_value,
+                "cost_basis": row.cost_basis,
+                "unrealized_pl": row.unrealized_pl,
+                "unconverted": row.unconverted,
+            }
+            for idx, row in zip(frame.index, frame.itertuples(index=False))
+        ]
@@ -1,13 +1,27 @@
+import os
+from contextlib import contextmanager
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
+# Modo estrito de carregamento (antes de importar os modelos): um N+1 novo faz falhar o teste
+os.environ.setdefault("STRICT_RELATIONSHIP_LOADING", "true")
+
 # --- IMPORTS CORRIGIDOS ---
 from app.main import app
-from app.database.database import Base, get_db
-from app.models import AccountType, TransactionType
+from app.core.config import settings
+from app.database.database import Base, get_db, get_session_factory
+from app.models import AccountType, TransactionType, User
+from app.services.price_cache import price_cache
+from app.services.fx_service import fx_cache
+from app.services.import_jobs import import_runner, preview_cache
+from app.services.rules_service import rule_cache
+from app.services.lookup_registry import lookup_registry
+from app.services.asset_index import asset_index
+from app.services.category_cache import category_cache
 
 # 1. Configurar DB SQLite em Memória (Rápida e isolada)
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -19,6 +33,12 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# As importações correm no próprio pedido (sem threads) para os testes serem deterministas
+import_runner.workers = 0
+# O arranque da app não toca na BD real: o registo de lookups carrega da BD de teste no primeiro acesso
+settings.LOOKUPS_PRELOAD = False
+settings.IMPORT_RECOVER_ON_STARTUP = False
+
 @pytest.fixture(scope="function")
 def db_session():
     # Cria as tabelas antes do teste
@@ -43,6 +63,7 @@ def client(db_session):
             pass 
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
     with TestClient(app) as c:
         yield c
 
@@ -55,6 +76,27 @@ def auth_headers(client):
     token = response.json()["access_token"]
     return {"Authorization": f"Bearer {token}"}
 
+@pytest.fixture(scope="function", autouse=True)
+def reset_caches():
+    # As caches são globais ao processo, mas cada teste tem uma BD nova
+    price_cache.clear()
+    fx_cache.invalidate()
+    rule_cache.invalidate()
+    preview_cache.clear()
+    lookup_registry.invalidate()
+    asset_index.invalidate()
+    category_cache.invalidate()
+    yield
+
+@pytest.fixture
+def admin_headers(client, db_session):
+    client.post("/users/", json={"email": "admin@example.com", "password": "pass"})
+    admin = db_session.query(User).filter(User.email == "admin@example.com").first()
+    admin.role = "admin"
+    db_session.commit()
+    response = client.post("/token", data={"username": "admin@example.com", "password": "pass"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
 @pytest.fixture(scope="function", autouse=True)
 def seed_db(db_session):
     # Garante que existem tipos de conta e transação antes de testar
@@ -71,4 +113,22 @@ def seed_db(db_session):
         db_session.add(AccountType(id=3, name="Poupança"))
         db_session.add(AccountType(id=4, name="Crypto"))
 
-        db_session.commit()
\ No newline at end of file
+        db_session.commit()
+
+@pytest.fixture
+def query_budget():
+    """
+    `with query_budget(n): client.get(...)` falha se o bloco emitir mais de `n` queries.
+    O orçamento de cada endpoint não pode depender do nº de linhas devolvidas.
+    """
+    @contextmanager
+    def budget(max_queries: int):
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert len(statements) <= max_queries, f"{len(statements)} queries (orçamento {max_queries}):\n" + "\n".join(statements)
+    return budget
@@ -0,0 +1,78 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from app.models import Account, Transaction, User
+from app.services.user_stats_service import decode_cursor, encode_cursor
+
+
+def test_admin_user_listing_with_stats_and_keyset_pages(client, admin_headers, db_session):
+    admin_id = db_session.query(User.id).filter(User.email == "admin@example.com").scalar()
+    for i in range(5):
+        user = User(email=f"u{i}@example.com", password_hash="x")
+        db_session.add(user)
+        db_session.flush()
+        for a in range(i % 3):
+            account = Account(user_id=user.id, name=f"C{a}", account_type_id=1, current_balance=10.5 * (i + 1))
+            db_session.add(account)
+            db_session.flush()
+            db_session.add_all([
+                Transaction(account_id=account.id, transaction_type_id=1, amount=-1.0, description="x", date=date(2024, i + 1, d + 1))
+                for d in range(i)
+            ])
+    db_session.commit()
+
+    # Uma só query por página, seja qual for o nº de utilizadores
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    page = client.get("/admin/users?sort_by=transactions&order=desc&limit=2", headers=admin_headers).json()
+    event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    assert len([s for s in statements if "GROUP BY" in s]) == 1
+
+    seen = page["items"]
+    while page["next_cursor"]:
+        page = client.get(f"/admin/users?sort_by=transactions&order=desc&limit=2&cursor={page['next_cursor']}", headers=admin_headers).json()
+        seen += page["items"]
+    assert [u["transaction_count"] for u in seen] == [4, 4, 1, 0, 0, 0]
+    top = seen[0]
+    # Empate em transações: desempata pelo id (descendente)
+    assert [u["email"] for u in seen[:2]] == ["u4@example.com", "u2@example.com"]
+    assert top["account_count"] == 1 and top["total_balance"] == 52.5 and top["last_activity"] == "2024-05-04"
+    assert seen[1]["account_count"] == 2 and seen[1]["total_balance"] == 63.0
+
+    by_id = client.get("/admin/users?limit=3", headers=admin_headers).json()
+    rest = client.get(f"/admin/users?limit=3&cursor={by_id['next_cursor']}", headers=admin_headers).json()
+    ids = [u["id"] for u in by_id["items"] + rest["items"]]
+    assert ids == sorted(ids) and admin_id in ids and len(ids) == 6
+    assert [u for u in by_id["items"] + rest["items"] if u["id"] == admin_id][0]["last_activity"] is None
+
+    # Todas as ordenações percorrem os 6 utilizadores sem repetir nem saltar nenhum
+    for sort_by in ("created_at", "email", "accounts", "last_activity", "balance"):
+        for order in ("asc", "desc"):
+            page, ids = {"next_cursor": ""}, []
+            while page["next_cursor"] is not None:
+                page = client.get(f"/admin/users?sort_by={sort_by}&order={order}&limit=4&cursor={page['next_cursor']}", headers=admin_headers).json()
+                ids += [u["id"] for u in page["items"]]
+            assert sorted(ids) == sorted(set(ids)) and len(ids) == 6, (sort_by, order)
+
+    assert client.get("/admin/users?cursor=lixo", headers=admin_headers).status_code == 400
+
+
+def test_admin_users_page_through_balance(client, admin_headers, db_session):
+    for i, balance in enumerate((30.0, -12.5, 30.0, 7.25)):
+        user = User(email=f"s{i}@example.com", password_hash="x")
+        db_session.add(user)
+        db_session.flush()
+        db_session.add(Account(user_id=user.id, name="Conta", account_type_id=1, current_balance=balance))
+    db_session.commit()
+
+    page, balances = {"next_cursor": ""}, []
+    while page["next_cursor"] is not None:
+        page = client.get(f"/admin/users?sort_by=balance&order=desc&limit=2&cursor={page['next_cursor']}", headers=admin_headers).json()
+        balances += [u["total_balance"] for u in page["items"]]
+    assert balances == [30.0, 30.0, 7.25, 0.0, -12.5]
+
+    # No Postgres a soma de cêntimos chega como Decimal: o cursor guarda-a como inteiro
+    assert decode_cursor(encode_cursor(Decimal("-1250"), 7), "balance") == (-1250, 7)
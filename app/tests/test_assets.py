@@ -0,0 +1,55 @@
+from io import BytesIO
+
+from app.models import Asset
+from app.services.asset_index import AssetSearchIndex
+
+
+def test_asset_catalogue_is_paginated(client, db_session):
+    db_session.add_all([Asset(symbol=f"S{i:03d}", name=f"Ativo {i}", asset_type="ETF" if i % 5 == 0 else "Stock") for i in range(120)])
+    db_session.commit()
+
+    page = client.get("/assets/?page=3&size=50").json()
+    assert page["total"] == 120 and page["pages"] == 3
+    assert [a["symbol"] for a in page["items"]] == [f"S{i:03d}" for i in range(100, 120)]
+    assert client.get("/assets/?asset_type=ETF&size=10").json()["total"] == 24
+
+
+def test_asset_search_ranks_symbols_and_sees_new_assets(client, auth_headers, admin_headers, db_session):
+    db_session.add_all([
+        Asset(symbol="AAPL", name="Apple Inc.", asset_type="Stock"),
+        Asset(symbol="AAP", name="Advance Auto Parts", asset_type="Stock"),
+        Asset(symbol="MSFT", name="Microsoft Corporation", asset_type="Stock"),
+        Asset(symbol="EDP.LS", name="Energias de Portugal", asset_type="Stock"),
+    ])
+    db_session.commit()
+
+    # Símbolo exato primeiro, depois prefixos de símbolo, depois palavras do nome (sem acentos/maiúsculas)
+    assert [a["symbol"] for a in client.get("/assets/search?q=aap").json()] == ["AAP", "AAPL"]
+    assert [a["symbol"] for a in client.get("/assets/search?q=corp").json()] == ["MSFT"]
+    assert [a["symbol"] for a in client.get("/assets/search?q=portúg").json()] == ["EDP.LS"]
+    assert len(client.get("/assets/search?q=a&limit=1").json()) == 1
+    assert client.get("/assets/search?q=").status_code == 422
+
+    # Ativos criados depois do carregamento entram no índice sem o reconstruir
+    acc_id = client.post("/accounts/", json={"name": "Corretora", "account_type_id": 2, "current_balance": 1000.0}, headers=auth_headers).json()["id"]
+    client.post("/transactions/", json={
+        "account_id": acc_id, "date": "2024-01-10", "description": "Compra", "amount": 100.0,
+        "transaction_type_id": 3, "symbol": "aapx", "quantity": 1
+    }, headers=auth_headers)
+    client.post("/portfolio/prices/bulk", files={"file": ("p.csv", BytesIO(b"symbol,date,close\nAAPZ,2024-01-02,10\n"), "text/csv")}, headers=admin_headers)
+    assert [a["symbol"] for a in client.get("/assets/search?q=AAP").json()] == ["AAP", "AAPL", "AAPX", "AAPZ"]
+
+
+def test_asset_search_survives_invalidate_during_load(db_session):
+    db_session.add(Asset(symbol="VWCE", name="Vanguard FTSE All-World", asset_type="ETF", currency="EUR"))
+    db_session.commit()
+    index = AssetSearchIndex()
+    load = index.load
+
+    def load_then_invalidate(db):
+        state = load(db)
+        index.invalidate()  # outro pedido invalida o índice entre o carregamento e a leitura
+        return state
+
+    index.load = load_then_invalidate
+    assert [row["symbol"] for row in index.search(db_session, "vw")] == ["VWCE"]
@@ -1,4 +1,7 @@
-from app.models import Category, SubCategory
+from sqlalchemy import event
+
+from app.models import Category, CategoryRule, SubCategory, Transaction
+from app.services.category_cache import CategoryTreeCache
 
 
 def test_create_and_delete_subcategory(client, auth_headers, db_session):
@@ -49,4 +52,85 @@ def test_cannot_delete_category_with_transactions(client, auth_headers, db_sessi
     
     # 3. Deve falhar (Bad Request)
     assert del_res.status_code == 400
-    assert "transações associadas" in del_res.json()["detail"]
\ No newline at end of file
+    assert "transações associadas" in del_res.json()["detail"]
+
+
+def test_category_tree_is_cached_and_invalidated(client, auth_headers, db_session):
+    db_session.add(Category(name="Global", user_id=None))
+    db_session.commit()
+    cat_id = client.post("/categories/", json={"name": "Casa"}, headers=auth_headers).json()["id"]
+    assert [c["name"] for c in client.get("/categories/", headers=auth_headers).json()] == ["Global", "Casa"]
+
+    # Segunda leitura sai da cache: nenhuma query a categorias
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    client.get("/categories/", headers=auth_headers)
+    event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    assert not [s for s in statements if "FROM categories" in s]
+
+    sub_id = client.post("/categories/subcategories", json={"name": "Renda", "category_id": cat_id}, headers=auth_headers).json()["id"]
+    tree = {c["name"]: c for c in client.get("/categories/", headers=auth_headers).json()}
+    assert [s["name"] for s in tree["Casa"]["subcategories"]] == ["Renda"]
+
+    # As listagens de transações usam a mesma árvore
+    acc_id = client.post("/accounts/", json={"name": "Conta", "account_type_id": 1, "current_balance": 0}, headers=auth_headers).json()["id"]
+    client.post("/transactions/", json={
+        "account_id": acc_id, "date": "2024-01-10", "description": "Renda", "amount": 500.0,
+        "transaction_type_id": 1, "category_id": cat_id, "sub_category_id": sub_id
+    }, headers=auth_headers)
+    item = client.get("/transactions/", headers=auth_headers).json()["items"][0]
+    assert item["category"] == tree["Casa"]
+
+    other_id = client.post("/categories/subcategories", json={"name": "Água", "category_id": cat_id}, headers=auth_headers).json()["id"]
+    assert len(client.get("/categories/", headers=auth_headers).json()[1]["subcategories"]) == 2
+    client.delete(f"/categories/subcategories/{other_id}", headers=auth_headers)
+    assert [s["id"] for s in client.get("/categories/", headers=auth_headers).json()[1]["subcategories"]] == [sub_id]
+
+
+def test_merge_and_reassign_move_transactions_in_bulk(client, auth_headers, db_session):
+    cats = {name: client.post("/categories/", json={"name": name}, headers=auth_headers).json()["id"] for name in ("Super", "Mercearia")}
+    subs = {
+        (cat, name): client.post("/categories/subcategories", json={"name": name, "category_id": cats[cat]}, headers=auth_headers).json()["id"]
+        for cat, name in (("Super", "Fruta"), ("Super", "Limpeza"), ("Mercearia", "fruta"))
+    }
+    rule_id = client.post("/categories/rules", json={"category_id": cats["Super"], "subcategory_id": subs["Super", "Fruta"], "pattern": "frutaria"}, headers=auth_headers).json()["id"]
+    acc_id = client.post("/accounts/", json={"name": "Conta", "account_type_id": 1, "current_balance": 0}, headers=auth_headers).json()["id"]
+    for sub in (("Super", "Fruta"), ("Super", "Limpeza"), ("Super", None)):
+        client.post("/transactions/", json={
+            "account_id": acc_id, "date": "2024-01-10", "description": "x", "amount": 1.0, "transaction_type_id": 1,
+            "category_id": cats[sub[0]], "sub_category_id": subs.get(sub)
+        }, headers=auth_headers)
+
+    # "Fruta" funde-se com "fruta" do destino, "Limpeza" muda de categoria
+    res = client.post(f"/categories/{cats['Super']}/merge", json={"target_category_id": cats["Mercearia"]}, headers=auth_headers)
+    assert res.status_code == 200, res.text
+    assert res.json() == {"transactions": 3, "rules": 1, "subcategories_moved": 1, "subcategories_merged": 1}
+    db_session.expire_all()
+    rows = {(t.category_id, t.subcategory_id) for t in db_session.query(Transaction)}
+    assert rows == {(cats["Mercearia"], subs["Mercearia", "fruta"]), (cats["Mercearia"], subs["Super", "Limpeza"]), (cats["Mercearia"], None)}
+    assert db_session.get(CategoryRule, rule_id).subcategory_id == subs["Mercearia", "fruta"]
+    tree = client.get("/categories/", headers=auth_headers).json()
+    assert [(c["name"], sorted(s["name"] for s in c["subcategories"])) for c in tree] == [("Mercearia", ["Limpeza", "fruta"])]
+
+    # Subcategoria com transações: reatribuir e apagar de uma vez
+    res = client.post(f"/categories/subcategories/{subs['Super', 'Limpeza']}/reassign", json={"target_category_id": cats["Mercearia"]}, headers=auth_headers)
+    assert res.json() == {"transactions": 1, "rules": 0}
+    db_session.expire_all()
+    assert db_session.get(SubCategory, subs["Super", "Limpeza"]) is None
+    assert db_session.query(Transaction).filter(Transaction.subcategory_id.is_(None)).count() == 2
+
+    assert client.post(f"/categories/{cats['Mercearia']}/merge", json={"target_category_id": cats["Mercearia"]}, headers=auth_headers).status_code == 400
+    assert client.post("/categories/999/merge", json={"target_category_id": cats["Mercearia"]}, headers=auth_headers).status_code == 404
+
+
+def test_category_cache_evicts_least_recently_used(db_session, monkeypatch):
+    cache = CategoryTreeCache(max_users=2)
+    builds = []
+    build = CategoryTreeCache._build
+    monkeypatch.setattr(CategoryTreeCache, "_build", staticmethod(lambda db, user_id: builds.append(user_id) or build(db, user_id)))
+
+    for user_id in (1, 2, 1, 3, 1, 2):
+        cache.get(db_session, user_id)
+    # O 2 foi o menos usado quando o 3 entrou; o 1 manteve-se sempre em cache
+    assert builds == [1, 2, 3, 2]
@@ -0,0 +1,81 @@
+from io import BytesIO
+from sqlalchemy.orm import joinedload
+from app.models import Transaction
+from app.services.rules_service import AhoCorasick
+
+def make_category(client, headers, name):
+    return client.post("/categories/", json={"name": name}, headers=headers).json()["id"]
+
+def test_import_applies_rules_by_priority(client, auth_headers, db_session):
+    account_id = client.post("/accounts/", json={"name": "Banco", "account_type_id": 1}, headers=auth_headers).json()["id"]
+    food = make_category(client, auth_headers, "Supermercado")
+    transport = make_category(client, auth_headers, "Transportes")
+    salary = make_category(client, auth_headers, "Salário")
+    big = make_category(client, auth_headers, "Grandes Compras")
+
+    client.post("/categories/rules", json={"category_id": food, "pattern": "Continente"}, headers=auth_headers)
+    client.post("/categories/rules", json={"category_id": food, "pattern": "pingo doce"}, headers=auth_headers)
+    client.post("/categories/rules", json={"category_id": transport, "pattern": r"^uber\b", "match_type": "regex"}, headers=auth_headers)
+    client.post("/categories/rules", json={"category_id": salary, "min_amount": 1000, "priority": 50}, headers=auth_headers)
+    client.post("/categories/rules", json={"category_id": big, "pattern": "continente", "min_amount": 200, "priority": 10}, headers=auth_headers)
+    assert client.post("/categories/rules", json={"category_id": food, "pattern": "(", "match_type": "regex"}, headers=auth_headers).status_code == 400
+
+    csv_content = (
+        "Data,Descrição,Valor\n"
+        "01-04-2024,Compra CONTINENTE Lisboa,-35.00\n"
+        "02-04-2024,PINGO  DOCE Porto,-12.00\n"
+        "03-04-2024,Uber trip,-8.50\n"
+        "04-04-2024,Continente Online,-250.00\n"
+        "05-04-2024,Ordenado,1800.00\n"
+        "06-04-2024,Café,-1.20\n"
+    )
+    files = {'file': ('extrato.csv', BytesIO(csv_content.encode('utf-8')), 'text/csv')}
+    assert client.post(f"/imports/upload?account_id={account_id}", files=files, headers=auth_headers).json()["added"] == 6
+
+    by_desc = {tx.description: tx.category.name for tx in db_session.query(Transaction).options(joinedload(Transaction.category)).filter(Transaction.account_id == account_id)}
+    assert by_desc == {
+        "Compra CONTINENTE Lisboa": "Supermercado",
+        "PINGO  DOCE Porto": "Supermercado",
+        "Uber trip": "Transportes",
+        "Continente Online": "Grandes Compras",
+        "Ordenado": "Salário",
+        "Café": "Importações",
+    }
+
+def test_apply_rules_to_existing_transactions(client, auth_headers, db_session):
+    account_id = client.post("/accounts/", json={"name": "Banco", "account_type_id": 1}, headers=auth_headers).json()["id"]
+    files = {'file': ('extrato.csv', BytesIO(b"Data,Descricao,Valor\n01-05-2024,Farmacia Central,-9.90\n02-05-2024,Farmacia Sol,-4.10\n03-05-2024,Padaria,-2.00\n"), 'text/csv')}
+    client.post(f"/imports/upload?account_id={account_id}", files=files, headers=auth_headers)
+    health = make_category(client, auth_headers, "Saúde")
+    other = make_category(client, auth_headers, "Outros")
+
+    client.post("/categories/rules", json={"category_id": health, "pattern": "farmacia"}, headers=auth_headers)
+    res = client.post("/categories/rules/apply", headers=auth_headers).json()
+    assert res == {"rules": 1, "updated": 2}
+
+    # Sem overwrite, transações já categorizadas não são tocadas; com overwrite, a regra mais prioritária ganha
+    client.post("/categories/rules", json={"category_id": other, "pattern": "a", "priority": 500}, headers=auth_headers)
+    assert client.post("/categories/rules/apply", headers=auth_headers).json()["updated"] == 1
+    client.post("/categories/rules/apply?overwrite=true", headers=auth_headers)
+
+    db_session.expire_all()
+    cats = sorted((tx.description, tx.category_id) for tx in db_session.query(Transaction).filter(Transaction.account_id == account_id))
+    assert cats == [("Farmacia Central", health), ("Farmacia Sol", health), ("Padaria", other)]
+
+def test_aho_corasick_overlapping_keywords():
+    automaton = AhoCorasick({"he": [0], "she": [1], "hers": [2], "his": [3]})
+    assert automaton.search("ushers") == {0, 1, 2}
+    assert automaton.search("this") == {3}
+
+def test_apply_rules_matches_like_import(client, auth_headers):
+    account_id = client.post("/accounts/", json={"name": "Banco", "account_type_id": 1}, headers=auth_headers).json()["id"]
+    files = {'file': ('extrato.csv', BytesIO(b"Data,Descricao,Valor\n01-05-2024,Farmacia   Central,-9.90\n02-05-2024,Padaria,-2.00\n"), 'text/csv')}
+    client.post(f"/imports/upload?account_id={account_id}", files=files, headers=auth_headers)
+    health = make_category(client, auth_headers, "Saúde")
+
+    # Espaços repetidos na descrição normalizam como na importação
+    client.post("/categories/rules", json={"category_id": health, "pattern": "farmacia central"}, headers=auth_headers)
+    assert client.post("/categories/rules/apply", headers=auth_headers).json() == {"rules": 1, "updated": 1}
+
+    assert client.post("/categories/rules", json={"category_id": health, "pattern": r"(\w+)+$", "match_type": "regex"}, headers=auth_headers).status_code == 400
+    assert client.post("/categories/rules", json={"category_id": health, "pattern": "x" * 201}, headers=auth_headers).status_code == 400
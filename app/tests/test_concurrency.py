@@ -0,0 +1,132 @@
+import threading
+from datetime import date
+from io import BytesIO
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database.database import Base
+from app.models import Account, AccountType, ImportJob, Transaction, TransactionType, User
+from app.routers.transactions import create_transaction, delete_transaction, update_transaction
+from app.schemas import schemas
+from app.services.import_jobs import ORPHANED_MESSAGE, ImportJobService
+from app.services.import_service import ImportService
+from app.services.ledger import ledger_amount
+
+THREADS = 8
+WRITES_PER_THREAD = 15
+
+
+def test_concurrent_writes_keep_balance_equal_to_ledger(tmp_path):
+    # BD em ficheiro: cada thread tem a sua ligação (em memória seria uma só ligação partilhada)
+    engine = create_engine(f"sqlite:///{tmp_path / 'stress.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autoflush=False, bind=engine)
+
+    with Session() as db:
+        db.add_all([TransactionType(id=1, name="Despesa"), TransactionType(id=2, name="Receita"), AccountType(id=1, name="Conta à Ordem")])
+        user = User(email="stress@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        account = Account(user_id=user.id, name="Partilhada", account_type_id=1, current_balance=100.0, opening_balance=100.0)
+        db.add(account)
+        db.commit()
+        user_id, account_id = user.id, account.id
+
+    errors = []
+    barrier = threading.Barrier(THREADS + 1)
+
+    def writer(n: int) -> None:
+        with Session() as db:
+            user = db.get(User, user_id)
+            barrier.wait()
+            try:
+                for i in range(WRITES_PER_THREAD):
+                    tx = create_transaction(schemas.TransactionCreate(
+                        account_id=account_id, transaction_type_id=1 + (i % 2), amount=1.0 + n,
+                        description=f"t{n}-{i}", date=date(2024, 1, 1)
+                    ), db=db, current_user=user)
+                    if i % 5 == 0:
+                        update_transaction(tx.id, schemas.TransactionCreate(
+                            account_id=account_id, transaction_type_id=2, amount=3.0,
+                            description=f"t{n}-{i}*", date=date(2024, 1, 2)
+                        ), db=db, current_user=user)
+                    elif i % 7 == 0:
+                        delete_transaction(tx.id, db=db, current_user=user)
+            except Exception as e:
+                errors.append(e)
+
+    def importer() -> None:
+        with Session() as db:
+            barrier.wait()
+            try:
+                csv = "Data,Descricao,Valor\n" + "".join(f"0{d}-02-2024,Imp {d},-{d}.50\n" for d in range(1, 10))
+                ImportService.process_file(db, account_id, BytesIO(csv.encode()), "extrato.csv", user_id, chunk_size=3)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(THREADS - 1)]
+    threads.append(threading.Thread(target=importer))
+    for t in threads:
+        t.start()
+    barrier.wait()
+    for t in threads:
+        t.join()
+    assert not errors
+
+    with Session() as db:
+        rows = db.query(Transaction.amount, TransactionType.name).join(TransactionType).filter(Transaction.account_id == account_id).all()
+        expected = 100.0 + sum(ledger_amount(amount, name) for amount, name in rows)
+        balance = db.get(Account, account_id).current_balance
+        assert len(rows) > THREADS * WRITES_PER_THREAD // 2
+        assert round(balance, 2) == round(expected, 2)
+    engine.dispose()
+
+
+def test_import_job_status_is_written_apart_from_the_data(tmp_path, monkeypatch):
+    # BD em ficheiro: a sessão do estado do job e a dos dados são ligações (e transações) diferentes
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False, "timeout": 0.2})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autoflush=False, bind=engine)
+
+    with Session() as db:
+        db.add_all([TransactionType(id=1, name="Despesa"), TransactionType(id=2, name="Receita"), AccountType(id=1, name="Conta à Ordem")])
+        user = User(email="jobs@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        account = Account(user_id=user.id, name="Importações", account_type_id=1)
+        db.add(account)
+        db.flush()
+        job = ImportJob(user_id=user.id, account_id=account.id, filename="extrato.csv")
+        orphan = ImportJob(user_id=user.id, account_id=account.id, filename="antigo.csv", status="running")
+        done = ImportJob(user_id=user.id, account_id=account.id, filename="feito.csv", status="completed")
+        db.add_all([job, orphan, done])
+        db.commit()
+        account_id, job_id, orphan_id, done_id = account.id, job.id, orphan.id, done.id
+
+    path = tmp_path / "extrato.csv"
+    path.write_text("Data,Descricao,Valor\n" + "".join(f"01-02-2024,Linha {i},-{i + 1}.00\n" for i in range(2500)))
+
+    # A meio da importação, outra ligação vê o job a correr mas ainda nenhuma linha (só há commit no fim)
+    seen = []
+    apply_stats = ImportJobService._apply_stats
+
+    def observe(job, stats):
+        with Session() as other:
+            seen.append((other.get(ImportJob, job_id).status, other.query(Transaction).filter(Transaction.account_id == account_id).count()))
+        apply_stats(job, stats)
+
+    monkeypatch.setattr(ImportJobService, "_apply_stats", staticmethod(observe))
+    ImportJobService.run(job_id, str(path), Session)
+
+    assert len(seen) > 1 and all(state == ("running", 0) for state in seen[:-1])
+    with Session() as db:
+        finished = db.get(ImportJob, job_id)
+        assert (finished.status, finished.added) == ("completed", 2500)
+        assert db.query(Transaction).filter(Transaction.account_id == account_id).count() == 2500
+
+        # Arranque seguinte: o job que ficou "running" num processo anterior passa a falhado
+        assert ImportJobService.fail_orphaned(db) == 1
+        assert (db.get(ImportJob, orphan_id).status, db.get(ImportJob, orphan_id).error_message) == ("failed", ORPHANED_MESSAGE)
+        assert db.get(ImportJob, done_id).status == "completed"
+    engine.dispose()
@@ -0,0 +1,94 @@
+from datetime import date
+from app.models import Asset, AssetPrice, Holding
+
+
+def test_portfolio_converted_to_preferred_currency(client, auth_headers, admin_headers, db_session):
+    # Conta em USD com 1000 USD e uma posição BTC-USD
+    acc = client.post("/accounts/", json={"name": "US Broker", "account_type_id": 2, "current_balance": 1000.0, "currency": "USD"}, headers=auth_headers).json()
+    btc = Asset(symbol="BTC-USD", name="Bitcoin", asset_type="Crypto", currency="USD")
+    db_session.add(btc)
+    db_session.commit()
+    db_session.add(Holding(account_id=acc["id"], asset_id=btc.id, quantity=1.0, avg_buy_price=40000.0))
+    db_session.add(AssetPrice(asset_id=btc.id, date=date(2024, 1, 2), close_price=50000.0))
+    db_session.commit()
+
+    # Sem taxas EUR/USD o pedido não falha: a conta e a posição em USD ficam marcadas e fora dos totais
+    res = client.get("/portfolio", headers=auth_headers)
+    assert res.status_code == 200, res.text
+    data = res.json()
+    assert data["unconverted_currencies"] == ["USD"]
+    assert data["total_net_worth"] == 0.0
+    assert data["positions"][0]["fx_missing"] is True
+    assert data["positions"][0]["currency"] == "USD"
+    assert data["positions"][0]["current_price"] == 50000.0
+
+    # 1 EUR = 1.25 USD (o par inverso também serve)
+    res = client.post("/admin/fx-rates", json=[{"base": "EUR", "quote": "USD", "date": "2024-01-01", "rate": 1.25}], headers=admin_headers)
+    assert res.json() == {"upserted": 1}
+
+    data = client.get("/portfolio", headers=auth_headers).json()
+    assert data["currency"] == "EUR"
+    assert data["total_cash"] == 800.0
+    pos = data["positions"][0]
+    assert pos["current_price"] == 40000.0
+    assert pos["avg_buy_price"] == 32000.0
+    assert data["total_net_worth"] == 40800.0
+    assert data["unconverted_currencies"] == []
+    assert pos["fx_missing"] is False
+
+    # Mudar a moeda preferida para USD devolve os valores nativos
+    client.put("/users/me", json={"preferred_currency": "USD"}, headers=auth_headers)
+    data_usd = client.get("/portfolio", headers=auth_headers).json()
+    assert data_usd["total_cash"] == 1000.0
+    assert data_usd["positions"][0]["current_price"] == 50000.0
+
+def test_evolution_converts_each_transaction_at_its_date(client, auth_headers, admin_headers):
+    client.put("/users/me", json={"preferred_currency": "EUR"}, headers=auth_headers)
+    acc = client.post("/accounts/", json={"name": "USD", "account_type_id": 1, "currency": "USD"}, headers=auth_headers).json()
+    client.post("/admin/fx-rates", json=[
+        {"base": "EUR", "quote": "USD", "date": "2020-01-01", "rate": 2.0},
+        {"base": "EUR", "quote": "USD", "date": "2021-01-01", "rate": 1.0},
+    ], headers=admin_headers)
+
+    client.post("/transactions/", json={
+        "date": "2020-06-01", "description": "Salário", "amount": 100.0, "account_id": acc["id"], "transaction_type_id": 2
+    }, headers=auth_headers)
+
+    data = client.get("/analytics/evolution?period=year", headers=auth_headers).json()
+    point_2020 = next(p for p in data if p["period"] == "2020")
+    assert point_2020["income"] == 50.0  # 100 USD à taxa de 2020
+
+def test_history_only_needs_rates_while_a_position_is_held(client, auth_headers, admin_headers):
+    eur = client.post("/accounts/", json={"name": "Broker", "account_type_id": 2}, headers=auth_headers).json()
+    usd = client.post("/accounts/", json={"name": "US Broker", "account_type_id": 2, "currency": "USD"}, headers=auth_headers).json()
+    for acc, symbol in ((eur, "AAPL"), (usd, "MSFT")):
+        client.post("/transactions/", json={
+            "date": "2024-01-01", "description": "Compra", "amount": 100.0, "account_id": acc["id"],
+            "transaction_type_id": 3, "symbol": symbol, "quantity": 1.0
+        }, headers=auth_headers)
+
+    # Sem taxas USD: a posição em USD fica fora dos totais, o resto da série continua disponível
+    res = client.get("/portfolio/history?start=2023-12-30&end=2024-01-02", headers=auth_headers)
+    assert res.status_code == 200, res.text
+    points = {p["date"]: p for p in res.json()}
+    assert points["2023-12-31"]["unconverted"] == []
+    assert points["2024-01-02"]["unconverted"] == ["MSFT"]
+    assert points["2024-01-02"]["cost_basis"] == 100.0
+
+    # Uma única taxa posterior serve para todos os dias (a mais próxima)
+    client.post("/admin/fx-rates", json=[{"base": "EUR", "quote": "USD", "date": "2024-06-01", "rate": 2.0}], headers=admin_headers)
+    points = {p["date"]: p for p in client.get("/portfolio/history?start=2023-12-30&end=2024-01-02", headers=auth_headers).json()}
+    assert points["2024-01-02"]["unconverted"] == []
+    assert points["2024-01-02"]["cost_basis"] == 150.0
+
+def test_spending_converts_foreign_totals(client, auth_headers, admin_headers):
+    acc = client.post("/accounts/", json={"name": "USD", "account_type_id": 1, "currency": "USD"}, headers=auth_headers).json()
+    category_id = client.post("/categories/", json={"name": "Viagens"}, headers=auth_headers).json()["id"]
+    client.post("/admin/fx-rates", json=[{"base": "EUR", "quote": "USD", "date": "2024-01-01", "rate": 1.25}], headers=admin_headers)
+    client.post("/transactions/", json={
+        "date": "2024-06-01", "description": "Hotel", "amount": 100.0, "account_id": acc["id"],
+        "transaction_type_id": 1, "category_id": category_id
+    }, headers=auth_headers)
+
+    spending = client.get("/analytics/spending", headers=auth_headers).json()
+    assert spending == [{"name": "Viagens", "value": 80.0}]
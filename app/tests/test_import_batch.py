@@ -0,0 +1,100 @@
+import json
+import zipfile
+from io import BytesIO
+
+from app.models import Account, Transaction
+from app.services.balance_service import BalanceService
+from app.services.import_batch import BatchImportService
+
+
+def _zip(members: dict) -> BytesIO:
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+def test_batch_zip_parses_in_parallel_and_dedupes_across_files(client, auth_headers, db_session):
+    checking = client.post("/accounts/", json={"name": "Ordenado", "account_type_id": 1, "current_balance": 0}, headers=auth_headers).json()["id"]
+    card = client.post("/accounts/", json={"name": "Cartão", "account_type_id": 1, "current_balance": 0}, headers=auth_headers).json()["id"]
+
+    # Extratos mensais sobrepostos (31-01 aparece nos dois) e um terceiro de outra conta
+    archive = _zip({
+        "2024/fevereiro.csv": "Data,Descricao,Valor\n31-01-2024,Renda,-700.00\n15-02-2024,Ordenado,1500.00\n",
+        "2024/janeiro.csv": "Data,Descricao,Valor\n10-01-2024,Ordenado,1500.00\n31-01-2024,Renda,-700.00\n",
+        "cartao.csv": "Data;Descricao;Valor\n05-01-2024;Restaurante;-35,50\n",
+        "__MACOSX/._janeiro.csv": "lixo",
+        "notas.pdf": "%PDF-1.4",
+    })
+    res = client.post(
+        f"/imports/batch?account_id={checking}",
+        files=[("files", ("extratos.zip", archive, "application/zip"))],
+        data={"accounts": json.dumps({"cartao.csv": card})},
+        headers=auth_headers,
+    )
+    assert res.status_code == 200
+    body = res.json()
+    results = {f["filename"]: f for f in body["files"]}
+    assert set(results) == {"2024/fevereiro.csv", "2024/janeiro.csv", "cartao.csv", "notas.pdf"}
+
+    # Janeiro é escrito primeiro (ordem por data); a renda repetida em fevereiro é duplicado
+    assert (results["2024/janeiro.csv"]["added"], results["2024/janeiro.csv"]["duplicates"]) == (2, 0)
+    assert (results["2024/fevereiro.csv"]["added"], results["2024/fevereiro.csv"]["duplicates"]) == (1, 1)
+    assert results["cartao.csv"]["account_id"] == card and results["cartao.csv"]["added"] == 1
+    assert results["notas.pdf"]["status"] == "failed"
+    assert (body["added"], body["duplicates"], body["failed_files"]) == (4, 1, 1)
+
+    db_session.expire_all()
+    assert db_session.query(Transaction).filter(Transaction.account_id == checking).count() == 3
+    assert db_session.get(Account, checking).current_balance == 2300.0
+    assert db_session.get(Account, card).current_balance == -35.5
+
+
+def test_batch_reports_unreadable_file_and_rejects_foreign_account(client, auth_headers, admin_headers, db_session):
+    account_id = client.post("/accounts/", json={"name": "Conta", "account_type_id": 1}, headers=auth_headers).json()["id"]
+    foreign = client.post("/accounts/", json={"name": "Alheia", "account_type_id": 1}, headers=admin_headers).json()["id"]
+    user_id = db_session.get(Account, account_id).user_id
+
+    result = BatchImportService.process(db_session, user_id, [
+        ("bom.csv", BytesIO(b"Data,Valor\n01-03-2024,-10.00\n")),
+        ("mau.csv", BytesIO(b"Coluna,Outra\n1,2\n")),
+    ], account_id, processes=0)
+    outcome = {f["filename"]: f for f in result["files"]}
+    assert outcome["bom.csv"]["status"] == "completed" and outcome["bom.csv"]["added"] == 1
+    assert outcome["mau.csv"]["status"] == "failed" and "Colunas obrigatórias" in outcome["mau.csv"]["error_message"]
+
+    files = [("files", ("a.csv", BytesIO(b"Data,Valor\n01-03-2024,-10.00\n"), "text/csv"))]
+    res = client.post(f"/imports/batch?account_id={account_id}", files=files,
+                      data={"accounts": json.dumps({"a.csv": foreign})}, headers=auth_headers)
+    assert res.status_code == 403
+
+
+def test_batch_write_error_fails_only_that_file(client, auth_headers, db_session, monkeypatch):
+    good = client.post("/accounts/", json={"name": "Boa", "account_type_id": 1, "current_balance": 0}, headers=auth_headers).json()["id"]
+    bad = client.post("/accounts/", json={"name": "Má", "account_type_id": 1, "current_balance": 0}, headers=auth_headers).json()["id"]
+    user_id = db_session.get(Account, good).user_id
+
+    # Falha depois dos INSERTs do ficheiro da conta `bad`: o savepoint tem de os desfazer
+    original = BalanceService.apply_delta
+
+    def apply_delta(db, account_id, delta):
+        if account_id == bad:
+            raise RuntimeError("disco cheio")
+        return original(db, account_id, delta)
+
+    monkeypatch.setattr(BalanceService, "apply_delta", staticmethod(apply_delta))
+    result = BatchImportService.process(db_session, user_id, [
+        ("boa.csv", BytesIO(b"Data,Valor\n01-03-2024,-10.00\n")),
+        ("ma.csv", BytesIO(b"Data,Valor\n02-03-2024,-20.00\n")),
+    ], good, account_map={"ma.csv": bad}, processes=0)
+    outcome = {f["filename"]: f for f in result["files"]}
+    assert outcome["boa.csv"]["status"] == "completed" and outcome["boa.csv"]["added"] == 1
+    assert outcome["ma.csv"]["status"] == "failed" and "disco cheio" in outcome["ma.csv"]["error_message"]
+    assert (result["added"], result["failed_files"]) == (1, 1)
+
+    db_session.expire_all()
+    assert db_session.query(Transaction).filter(Transaction.account_id == good).count() == 1
+    assert db_session.query(Transaction).filter(Transaction.account_id == bad).count() == 0
+    assert db_session.get(Account, good).current_balance == -10.0
@@ -0,0 +1,40 @@
+from app.models import Account, TransactionType
+
+
+def test_lookups_are_cached_with_etag(client, admin_headers, db_session):
+    response = client.get("/lookups/transaction-types")
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    types = {t["name"]: (t["sign"], t["kind"]) for t in response.json()}
+    assert types == {"Despesa": (-1, "expense"), "Receita": (1, "income"), "Compra Ativo": (-1, "buy"), "Venda Ativo": (1, "sell")}
+
+    etag = response.headers["etag"]
+    assert client.get("/lookups/transaction-types", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/lookups/account-types").json()[0] == {"id": 1, "name": "Conta Ordem"}
+    assert client.get("/lookups/categories").json() == []
+
+    # Alterações diretas na BD só aparecem depois de invalidar o registo (novo ETag)
+    db_session.add(TransactionType(id=5, name="Reembolso"))
+    db_session.commit()
+    assert len(client.get("/lookups/transaction-types").json()) == 4
+    assert client.delete("/admin/lookups", headers=admin_headers).status_code == 204
+    response = client.get("/lookups/transaction-types", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and len(response.json()) == 5
+
+
+def test_balance_sign_comes_from_type_not_name(client, auth_headers, db_session):
+    # Nome sem palavras-chave, mas marcado explicitamente como saída
+    db_session.add(TransactionType(id=5, name="Transferência Enviada", sign=-1, kind="expense"))
+    db_session.commit()
+    acc_id = client.post("/accounts/", json={"name": "Conta", "account_type_id": 1, "current_balance": 100.0}, headers=auth_headers).json()["id"]
+
+    # Tipo criado depois do carregamento: o registo recarrega sozinho
+    tx = client.post("/transactions/", json={
+        "account_id": acc_id, "date": "2024-01-10", "description": "MB Way", "amount": 25.0, "transaction_type_id": 5
+    }, headers=auth_headers).json()
+    assert tx["amount"] == -25.0
+    assert db_session.get(Account, acc_id).current_balance == 75.0
+
+    client.delete(f"/transactions/{tx['id']}", headers=auth_headers)
+    db_session.expire_all()
+    assert db_session.get(Account, acc_id).current_balance == 100.0
@@ -0,0 +1,55 @@
+from io import BytesIO
+
+
+def _account(client, headers, name):
+    return client.post("/accounts/", json={"name": name, "account_type_id": 1}, headers=headers).json()["id"]
+
+
+def test_review_finds_near_duplicates_and_transfers(client, auth_headers):
+    checking = _account(client, auth_headers, "Ordenado")
+    savings = _account(client, auth_headers, "Poupança")
+    txs = [
+        # Mesmo movimento reexportado: data +1 dia e referência diferente
+        (checking, "2024-03-01", "PAG SERV 1234 EDP COMERCIAL", -42.10, 1),
+        (checking, "2024-03-02", "PAG SERV 9876 EDP COMERCIAL", -42.10, 1),
+        # Mesmo valor mas descrição diferente: não é duplicado
+        (checking, "2024-03-02", "Ginásio", -42.10, 1),
+        # Transferência: sai de uma conta, entra na outra dois dias depois
+        (checking, "2024-03-05", "Transferência para poupança", -500.00, 1),
+        (savings, "2024-03-07", "Transferência recebida", 500.00, 2),
+        # Fora da janela
+        (savings, "2024-04-20", "Depósito", 500.00, 2),
+    ]
+    ids = []
+    for account_id, dt, desc, amount, type_id in txs:
+        res = client.post("/transactions/", json={
+            "account_id": account_id, "date": dt, "description": desc, "amount": amount, "transaction_type_id": type_id
+        }, headers=auth_headers)
+        ids.append(res.json()["id"])
+
+    review = client.get("/transactions/review", headers=auth_headers).json()
+    assert [p["transaction_ids"] for p in review["near_duplicates"]] == [[ids[0], ids[1]]]
+    assert review["near_duplicates"][0]["days_apart"] == 1
+    assert len(review["transfers"]) == 1
+    transfer = review["transfers"][0]
+    assert (transfer["outgoing_id"], transfer["incoming_id"], transfer["amount"]) == (ids[3], ids[4], 500.0)
+
+    narrow = client.get("/transactions/review?window_days=1", headers=auth_headers).json()
+    assert narrow["transfers"] == []
+
+
+def test_import_reports_near_duplicates_and_transfers(client, auth_headers):
+    checking = _account(client, auth_headers, "Ordenado")
+    savings = _account(client, auth_headers, "Poupança")
+    client.post("/transactions/", json={
+        "account_id": savings, "date": "2024-06-03", "description": "Transf. recebida", "amount": 200.0, "transaction_type_id": 2
+    }, headers=auth_headers)
+    first = b"Data,Descricao,Valor\n01-06-2024,COMPRA 111 CONTINENTE,-30.00\n"
+    client.post(f"/imports/upload?account_id={checking}", files={'file': ('a.csv', BytesIO(first), 'text/csv')}, headers=auth_headers)
+
+    second = b"Data,Descricao,Valor\n02-06-2024,COMPRA 222 CONTINENTE,-30.00\n02-06-2024,Transf. poupanca,-200.00\n"
+    job = client.post(f"/imports/upload?account_id={checking}", files={'file': ('b.csv', BytesIO(second), 'text/csv')},
+                      headers=auth_headers).json()
+    assert job["added"] == 2
+    assert job["near_duplicates"] == 1
+    assert job["transfer_candidates"] == 1
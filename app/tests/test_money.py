@@ -0,0 +1,46 @@
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+
+from app.models import Account, Transaction
+
+
+def test_money_is_stored_as_exact_minor_units(client, auth_headers, db_session):
+    account_id = client.post("/accounts/", json={"name": "Cêntimos", "account_type_id": 1, "current_balance": 0}, headers=auth_headers).json()["id"]
+    category_id = client.post("/categories/", json={"name": "Cafés"}, headers=auth_headers).json()["id"]
+    for _ in range(10):
+        client.post("/transactions/", json={
+            "account_id": account_id, "date": "2024-05-01", "description": "Café", "amount": 0.1,
+            "transaction_type_id": 1, "category_id": category_id
+        }, headers=auth_headers)
+
+    # Em float, 10 x 0.1 dá 0.9999999999999999; em cêntimos a soma é exata
+    db_session.expire_all()
+    assert db_session.get(Account, account_id).current_balance == -1.0
+    raw = db_session.execute(text("SELECT amount FROM transactions WHERE account_id = :a"), {"a": account_id}).scalars().all()
+    assert raw == [-10] * 10
+
+    spending = client.get("/analytics/spending", headers=auth_headers).json()
+    assert spending[0]["value"] == 1.0
+
+
+def test_rule_amount_bounds_compare_in_minor_units(client, auth_headers):
+    account_id = client.post("/accounts/", json={"name": "Conta", "account_type_id": 1}, headers=auth_headers).json()["id"]
+    category_id = client.post("/categories/", json={"name": "Grandes"}, headers=auth_headers).json()["id"]
+    for amount in (49.99, 50.0, 120.0):
+        client.post("/transactions/", json={
+            "account_id": account_id, "date": "2024-05-01", "description": "Compra", "amount": amount, "transaction_type_id": 1
+        }, headers=auth_headers)
+    client.post("/categories/rules", json={"category_id": category_id, "min_amount": 50.0, "max_amount": 100.0}, headers=auth_headers)
+
+    result = client.post("/categories/rules/apply?overwrite=true", headers=auth_headers).json()
+    assert result["updated"] == 1
+
+
+def test_only_comparisons_and_sums_scale_literals():
+    dialect = sqlite.dialect()
+    render = lambda expr: str(expr.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    assert render(Transaction.amount >= 1.5) == "transactions.amount >= 150"
+    assert render(Transaction.amount.between(1, 2)) == "transactions.amount BETWEEN 100 AND 200"
+    assert render(Transaction.amount + 1) == "transactions.amount + 100"
+    # Num produto o literal é um fator, não um valor em euros
+    assert render(Transaction.amount * 2) == "transactions.amount * 2"
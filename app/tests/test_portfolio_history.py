@@ -0,0 +1,46 @@
+from datetime import date
+from app.models import Asset, AssetPrice
+
+
+def test_portfolio_history_replays_positions_and_prices(client, auth_headers, db_session):
+    acc_id = client.post("/accounts/", json={"name": "Broker", "account_type_id": 2}, headers=auth_headers).json()["id"]
+
+    # Compra 2 AAPL a 100 (dia 1), vende 1 (dia 3)
+    client.post("/transactions/", json={
+        "date": "2024-01-01", "description": "Buy AAPL", "amount": 200.0,
+        "account_id": acc_id, "transaction_type_id": 3, "symbol": "AAPL", "quantity": 2.0, "price_per_unit": 100.0
+    }, headers=auth_headers)
+    client.post("/transactions/", json={
+        "date": "2024-01-03", "description": "Sell AAPL", "amount": 130.0,
+        "account_id": acc_id, "transaction_type_id": 4, "symbol": "AAPL", "quantity": 1.0
+    }, headers=auth_headers)
+
+    asset = db_session.query(Asset).filter(Asset.symbol == "AAPL").first()
+    db_session.add(AssetPrice(asset_id=asset.id, date=date(2024, 1, 2), close_price=120.0))
+    db_session.add(AssetPrice(asset_id=asset.id, date=date(2024, 1, 3), close_price=130.0))
+    db_session.commit()
+
+    res = client.get("/portfolio/history?start=2023-12-31&end=2024-01-04&freq=D", headers=auth_headers)
+    assert res.status_code == 200, res.text
+    points = {p["date"]: p for p in res.json()}
+
+    assert points["2023-12-31"]["market_value"] == 0.0
+    # Dia 1: sem preço conhecido -> valorizado ao custo
+    assert points["2024-01-01"] == {"date": "2024-01-01", "market_value": 200.0, "cost_basis": 200.0, "unrealized_pl": 0.0, "unconverted": []}
+    assert points["2024-01-02"]["market_value"] == 240.0
+    assert points["2024-01-02"]["unrealized_pl"] == 40.0
+    assert points["2024-01-03"]["market_value"] == 130.0
+    assert points["2024-01-03"]["cost_basis"] == 100.0
+    # Dia 4: último preço conhecido (forward-fill)
+    assert points["2024-01-04"]["market_value"] == 130.0
+
+def test_portfolio_history_monthly_and_validation(client, auth_headers):
+    res = client.get("/portfolio/history?start=2024-01-01&end=2024-03-15&freq=M", headers=auth_headers)
+    assert res.status_code == 200
+    assert [p["date"] for p in res.json()] == ["2024-01-31", "2024-02-29", "2024-03-15"]
+
+    bad = client.get("/portfolio/history?start=2024-02-01&end=2024-01-01", headers=auth_headers)
+    assert bad.status_code == 400
+
+    too_long = client.get("/portfolio/history?start=0001-01-01&end=9999-12-31", headers=auth_headers)
+    assert too_long.status_code == 400
@@ -0,0 +1,46 @@
+from app.models import Asset, Holding
+from app.services.price_cache import price_cache
+
+
+def _setup_holding(client, auth_headers, db_session):
+    asset = Asset(symbol="AAPL", name="Apple Inc.", asset_type="Stock")
+    db_session.add(asset)
+    db_session.commit()
+
+    acc_id = client.post("/accounts/", json={"name": "Broker", "account_type_id": 2}, headers=auth_headers).json()["id"]
+    db_session.add(Holding(account_id=acc_id, asset_id=asset.id, quantity=10, avg_buy_price=100.0))
+    db_session.commit()
+    return asset
+
+def test_portfolio_reuses_cached_price(client, auth_headers, db_session):
+    _setup_holding(client, auth_headers, db_session)
+    client.post("/portfolio/price", json={"symbol": "AAPL", "price": 120.0}, headers=auth_headers)
+
+    # 1ª chamada vai à BD (miss), a 2ª usa a cache (hit)
+    first = client.get("/portfolio", headers=auth_headers).json()
+    second = client.get("/portfolio", headers=auth_headers).json()
+
+    assert first["positions"][0]["current_price"] == 120.0
+    assert second["positions"][0]["current_price"] == 120.0
+    stats = price_cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+
+def test_set_asset_price_refreshes_cache(client, auth_headers, db_session):
+    _setup_holding(client, auth_headers, db_session)
+    client.post("/portfolio/price", json={"symbol": "AAPL", "price": 120.0}, headers=auth_headers)
+    client.get("/portfolio", headers=auth_headers)
+
+    # Novo preço manual deve aparecer de imediato, sem esperar pelo TTL
+    client.post("/portfolio/price", json={"symbol": "AAPL", "price": 130.0}, headers=auth_headers)
+    data = client.get("/portfolio", headers=auth_headers).json()
+
+    assert data["positions"][0]["current_price"] == 130.0
+    assert data["positions"][0]["profit_loss"] == 300.0
+
+def test_price_cache_stats_admin_only(client, auth_headers, admin_headers):
+    assert client.get("/admin/price-cache", headers=auth_headers).status_code == 403
+
+    res = client.get("/admin/price-cache", headers=admin_headers)
+    assert res.status_code == 200
+    assert "hit_rate" in res.json()
@@ -0,0 +1,58 @@
+from io import BytesIO
+from datetime import date
+from app.models import Asset, AssetPrice
+
+
+def test_bulk_ingest_upserts_per_asset_and_day(client, admin_headers, db_session):
+    db_session.add(Asset(symbol="AAPL", name="Apple Inc.", asset_type="Stock"))
+    db_session.commit()
+
+    csv_content = (
+        "symbol,date,close\n"
+        "AAPL,2024-01-02,185.5\n"
+        "AAPL,2024-01-03,184.2\n"
+        "BTC-USD,2024-01-02,45000\n"
+        "AAPL,not-a-date,1\n"
+    )
+    files = {"file": ("prices.csv", BytesIO(csv_content.encode("utf-8")), "text/csv")}
+    res = client.post("/portfolio/prices/bulk", files=files, headers=admin_headers)
+    assert res.status_code == 200, res.text
+    data = res.json()
+    assert data["upserted"] == 3
+    assert data["errors"] == 1
+    assert data["assets_created"] == 1
+    assert "rows_per_second" in data
+
+    # Reenviar o mesmo dia com outro valor (NDJSON) atualiza em vez de duplicar
+    ndjson = '{"symbol": "AAPL", "date": "2024-01-03", "close": 190.0}\n'
+    files = {"file": ("prices.ndjson", BytesIO(ndjson.encode("utf-8")), "application/x-ndjson")}
+    client.post("/portfolio/prices/bulk", files=files, headers=admin_headers)
+
+    aapl = db_session.query(Asset).filter(Asset.symbol == "AAPL").first()
+    prices = db_session.query(AssetPrice).filter(AssetPrice.asset_id == aapl.id).order_by(AssetPrice.date).all()
+    assert [(p.date, p.close_price) for p in prices] == [(date(2024, 1, 2), 185.5), (date(2024, 1, 3), 190.0)]
+
+def test_manual_price_same_day_does_not_duplicate(client, auth_headers, db_session):
+    db_session.add(Asset(symbol="AAPL", name="Apple Inc.", asset_type="Stock"))
+    db_session.commit()
+
+    client.post("/portfolio/price", json={"symbol": "AAPL", "price": 100.0}, headers=auth_headers)
+    client.post("/portfolio/price", json={"symbol": "AAPL", "price": 101.0}, headers=auth_headers)
+
+    prices = db_session.query(AssetPrice).all()
+    assert len(prices) == 1
+    assert prices[0].close_price == 101.0
+
+def test_bulk_ingest_requires_admin(client, auth_headers):
+    files = {"file": ("prices.csv", BytesIO(b"symbol,date,close\n"), "text/csv")}
+    res = client.post("/portfolio/prices/bulk", files=files, headers=auth_headers)
+    assert res.status_code == 403
+
+def test_bulk_ingest_rejects_non_finite_closes(client, admin_headers, db_session):
+    csv_content = "symbol,date,close\nAAPL,2024-01-02,nan\nAAPL,2024-01-03,inf\nAAPL,2024-01-04,-Infinity\nAAPL,2024-01-05,185.5\n"
+    files = {"file": ("prices.csv", BytesIO(csv_content.encode("utf-8")), "text/csv")}
+    res = client.post("/portfolio/prices/bulk", files=files, headers=admin_headers)
+    assert res.status_code == 200, res.text
+    assert res.json()["upserted"] == 1
+    assert res.json()["errors"] == 3
+    assert [p.date for p in db_session.query(AssetPrice).all()] == [date(2024, 1, 5)]
@@ -0,0 +1,45 @@
+from datetime import date
+
+from app.models import Account, Asset, Category, Holding, Transaction
+from app.services.category_cache import category_cache
+
+# Queries por pedido, incluindo a autenticação e a árvore de categorias ainda por carregar em cache.
+# Não podem crescer com o nº de linhas devolvidas.
+BUDGETS = {
+    "/transactions/": 6,
+    "/accounts/": 2,
+    "/categories/": 3,
+    "/portfolio": 5,
+    "/users/me": 1,
+}
+
+
+def add_rows(db_session, user_id: int, count: int) -> None:
+    category = Category(user_id=user_id, name=f"Cat {count}")
+    db_session.add(category)
+    db_session.flush()
+    for i in range(count):
+        asset = Asset(symbol=f"SYM{count}-{i}", name=f"Ativo {i}", asset_type="Stock")
+        account = Account(user_id=user_id, name=f"Conta {count}-{i}", account_type_id=1 + i % 4, current_balance=100.0)
+        db_session.add_all([asset, account])
+        db_session.flush()
+        db_session.add_all([
+            Holding(account_id=account.id, asset_id=asset.id, quantity=1.0, avg_buy_price=10.0),
+            Transaction(account_id=account.id, transaction_type_id=3, amount=-10.0, description="Compra", date=date(2024, 1, 1),
+                        category_id=category.id, asset_id=asset.id, quantity=1.0),
+        ])
+    db_session.commit()
+    category_cache.invalidate(user_id)
+
+
+def test_endpoints_stay_within_query_budget(client, auth_headers, db_session, query_budget):
+    user_id = client.get("/users/me", headers=auth_headers).json()["id"]
+    counts = {}
+    for rows in (2, 20):
+        add_rows(db_session, user_id, rows)
+        for path, budget in BUDGETS.items():
+            with query_budget(budget) as statements:
+                assert client.get(path, headers=auth_headers).status_code == 200
+            counts.setdefault(path, []).append(len(statements))
+    # Com 10x mais linhas, o mesmo nº de queries (sem N+1)
+    assert all(small == large for small, large in counts.values()), counts
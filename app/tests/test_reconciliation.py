@@ -0,0 +1,47 @@
+from io import BytesIO
+
+from app.cli import main
+from app.models import Account
+
+
+def test_reconcile_reports_and_repairs_drift_in_batches(client, auth_headers, admin_headers, db_session):
+    accounts = []
+    for i in range(5):
+        acc_id = client.post("/accounts/", json={"name": f"Conta {i}", "account_type_id": 1, "current_balance": 100.0}, headers=auth_headers).json()["id"]
+        client.post("/transactions/", json={
+            "account_id": acc_id, "date": "2024-01-10", "description": "Compras", "amount": 30.25, "transaction_type_id": 1
+        }, headers=auth_headers)
+        accounts.append(acc_id)
+    # Importadas guardam o valor absoluto: o sinal tem de vir do tipo
+    client.post(f"/imports/upload?account_id={accounts[0]}",
+                files={'file': ('a.csv', BytesIO(b"Data,Valor\n01-02-2024,-10.00\n"), 'text/csv')}, headers=auth_headers)
+
+    # Corromper dois saldos diretamente na BD
+    for acc_id, wrong in ((accounts[1], 50.0), (accounts[3], 70.01)):
+        db_session.get(Account, acc_id).current_balance = wrong
+    db_session.commit()
+
+    report = client.post("/admin/reconcile?batch_size=2", headers=admin_headers).json()
+    assert report["accounts_checked"] == 5 and report["batches"] == 3
+    assert report["accounts_drifted"] == 2 and report["applied"] is False
+    assert {d["account_id"]: d["expected"] for d in report["drift"]} == {accounts[1]: 69.75, accounts[3]: 69.75}
+    assert report["total_abs_drift"] == 20.01
+
+    fixed = client.post("/admin/reconcile?batch_size=2&apply=true", headers=admin_headers).json()
+    assert fixed["accounts_drifted"] == 2
+    db_session.expire_all()
+    assert db_session.get(Account, accounts[1]).current_balance == 69.75
+    assert db_session.get(Account, accounts[0]).current_balance == 59.75
+    assert client.post("/admin/reconcile", headers=admin_headers).json()["accounts_drifted"] == 0
+
+    assert client.post("/admin/reconcile", headers=auth_headers).status_code == 403
+
+
+def test_reconcile_cli(client, auth_headers, db_session, monkeypatch, capsys):
+    from app.tests.conftest import TestingSessionLocal
+    client.post("/accounts/", json={"name": "Conta", "account_type_id": 1, "current_balance": 10.0}, headers=auth_headers)
+    monkeypatch.setattr("app.cli.SessionLocal", TestingSessionLocal)
+
+    assert main(["reconcile", "--batch-size", "10"]) == 0
+    out = capsys.readouterr().out
+    assert "1 contas em 1 lotes" in out and "0 contas com drift" in out
@@ -0,0 +1,105 @@
+from io import BytesIO
+from app.models import Transaction
+from app.services.statement_parsers import Camt053Parser, detect_parser
+
+OFX_SGML = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+CHARSET:1252
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240105120000[0:GMT]
+<TRNAMT>-45.90
+<FITID>1
+<NAME>Continente
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240131<TRNAMT>1500.00<FITID>2<NAME>Salário<MEMO>Janeiro</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+QIF = """!Type:Bank
+D03/15'24
+T-1,250.00
+PRenda
+MMarço
+^
+D03/20'24
+T80.00
+PReembolso
+^
+"""
+
+CAMT_ENTRY = """<Ntry><Amt Ccy="EUR">{amount}</Amt><CdtDbtInd>{ind}</CdtDbtInd><BookgDt><Dt>2024-02-{day:02d}</Dt></BookgDt>
+<NtryDtls><TxDtls><RmtInf><Ustrd>{text}</Ustrd></RmtInf></TxDtls></NtryDtls></Ntry>"""
+
+def camt(entries):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"><BkToCstmrStmt><Stmt>'
+        + "".join(entries) + '</Stmt></BkToCstmrStmt></Document>'
+    ).encode("utf-8")
+
+def upload(client, headers, account_id, name, payload):
+    files = {'file': (name, BytesIO(payload), 'application/octet-stream')}
+    return client.post(f"/imports/upload?account_id={account_id}", files=files, headers=headers).json()
+
+def test_ofx_qif_and_camt_share_the_import_pipeline(client, auth_headers, db_session):
+    account_id = client.post("/accounts/", json={"name": "Banco", "account_type_id": 1}, headers=auth_headers).json()["id"]
+
+    assert upload(client, auth_headers, account_id, "extrato.ofx", OFX_SGML.encode("cp1252"))["added"] == 2
+    assert upload(client, auth_headers, account_id, "extrato.qif", QIF.encode("utf-8"))["added"] == 2
+    entries = [
+        CAMT_ENTRY.format(amount="12.50", ind="DBIT", day=1, text="Farmácia"),
+        CAMT_ENTRY.format(amount="300.00", ind="CRDT", day=2, text="Transferência recebida"),
+    ]
+    job = upload(client, auth_headers, account_id, "extrato.xml", camt(entries))
+    assert job["added"] == 2 and job["errors"] == 0
+
+    # Reimportar o OFX não duplica (mesmo pipeline de fingerprints)
+    assert upload(client, auth_headers, account_id, "copia.ofx", OFX_SGML.encode("cp1252"))["duplicates"] == 2
+
+    txs = {tx.description: tx for tx in db_session.query(Transaction).filter(Transaction.account_id == account_id)}
+    assert txs["Salário Janeiro"].amount == 1500.0 and txs["Salário Janeiro"].transaction_type_id == 2
+    assert str(txs["Continente"].date) == "2024-01-05"
+    assert txs["Renda Março"].amount == 1250.0 and str(txs["Renda Março"].date) == "2024-03-15"
+    assert txs["Farmácia"].transaction_type_id == 1
+    assert str(txs["Transferência recebida"].date) == "2024-02-02"
+
+def test_format_detected_by_signature_not_extension():
+    assert detect_parser(BytesIO(camt([])), "extrato.txt") is Camt053Parser
+
+def test_camt_malformed_amount_is_a_row_error(client, auth_headers):
+    account_id = client.post("/accounts/", json={"name": "Banco", "account_type_id": 1}, headers=auth_headers).json()["id"]
+    entries = [
+        CAMT_ENTRY.format(amount="12.50", ind="DBIT", day=1, text="Farmácia"),
+        CAMT_ENTRY.format(amount="12,5O", ind="DBIT", day=2, text="Valor estragado"),
+    ]
+    job = upload(client, auth_headers, account_id, "extrato.xml", camt(entries))
+    assert job["status"] == "completed", job
+    assert job["added"] == 1 and job["errors"] == 1
+    assert job["error_samples"][0]["error"] == "Valor inválido"
+    assert job["error_samples"][0]["value"] == "12,5O"
+
+def test_camt_iterparse_memory_is_bounded(tmp_path):
+    import tracemalloc
+    path = tmp_path / "camt.xml"
+    entries = (CAMT_ENTRY.format(amount=f"{i % 97}.10", ind="DBIT", day=i % 28 + 1, text=f"Pagamento {i}") for i in range(20_000))
+    path.write_bytes(camt(entries))
+
+    tracemalloc.start()
+    try:
+        with open(path, "rb") as stream:
+            rows = 0
+            for chunk in Camt053Parser.iter_chunks(stream, 500):
+                rows += len(chunk)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert rows == 20_000
+    # Entradas removidas depois de lidas: o pico fica muito abaixo do tamanho do ficheiro
+    assert peak < path.stat().st_size / 2
@@ -0,0 +1,77 @@
+def _trade(client, headers, acc_id, day, amount, qty, type_id):
+    return client.post("/transactions/", json={
+        "date": day, "description": "Trade AAPL", "amount": amount,
+        "account_id": acc_id, "transaction_type_id": type_id, "symbol": "AAPL", "quantity": qty
+    }, headers=headers).json()
+
+def _setup_trades(client, headers):
+    acc_id = client.post("/accounts/", json={"name": "Broker", "account_type_id": 2}, headers=headers).json()["id"]
+    _trade(client, headers, acc_id, "2024-01-01", 100.0, 1.0, 3)   # Compra 1 @ 100
+    _trade(client, headers, acc_id, "2024-02-01", 200.0, 1.0, 3)   # Compra 1 @ 200
+    sell = _trade(client, headers, acc_id, "2024-03-01", 450.0, 1.5, 4)  # Venda 1.5 @ 300
+    return acc_id, sell
+
+def test_fifo_realized_gains_persisted_at_sale(client, auth_headers):
+    _, _ = _setup_trades(client, auth_headers)
+
+    report = client.get("/portfolio/realized?year=2024", headers=auth_headers).json()
+    # FIFO: 1 @ (300-100) + 0.5 @ (300-200)
+    assert report["total_realized_pl"] == 250.0
+    assert report["total_proceeds"] == 450.0
+    assert len(report["items"]) == 2
+    assert client.get("/portfolio/realized?year=2023", headers=auth_headers).json()["items"] == []
+
+    lots = client.get("/portfolio/lots", headers=auth_headers).json()
+    assert len(lots) == 1
+    assert lots[0]["remaining_quantity"] == 0.5
+    assert lots[0]["unit_cost"] == 200.0
+
+def test_average_method_and_delete_rebuilds_lots(client, auth_headers):
+    client.put("/users/me", json={"cost_basis_method": "average"}, headers=auth_headers)
+    _, sell = _setup_trades(client, auth_headers)
+
+    report = client.get("/portfolio/realized?year=2024", headers=auth_headers).json()
+    # Custo médio 150: 1.5 @ (300-150)
+    assert report["total_realized_pl"] == 225.0
+    assert report["items"][0]["lot_id"] is None
+
+    # Apagar a venda repõe os lotes e remove o ganho realizado
+    client.delete(f"/transactions/{sell['id']}", headers=auth_headers)
+    assert client.get("/portfolio/realized?year=2024", headers=auth_headers).json()["items"] == []
+    lots = client.get("/portfolio/lots", headers=auth_headers).json()
+    assert [l["remaining_quantity"] for l in lots] == [1.0, 1.0]
+
+def test_switching_method_recomputes_history(client, auth_headers):
+    _setup_trades(client, auth_headers)
+    client.put("/users/me", json={"cost_basis_method": "average"}, headers=auth_headers)
+
+    report = client.get("/portfolio/realized?year=2024", headers=auth_headers).json()
+    assert report["total_realized_pl"] == 225.0
+
+def test_edit_keeps_cost_basis_from_price_per_unit(client, auth_headers):
+    acc_id = client.post("/accounts/", json={"name": "Broker", "account_type_id": 2}, headers=auth_headers).json()["id"]
+    # O valor inclui comissão: o preço indicado (100) é diferente de valor / quantidade (102)
+    buy = {"date": "2024-01-01", "description": "Compra AAPL", "amount": 204.0, "account_id": acc_id,
+           "transaction_type_id": 3, "symbol": "AAPL", "quantity": 2.0, "price_per_unit": 100.0}
+    client.post("/transactions/", json=buy, headers=auth_headers)
+    _trade(client, auth_headers, acc_id, "2024-03-01", 300.0, 2.0, 4)
+    before = client.get("/portfolio/realized?year=2024", headers=auth_headers).json()
+    assert before["total_realized_pl"] == 100.0
+
+    buy_id = client.get("/transactions/", headers=auth_headers).json()["items"][-1]["id"]
+    res = client.put(f"/transactions/{buy_id}", json={k: v for k, v in buy.items() if k != "price_per_unit"} | {"description": "Compra AAPL (editada)"},
+                     headers=auth_headers)
+    assert res.status_code == 200, res.text
+    assert res.json()["price_per_unit"] == 100.0
+    assert client.get("/portfolio/realized?year=2024", headers=auth_headers).json() == before
+
+def test_backdated_sale_consumes_lots_in_date_order(client, auth_headers):
+    acc_id, sell = _setup_trades(client, auth_headers)
+    client.delete(f"/transactions/{sell['id']}", headers=auth_headers)
+    # Venda com data entre as duas compras: só o primeiro lote existia nessa data
+    _trade(client, auth_headers, acc_id, "2024-01-15", 300.0, 1.0, 4)
+
+    report = client.get("/portfolio/realized?year=2024", headers=auth_headers).json()
+    assert [(i["quantity"], i["cost_basis"]) for i in report["items"]] == [(1.0, 100.0)]
+    lots = client.get("/portfolio/lots", headers=auth_headers).json()
+    assert [(l["unit_cost"], l["remaining_quantity"]) for l in lots] == [(200.0, 1.0)]
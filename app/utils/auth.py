@@ -4,7 +4,7 @@ from jose import JWTError, jwt
 import bcrypt  # <--- Nova biblioteca
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from app.database.database import get_db
 from app.models import  User
 from app.core.config import settings
@@ -57,7 +57,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
         
-    user = db.query(User).filter(User.email == email).first()
+    # O perfil vem na mesma query (moeda preferida, método de custo, /users/me)
+    user = db.query(User).options(joinedload(User.profile)).filter(User.email == email).first()
     if user is None:
         raise credentials_exception
     return user
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Benchmark do autocomplete de ativos (`/assets/search`).
+
+Cria N ativos numa BD SQLite em memória, carrega o índice, mede a latência de pesquisas
+com prefixos de 1 a 4 caracteres (p50/p99/máx) e o custo de acrescentar ativos novos.
+
+    python -m benchmarks.asset_search --assets 100000
+"""
+import argparse
+import random
+import string
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Asset, Base
+from app.services.asset_index import AssetSearchIndex
+
+WORDS = ["Global", "Energy", "Tech", "Bank", "Holdings", "Capital", "Pharma", "Motors", "Retail", "Systems", "Ação", "Portugal"]
+
+
+def build_assets(count: int) -> list:
+    rng = random.Random(42)
+    symbols = set()
+    while len(symbols) < count:
+        symbols.add("".join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 5))) + rng.choice(["", ".LS", "-USD"]))
+    return [
+        {"symbol": s, "name": " ".join(rng.sample(WORDS, 2)) + f" {i}", "asset_type": "Stock", "currency": "EUR"}
+        for i, s in enumerate(sorted(symbols))
+    ]
+
+
+def percentile(samples: list, p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(count: int, queries: int) -> None:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autoflush=False, bind=engine)()
+    db.execute(insert(Asset), build_assets(count))
+    db.commit()
+
+    index = AssetSearchIndex()
+    t0 = time.perf_counter()
+    index.load(db)
+    print(f"carregamento de {count:,} ativos: {time.perf_counter() - t0:.2f}s")
+
+    rng = random.Random(7)
+    prefixes = ["".join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 4))) for _ in range(queries)]
+    latencies = []
+    for prefix in prefixes:
+        t0 = time.perf_counter()
+        index.search(db, prefix)
+        latencies.append((time.perf_counter() - t0) * 1e6)
+    latencies.sort()
+    print(f"pesquisa ({queries:,} prefixos): p50={percentile(latencies, 0.5):.1f}µs "
+          f"p99={percentile(latencies, 0.99):.1f}µs máx={latencies[-1]:.1f}µs")
+
+    t0 = time.perf_counter()
+    for i in range(100):
+        index.add([{"id": count + i + 1, "symbol": f"NEW{i}", "name": f"Novo {i}", "asset_type": "Stock", "currency": "EUR"}])
+    print(f"inserção incremental: {(time.perf_counter() - t0) * 10:.2f}ms por ativo")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assets", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    args = parser.parse_args()
+    run(args.assets, args.queries)
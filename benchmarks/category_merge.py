@@ -0,0 +1,74 @@
+"""
+Benchmark da reorganização de categorias num ledger grande.
+
+Cria N transações repartidas por 10 categorias (com subcategorias) numa BD SQLite em memória,
+junta duas categorias e reatribui uma subcategoria, reportando o tempo e as linhas movidas.
+
+    python -m benchmarks.category_merge --rows 1000000
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Account, AccountType, Base, Category, SubCategory, Transaction, TransactionType, User
+from app.services.category_service import CategoryService
+
+BATCH = 50_000
+
+
+def run(rows: int) -> None:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autoflush=False, bind=engine)()
+
+    db.add_all([TransactionType(id=1, name="Despesa"), AccountType(id=1, name="Conta à Ordem")])
+    user = User(email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    account = Account(name="Bench", user_id=user.id, account_type_id=1, current_balance=0.0)
+    categories = [Category(user_id=user.id, name=f"Categoria {i}") for i in range(10)]
+    db.add(account)
+    db.add_all(categories)
+    db.flush()
+    subcategories = [SubCategory(category_id=c.id, name=f"Sub {j}") for c in categories for j in range(3)]
+    db.add_all(subcategories)
+    db.commit()
+
+    rng = random.Random(42)
+    start = date(2015, 1, 1)
+    t0 = time.perf_counter()
+    for offset in range(0, rows, BATCH):
+        batch = []
+        for _ in range(min(BATCH, rows - offset)):
+            sub = rng.choice(subcategories)
+            batch.append({
+                "account_id": account.id, "transaction_type_id": 1, "date": start + timedelta(days=rng.randrange(3650)),
+                "description": "Movimento", "amount": -1.0, "category_id": sub.category_id, "subcategory_id": sub.id,
+            })
+        db.execute(insert(Transaction), batch)
+    db.commit()
+    print(f"ledger de {rows:,} transações criado em {time.perf_counter() - t0:.1f}s")
+
+    source, target = categories[0].id, categories[1].id
+    reassigned = subcategories[6].id  # Sub 0 da Categoria 2
+    t0 = time.perf_counter()
+    result = CategoryService.merge(db, user.id, source, target)
+    print(f"fusão: {result} em {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    result = CategoryService.reassign_subcategory(db, user.id, reassigned, target)
+    print(f"reatribuição: {result} em {time.perf_counter() - t0:.2f}s")
+
+    left = db.query(func.count(Transaction.id)).filter(Transaction.category_id == source).scalar()
+    print(f"transações ainda na categoria de origem: {left}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    run(parser.parse_args().rows)
@@ -0,0 +1,68 @@
+"""
+Benchmark da importação de extratos (deduplicação por fingerprint).
+
+Gera um CSV com N linhas, mede a normalização (datas/valores) isoladamente, importa-o para
+uma BD SQLite em memória e volta a importá-lo (todas as linhas duplicadas), reportando o
+tempo e as linhas/s de cada passagem.
+
+    python -m benchmarks.import_dedupe --rows 100000
+"""
+import argparse
+import io
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Account, AccountType, Base, TransactionType, User
+from app.services.import_service import ImportService
+
+
+def build_csv(rows: int) -> bytes:
+    rng = random.Random(42)
+    start = date(2015, 1, 1)
+    lines = ["Data,Descrição,Valor"]
+    for _ in range(rows):
+        day = start + timedelta(days=rng.randrange(3650))
+        amount = round(rng.uniform(-500, 500), 2)
+        lines.append(f"{day:%d-%m-%Y},Movimento {rng.randrange(2000)},{amount}")
+    return "\n".join(lines).encode("utf-8")
+
+
+def run(rows: int) -> None:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autoflush=False, bind=engine)()
+
+    db.add_all([TransactionType(id=1, name="Despesa"), TransactionType(id=2, name="Receita"), AccountType(id=1, name="Conta à Ordem")])
+    user = User(email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    account = Account(name="Bench", user_id=user.id, account_type_id=1, current_balance=0.0)
+    db.add(account)
+    db.commit()
+
+    payload = build_csv(rows)
+
+    t0 = time.perf_counter()
+    formats = {}
+    col_map = {"date": "Data", "description": "Descrição", "amount": "Valor"}
+    for chunk in ImportService.iter_chunks(io.BytesIO(payload), "bench.csv"):
+        ImportService.normalize_chunk(chunk, col_map, formats)
+    elapsed = time.perf_counter() - t0
+    print(f"normalização: {elapsed:.2f}s ({rows / elapsed:,.0f} linhas/s)")
+
+    for label in ("primeira importação", "reimportação (tudo duplicado)"):
+        t0 = time.perf_counter()
+        result = ImportService.process_file(db, account.id, io.BytesIO(payload), "bench.csv", user.id)
+        elapsed = time.perf_counter() - t0
+        print(f"{label}: {result} em {elapsed:.2f}s ({rows / elapsed:,.0f} linhas/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    run(parser.parse_args().rows)